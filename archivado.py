@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Archivado de actividades cerradas.
+
+Las actividades con Estatus en ESTATUS_CERRADOS cuya fecha_cierre (o Fecha, si
+se cerraron antes de registrarla) tiene más de ARCHIVO_DIAS días se mueven por
+lotes de ARCHIVO_LOTE a 'actividades_archivo'. Así la colección activa y sus
+índices solo contienen lo que consultan los listados y la priorización.
+
+Con ARCHIVO_HABILITADO=true la API ejecuta una pasada cada
+ARCHIVO_INTERVALO_SEGUNDOS en segundo plano, con una pausa de
+ARCHIVO_PAUSA_SEGUNDOS entre lotes para no competir con el tráfico. Las
+archivadas se leen con ?incluir_archivadas=true y alternar_estado las devuelve
+a la colección activa.
+
+Uso (una pasada a mano):
+    python archivado.py [--dias 90] [--lote 500]
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from cache_actividades import cache
+from repositorios import crear_repositorios_mongo
+
+ARCHIVO_HABILITADO = os.getenv("ARCHIVO_HABILITADO", "false").lower() == "true"
+ARCHIVO_DIAS = float(os.getenv("ARCHIVO_DIAS", 90))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", 500))
+ARCHIVO_INTERVALO_SEGUNDOS = float(os.getenv("ARCHIVO_INTERVALO_SEGUNDOS", 3600))
+ARCHIVO_PAUSA_SEGUNDOS = float(os.getenv("ARCHIVO_PAUSA_SEGUNDOS", 1))
+
+
+async def archivar_pendientes(repos, dias: float = ARCHIVO_DIAS, lote: int = ARCHIVO_LOTE, pausa: float = 0) -> int:
+    """Archiva por lotes todo lo pendiente y devuelve cuántas actividades se movieron"""
+    antes_de = datetime.now() - timedelta(days=dias)
+    total = 0
+    while True:
+        usuarios = await repos.actividades.archivar_lote(antes_de, lote)
+        # Las listas en caché de esos usuarios ya no coinciden con la colección activa
+        for usuario_id in set(usuarios):
+            await cache.invalidar(usuario_id)
+        total += len(usuarios)
+        if len(usuarios) < lote:
+            return total
+        await asyncio.sleep(pausa)
+
+
+async def tarea_archivado(repos):
+    while True:
+        try:
+            total = await archivar_pendientes(repos, pausa=ARCHIVO_PAUSA_SEGUNDOS)
+            if total:
+                print(f"🗄️  {total} actividades cerradas archivadas")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Error archivando actividades: {e}")
+        await asyncio.sleep(ARCHIVO_INTERVALO_SEGUNDOS)
+
+
+def iniciar_archivado(repos):
+    """Lanza la tarea de archivado si ARCHIVO_HABILITADO=true; devuelve la tarea o None"""
+    if not ARCHIVO_HABILITADO or repos is None:
+        return None
+    print(f"🗄️  Archivado habilitado (> {ARCHIVO_DIAS:g} días, lotes de {ARCHIVO_LOTE})")
+    return asyncio.create_task(tarea_archivado(repos))
+
+
+async def main(args):
+    MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        repos = crear_repositorios_mongo(client[DATABASE_NAME])
+        await repos.actividades.asegurar_indices()
+        if cache.backend is not None and cache.backend.nombre == "memoria":
+            # Esta caché es la de este proceso: invalidarla no afecta a la de los workers de la API
+            print(f"⚠️  CACHE_BACKEND=memoria: la API puede listar como activas las archivadas durante {cache.ttl} s; "
+                  "usa CACHE_BACKEND=redis para invalidar su caché desde aquí")
+        print(f"🗄️  Archivando actividades cerradas hace más de {args.dias:g} días en '{DATABASE_NAME}.actividades_archivo'...")
+        total = await archivar_pendientes(repos, args.dias, args.lote)
+        print(f"✅ {total} actividades archivadas")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print(f"❌ Tipo de error: {type(e).__name__}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mueve las actividades cerradas antiguas a 'actividades_archivo'")
+    parser.add_argument("--dias", type=float, default=ARCHIVO_DIAS, help="Antigüedad mínima desde el cierre")
+    parser.add_argument("--lote", type=int, default=ARCHIVO_LOTE, help="Actividades por lote")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,155 @@
+"""
+Arranque en caliente de los workers.
+
+Durante el lifespan, antes de aceptar peticiones:
+- se abren MONGO_MIN_POOL_SIZE conexiones del pool de Motor (un ping por conexión)
+- se construyen y prueban una vez el Fernet/MultiFernet, el AES-GCM del
+  formato sellado, los validadores de los modelos, la serialización JSON y
+  la firma/verificación JWT, que de otro modo paga la primera petición
+
+El informe (GET /metricas/arranque) recoge el tiempo de importación de
+mongoapi, cada fase del arranque y la duración de las dos primeras peticiones
+de cada ruta; la diferencia entre ambas es la penalización de arranque en frío.
+Cada valor se compara con su presupuesto (ARRANQUE_PRESUPUESTO_*_MS) y los
+excedidos se avisan en el log; medir_arranque.py falla si hay alguno.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+import jwt
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 5))
+PRESUPUESTO_IMPORT_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_IMPORT_MS", 2000))
+PRESUPUESTO_INICIO_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_INICIO_MS", 3000))
+PRESUPUESTO_PRIMERA_PETICION_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_PRIMERA_PETICION_MS", 50))
+
+# Rutas distintas de las que se miden las primeras peticiones
+MAX_RUTAS = 50
+# Peticiones que se llegan a medir en total; después el middleware solo deja pasar
+MAX_PETICIONES = 500
+
+
+class InformeArranque:
+    """Tiempos de importación, arranque y primeras peticiones de este worker"""
+
+    def __init__(self, import_ms: float):
+        self.import_ms = import_ms
+        self.fases: Dict[str, float] = {}
+        self.peticiones: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def fase(self, nombre: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    @property
+    def inicio_ms(self) -> float:
+        return round(sum(self.fases.values()), 1)
+
+    def penalizaciones(self) -> Dict[str, float]:
+        """Primera petición menos segunda, por ruta (solo las que ya tienen dos)"""
+        return {
+            ruta: round(duraciones[0] - duraciones[1], 1)
+            for ruta, duraciones in self.peticiones.items() if len(duraciones) == 2
+        }
+
+    def excedidos(self) -> List[str]:
+        excedidos = []
+        if self.import_ms > PRESUPUESTO_IMPORT_MS:
+            excedidos.append(f"importación {self.import_ms} ms > {PRESUPUESTO_IMPORT_MS:g} ms")
+        if self.inicio_ms > PRESUPUESTO_INICIO_MS:
+            excedidos.append(f"arranque {self.inicio_ms} ms > {PRESUPUESTO_INICIO_MS:g} ms")
+        for ruta, penalizacion in self.penalizaciones().items():
+            if penalizacion > PRESUPUESTO_PRIMERA_PETICION_MS:
+                excedidos.append(f"primera petición {ruta} +{penalizacion} ms > {PRESUPUESTO_PRIMERA_PETICION_MS:g} ms")
+        return excedidos
+
+    def resumen(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "import_ms": self.import_ms,
+            "inicio_ms": self.inicio_ms,
+            "fases_ms": self.fases,
+            "primeras_peticiones_ms": self.peticiones,
+            "penalizacion_primera_ms": self.penalizaciones(),
+            "presupuesto_ms": {
+                "import": PRESUPUESTO_IMPORT_MS,
+                "inicio": PRESUPUESTO_INICIO_MS,
+                "primera_peticion": PRESUPUESTO_PRIMERA_PETICION_MS,
+            },
+            "excedidos": self.excedidos(),
+        }
+
+
+async def preconectar(client, conexiones: int = MONGO_MIN_POOL_SIZE):
+    """Abre 'conexiones' conexiones del pool con pings concurrentes (al menos uno)"""
+    await asyncio.gather(*[client.admin.command("ping") for _ in range(max(conexiones, 1))])
+
+
+def precalentar():
+    """Ejecuta una vez el camino de una petición: cifrado, modelos, serialización y JWT"""
+    from cache_actividades import serializar
+    from rutas.actividades import Actividad, ActividadBase, CryptoUtils, ALGORITHM, SECRET_KEY
+
+    CryptoUtils.get_fernet()
+    CryptoUtils.get_aead()
+    ahora = datetime.now()
+    ejemplo = {
+        "Nombre": "arranque", "Categoria": "arranque", "Descripcion": "arranque", "Prioridad": 1,
+        "Fin": ahora, "Estatus": "En revisión", "mailto": [{"to": "arranque@ejemplo.com"}],
+        "usuario_id": "arranque", "Fecha": ahora,
+    }
+    for formato in ("campos", "sellado"):
+        guardado = ActividadBase.encrypt_sensitive_data(ejemplo, "arranque", formato=formato)
+        documento = ActividadBase.decode_from_storage({**guardado, "_id": "arranque"})
+    serializar([Actividad(**{**documento, "_id": "arranque"})])
+
+    token = jwt.encode({"sub": "arranque@ejemplo.com"}, SECRET_KEY, algorithm=ALGORITHM)
+    jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+class PrimerasPeticiones:
+    """Middleware ASGI que mide las dos primeras peticiones de cada ruta
+
+    La ruta solo se conoce después del enrutado, así que se recuerdan las URLs
+    cuya ruta ya tiene sus dos medidas y esas pasan sin medir. Las URLs con
+    parámetros nuevos sí se miden, hasta MAX_PETICIONES en total.
+    """
+
+    def __init__(self, app, informe: InformeArranque):
+        self.app = app
+        self.informe = informe
+        self.medidas = 0
+        self.completas = set()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or self.medidas >= MAX_PETICIONES
+            or (scope["method"], scope["path"]) in self.completas
+        ):
+            await self.app(scope, receive, send)
+            return
+        self.medidas += 1
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Tras el enrutado el scope lleva la ruta con sus parámetros sin sustituir
+            ruta = f"{scope['method']} {getattr(scope.get('route'), 'path', '(sin ruta)')}"
+            peticiones = self.informe.peticiones
+            if ruta in peticiones or len(peticiones) < MAX_RUTAS:
+                duraciones = peticiones.setdefault(ruta, [])
+                if len(duraciones) < 2:
+                    duraciones.append(round((time.perf_counter() - inicio) * 1000, 1))
+                if len(duraciones) == 2:
+                    self.completas.add((scope["method"], scope["path"]))
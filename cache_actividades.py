@@ -0,0 +1,271 @@
+"""
+Caché de lectura de actividades por usuario.
+
+Guarda las respuestas ya desencriptadas y serializadas de GET /actividades/
+y GET /actividades/{id}. Las claves llevan una generación por usuario: los
+handlers que modifican actividades llaman a invalidar(), que incrementa la
+generación y deja inaccesibles todas las entradas anteriores de ese usuario.
+
+Backends (variable CACHE_BACKEND; por defecto redis si hay REDIS_URL, si no
+memoria con un solo worker y ninguno con varios, ver backend_por_defecto()):
+- memoria: LRU en el proceso, limitado por bytes (CACHE_MAX_MB) y con TTL.
+           Solo con un worker: las invalidaciones no llegan a los demás
+           procesos (otros workers, archivado.py), que servirían datos viejos
+           hasta CACHE_TTL_SEGUNDOS; si se elige con varios workers, la API
+           avisa al arrancar
+- redis:   compartido entre workers (REDIS_URL, requiere el paquete redis)
+- ninguno: desactiva la caché
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+load_dotenv("config.env")
+
+CACHE_TTL_SEGUNDOS = int(os.getenv("CACHE_TTL_SEGUNDOS", 60))
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", 64))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Workers de uvicorn/gunicorn (la misma variable que leen ambos por defecto)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+
+def backend_por_defecto(procesos: int = WEB_CONCURRENCY) -> str:
+    """Backend sin CACHE_BACKEND: redis si hay REDIS_URL; si no, memoria con un solo worker
+    y ninguno con varios (una caché por proceso no se invalida entre workers)"""
+    if os.getenv("REDIS_URL"):
+        return "redis"
+    return "memoria" if procesos <= 1 else "ninguno"
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or backend_por_defecto()
+
+
+def serializar(valor) -> bytes:
+    """Serializa una respuesta igual que JSONResponse (con alias, p. ej. _id)"""
+    return json.dumps(
+        jsonable_encoder(valor), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class BackendMemoria:
+    """LRU en proceso limitado por tamaño total y con expiración por entrada"""
+
+    nombre = "memoria"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()  # clave -> (expira, valor)
+        self.bytes = 0
+        self.desalojos = 0
+        self.generaciones = {}
+        self.claves_por_usuario = {}
+
+    def _eliminar(self, clave: str):
+        _, valor = self.entradas.pop(clave)
+        self.bytes -= len(valor)
+        usuario_id = clave.split(":", 2)[1]
+        claves = self.claves_por_usuario.get(usuario_id)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self.claves_por_usuario[usuario_id]
+
+    async def get(self, clave: str) -> Optional[bytes]:
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            return None
+        expira, valor = entrada
+        if expira < time.monotonic():
+            self._eliminar(clave)
+            return None
+        self.entradas.move_to_end(clave)
+        return valor
+
+    async def set(self, clave: str, valor: bytes, ttl: int):
+        if len(valor) > self.max_bytes:
+            return
+        if clave in self.entradas:
+            self._eliminar(clave)
+        self.entradas[clave] = (time.monotonic() + ttl, valor)
+        self.bytes += len(valor)
+        self.claves_por_usuario.setdefault(clave.split(":", 2)[1], set()).add(clave)
+        while self.bytes > self.max_bytes:
+            self._eliminar(next(iter(self.entradas)))
+            self.desalojos += 1
+
+    async def generacion(self, usuario_id: str) -> int:
+        return self.generaciones.get(usuario_id, 0)
+
+    async def invalidar(self, usuario_id: str):
+        self.generaciones[usuario_id] = self.generaciones.get(usuario_id, 0) + 1
+        for clave in list(self.claves_por_usuario.get(usuario_id, ())):
+            self._eliminar(clave)
+
+    async def estadisticas(self) -> dict:
+        return {
+            "entradas": len(self.entradas),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "desalojos": self.desalojos,
+        }
+
+
+class BackendRedis:
+    """Backend compartido entre workers; la generación por usuario vive en Redis"""
+
+    nombre = "redis"
+
+    def __init__(self, url: str, cliente=None):
+        """cliente: un cliente ya creado con la interfaz de redis.asyncio (si no, se conecta a url)"""
+        if cliente is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise Exception("CACHE_BACKEND=redis requiere el paquete 'redis' (pip install redis)")
+            cliente = redis.from_url(url)
+        self.redis = cliente
+
+    async def get(self, clave: str) -> Optional[bytes]:
+        return await self.redis.get(clave)
+
+    async def set(self, clave: str, valor: bytes, ttl: int):
+        await self.redis.set(clave, valor, ex=ttl)
+
+    async def generacion(self, usuario_id: str) -> int:
+        return int(await self.redis.get(f"gen:{usuario_id}") or 0)
+
+    async def invalidar(self, usuario_id: str):
+        # Las entradas de generaciones anteriores expiran solas por TTL
+        await self.redis.incr(f"gen:{usuario_id}")
+
+    async def estadisticas(self) -> dict:
+        memoria = await self.redis.info("memory")
+        return {
+            "entradas": await self.redis.dbsize(),
+            "bytes": memoria.get("used_memory"),
+            "max_bytes": memoria.get("maxmemory"),
+            "desalojos": (await self.redis.info("stats")).get("evicted_keys"),
+        }
+
+
+class CacheActividades:
+    """Caché de respuestas por usuario con invalidación por generación"""
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.errores = 0
+        # Escrituras por usuario en este proceso (también sin backend), ver clave_local()
+        self.escrituras = {}
+
+    async def clave(self, usuario_id: str, recurso: str) -> Optional[str]:
+        """Clave de un recurso; se obtiene ANTES de leer de la base de datos para que
+        una escritura concurrente no deje guardado un valor anterior a ella"""
+        if self.backend is None:
+            return None
+        try:
+            return f"act:{usuario_id}:{await self.backend.generacion(usuario_id)}:{recurso}"
+        except Exception as e:
+            self.errores += 1
+            print(f"⚠️  Error en la caché de actividades: {e}")
+            return None
+
+    def clave_local(self, usuario_id: str, recurso: str) -> str:
+        """Clave de un recurso válida solo en este proceso; cambia con cada invalidar()
+        del usuario aunque la caché esté desactivada (la usa coalescencia.py)"""
+        return f"{usuario_id}:{self.escrituras.get(usuario_id, 0)}:{recurso}"
+
+    def clave_coalescencia(self, clave: Optional[str], usuario_id: str, recurso: str,
+                           procesos: int = WEB_CONCURRENCY) -> Optional[tuple]:
+        """Clave para compartir una lectura en curso (coalescencia.py), o None si no es seguro.
+
+        Tiene que cambiar con cualquier escritura del usuario, la atienda el worker que la
+        atienda: la generación de Redis lo hace; la de este proceso solo si es el único worker.
+        """
+        if clave is not None and self.backend.nombre == "redis":
+            return clave, self.clave_local(usuario_id, recurso)
+        if procesos <= 1:
+            return clave, self.clave_local(usuario_id, recurso)
+        return None
+
+    async def obtener(self, clave: Optional[str]) -> Optional[bytes]:
+        if clave is None:
+            return None
+        try:
+            valor = await self.backend.get(clave)
+        except Exception as e:
+            self.errores += 1
+            print(f"⚠️  Error en la caché de actividades: {e}")
+            return None
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    async def guardar(self, clave: Optional[str], valor: bytes):
+        if clave is None:
+            return
+        try:
+            await self.backend.set(clave, valor, self.ttl)
+        except Exception as e:
+            self.errores += 1
+            print(f"⚠️  Error en la caché de actividades: {e}")
+
+    async def invalidar(self, usuario_id: str):
+        self.escrituras[usuario_id] = self.escrituras.get(usuario_id, 0) + 1
+        if self.backend is None:
+            return
+        self.invalidaciones += 1
+        try:
+            await self.backend.invalidar(usuario_id)
+        except Exception as e:
+            self.errores += 1
+            print(f"⚠️  Error invalidando la caché de actividades: {e}")
+
+    def aviso_por_proceso(self, procesos: int = WEB_CONCURRENCY) -> Optional[str]:
+        """Aviso si la caché es por proceso y hay otros procesos que escriben"""
+        if self.backend is None or self.backend.nombre != "memoria" or procesos <= 1:
+            return None
+        return (f"CACHE_BACKEND=memoria con {procesos} workers: las escrituras solo invalidan la caché del worker "
+                f"que las atiende y los demás pueden servir datos de hasta {self.ttl} s. Usa CACHE_BACKEND=redis o ninguno")
+
+    async def estadisticas(self) -> dict:
+        if self.backend is None:
+            return {"backend": "ninguno"}
+        consultas = self.aciertos + self.fallos
+        resultado = {
+            "backend": self.backend.nombre,
+            "ttl_segundos": self.ttl,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "ratio_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "invalidaciones": self.invalidaciones,
+            "errores": self.errores,
+        }
+        try:
+            resultado.update(await self.backend.estadisticas())
+        except Exception as e:
+            resultado["error_backend"] = str(e)
+        return resultado
+
+
+def crear_cache() -> CacheActividades:
+    if CACHE_BACKEND == "redis":
+        backend = BackendRedis(REDIS_URL)
+    elif CACHE_BACKEND == "memoria":
+        backend = BackendMemoria(int(CACHE_MAX_MB * 1024 * 1024))
+    else:
+        backend = None
+    return CacheActividades(backend, CACHE_TTL_SEGUNDOS)
+
+
+cache = crear_cache()
@@ -0,0 +1,104 @@
+"""
+Tokens causales de ida y vuelta con el cliente (CONSISTENCIA_CAUSAL=true).
+
+TokensCausales (repositorios/mongo.py) guarda el último token de escritura de
+cada usuario en el proceso que hizo la escritura; con varios workers la
+lectura siguiente puede llegar a otro proceso que no lo tiene. Por eso, tras
+una escritura, la respuesta lleva el token (clusterTime y operationTime) en la
+cabecera X-Token-Causal y en la cookie token_causal, firmado con SECRET_KEY,
+ligado al usuario y con caducidad VENTANA_CAUSAL_SEGUNDOS. Cuando una petición
+lo devuelve (cualquiera de las dos vías), sus lecturas usan una sesión causal
+avanzada hasta él, la atienda el worker que la atienda.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Optional, Tuple
+import bson
+
+CABECERA = "X-Token-Causal"
+COOKIE = "token_causal"
+LONGITUD_FIRMA = 16
+
+# Estado de la petición en curso: token recibido del cliente y token a devolver
+_peticion: ContextVar[Optional[dict]] = ContextVar("token_causal", default=None)
+
+
+def codificar(secreto: bytes, usuario_id: str, cluster_time, operation_time, caduca: float) -> str:
+    cuerpo = bson.encode({"u": usuario_id, "c": cluster_time, "o": operation_time, "e": caduca})
+    firma = hmac.new(secreto, cuerpo, hashlib.sha256).digest()[:LONGITUD_FIRMA]
+    return base64.urlsafe_b64encode(firma + cuerpo).decode().rstrip("=")
+
+
+def decodificar(secreto: bytes, valor: str) -> Optional[dict]:
+    """Token verificado y vigente, o None si falta, está alterado o caducó"""
+    try:
+        crudo = base64.urlsafe_b64decode(valor + "=" * (-len(valor) % 4))
+        firma, cuerpo = crudo[:LONGITUD_FIRMA], crudo[LONGITUD_FIRMA:]
+        if not hmac.compare_digest(firma, hmac.new(secreto, cuerpo, hashlib.sha256).digest()[:LONGITUD_FIRMA]):
+            return None
+        token = bson.decode(cuerpo)
+    except Exception:
+        return None
+    return token if token.get("e", 0) >= time.time() else None
+
+
+def recibido(usuario_id: str) -> Optional[Tuple[dict, object]]:
+    """(clusterTime, operationTime) que el cliente devolvió en esta petición, si es de este usuario"""
+    estado = _peticion.get()
+    token = estado and estado["recibido"]
+    if not token or token.get("u") != usuario_id:
+        return None
+    return token["c"], token["o"]
+
+
+def emitir(usuario_id: str, cluster_time, operation_time):
+    """Pide devolver al cliente el token de una escritura de esta petición"""
+    estado = _peticion.get()
+    if estado is not None:
+        estado["emitido"] = (usuario_id, cluster_time, operation_time)
+
+
+class TokenCausal:
+    """Middleware ASGI que lee el token causal de la petición y añade a la respuesta el de sus escrituras"""
+
+    def __init__(self, app, secreto: str, ventana: float):
+        self.app = app
+        self.secreto = secreto.encode()
+        self.ventana = ventana
+
+    def _leer(self, scope) -> Optional[dict]:
+        cabeceras = dict(scope.get("headers") or [])
+        valor = cabeceras.get(CABECERA.lower().encode())
+        if valor is None and b"cookie" in cabeceras:
+            cookie = SimpleCookie()
+            cookie.load(cabeceras[b"cookie"].decode("latin-1"))
+            valor = cookie[COOKIE].value.encode() if COOKIE in cookie else None
+        return decodificar(self.secreto, valor.decode("latin-1")) if valor else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Se guarda un dict mutable: lo que escriben las rutas es visible aquí aunque corran en otra tarea
+        estado = {"recibido": self._leer(scope), "emitido": None}
+        reinicio = _peticion.set(estado)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and estado["emitido"]:
+                usuario_id, cluster_time, operation_time = estado["emitido"]
+                valor = codificar(self.secreto, usuario_id, cluster_time, operation_time, time.time() + self.ventana)
+                mensaje = {**mensaje, "headers": list(mensaje.get("headers", [])) + [
+                    (CABECERA.lower().encode(), valor.encode()),
+                    (b"set-cookie", f"{COOKIE}={valor}; Max-Age={int(self.ventana)}; Path=/; HttpOnly; SameSite=Lax".encode()),
+                ]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion.reset(reinicio)
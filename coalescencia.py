@@ -0,0 +1,81 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight).
+
+Varias pestañas del mismo usuario y el refresco del frontend suelen pedir
+GET /actividades/ o /health varias veces en pocos milisegundos. Mientras una
+lectura con la misma clave (usuario + forma de la consulta) está en curso en
+este worker, las siguientes esperan a su resultado ya serializado en lugar de
+repetir la consulta a MongoDB y el desencriptado.
+
+La lectura compartida corre en su propia tarea: si el cliente que la inició se
+desconecta, las demás peticiones siguen recibiendo el resultado. Las claves de
+actividades cambian con cada escritura del usuario (cache.clave_local), así que
+una lectura posterior a una escritura nunca se une a una anterior a ella. Con
+varios workers eso solo se cumple si la generación es compartida (CACHE_BACKEND=
+redis): sin ella, una escritura atendida por otro worker no cambia la clave, así
+que esas lecturas no se comparten (clave None, ver cache.clave_coalescencia).
+
+COALESCENCIA_HABILITADA=false la desactiva. Las métricas están en
+GET /metricas/coalescencia.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+COALESCENCIA_HABILITADA = os.getenv("COALESCENCIA_HABILITADA", "true").lower() == "true"
+
+
+class Coalescedor:
+    """Comparte una única ejecución entre las llamadas concurrentes con la misma clave"""
+
+    def __init__(self, nombre: str, habilitado: bool = COALESCENCIA_HABILITADA):
+        self.nombre = nombre
+        self.habilitado = habilitado
+        self.en_curso: Dict[Hashable, asyncio.Task] = {}
+        self.ejecuciones = 0
+        self.coalescidas = 0
+
+    def _terminar(self, clave: Hashable, tarea: asyncio.Task):
+        if self.en_curso.get(clave) is tarea:
+            del self.en_curso[clave]
+        # Evita el aviso de excepción no recuperada si todas las peticiones se cancelaron
+        if not tarea.cancelled():
+            tarea.exception()
+
+    async def ejecutar(self, clave: Optional[Hashable], funcion: Callable[[], Awaitable]):
+        """Resultado de funcion(), compartido con las llamadas en curso con la misma clave (None: sin compartir)"""
+        if not self.habilitado or clave is None:
+            self.ejecuciones += 1
+            return await funcion()
+        tarea = self.en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.create_task(funcion())
+            self.en_curso[clave] = tarea
+            tarea.add_done_callback(lambda terminada: self._terminar(clave, terminada))
+            self.ejecuciones += 1
+        else:
+            self.coalescidas += 1
+        return await asyncio.shield(tarea)
+
+    def estadisticas(self) -> dict:
+        peticiones = self.ejecuciones + self.coalescidas
+        return {
+            "habilitado": self.habilitado,
+            "peticiones": peticiones,
+            "ejecuciones": self.ejecuciones,
+            "coalescidas": self.coalescidas,
+            "ratio_coalescidas": self.coalescidas / peticiones if peticiones else 0.0,
+            "en_curso": len(self.en_curso),
+        }
+
+
+actividades = Coalescedor("actividades")
+salud = Coalescedor("health")
+
+
+def estadisticas() -> dict:
+    return {coalescedor.nombre: coalescedor.estadisticas() for coalescedor in (actividades, salud)}
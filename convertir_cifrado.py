@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Conversión de 'actividades' (y de 'actividades_archivo') entre formatos de cifrado.
+
+- campos:  un token Fernet por campo sensible y por email de mailto
+- sellado: Nombre, Categoria, Descripcion y mailto en un único BinData
+           AES-GCM con byte de versión (ver CryptoUtils.seal_fields)
+
+La lectura acepta ambos formatos, así que la conversión puede hacerse en
+caliente. Solo se convierten documentos del esquema actual; los antiguos
+deben pasar antes por migrar_actividades.py.
+
+Uso:
+    python convertir_cifrado.py --a sellado [--lote 500] [--simular]
+    python convertir_cifrado.py --a campos
+"""
+
+import argparse
+import asyncio
+import os
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from rutas.actividades import ActividadBase, SCHEMA_VERSION, CAMPO_SELLADO
+from repositorios import COLECCIONES_ACTIVIDADES
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+
+CAMPOS_SENSIBLES = ["Nombre", "Categoria", "Descripcion", "mailto"]
+
+
+def convertir(documento, formato: str):
+    """Operación que reescribe un documento en el formato indicado"""
+    claro = ActividadBase.decrypt_sensitive_data(documento, strict=True)
+    campos = {campo: claro[campo] for campo in CAMPOS_SENSIBLES if campo in claro}
+    encriptado = ActividadBase.encrypt_sensitive_data(
+        {**campos, "usuario_id": documento.get("usuario_id")}, formato=formato
+    )
+    encriptado.pop("usuario_id", None)
+    eliminar = [CAMPO_SELLADO] if formato == "campos" else CAMPOS_SENSIBLES
+
+    # Solo se aplica si el documento no cambió desde que se leyó
+    filtro = {"_id": documento["_id"]}
+    for campo in CAMPOS_SENSIBLES + [CAMPO_SELLADO]:
+        filtro[campo] = documento.get(campo)
+    nuevo = {**{k: v for k, v in documento.items() if k not in eliminar}, **encriptado}
+    operacion = UpdateOne(filtro, {"$set": encriptado, "$unset": {campo: "" for campo in eliminar}})
+    return operacion, len(bson.encode(documento)), len(bson.encode(nuevo))
+
+
+async def convertir_coleccion(formato: str, lote: int, simular: bool):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    database = client[DATABASE_NAME]
+    print(f"🔌 Conectado a {MONGODB_URL} - Database: {DATABASE_NAME}")
+
+    totales = {"convertidos": 0, "errores": 0, "bytes_antes": 0, "bytes_despues": 0}
+    try:
+        for nombre in COLECCIONES_ACTIVIDADES:
+            print(f"📂 Colección '{nombre}'")
+            await convertir_documentos(database[nombre], formato, lote, simular, totales)
+    finally:
+        client.close()
+
+    modo = " (simulación, sin escribir)" if simular else ""
+    print(f"✅ Conversión a formato '{formato}' terminada{modo}")
+    print(f"📋 Convertidos: {totales['convertidos']} | Errores: {totales['errores']}")
+    if totales["bytes_antes"]:
+        antes, despues = totales["bytes_antes"], totales["bytes_despues"]
+        print(f"📉 Tamaño BSON: {antes} -> {despues} bytes ({antes / max(despues, 1):.2f}x)")
+
+
+async def convertir_documentos(coleccion, formato: str, lote: int, simular: bool, totales: dict):
+    """Convierte una colección por lotes de _id, acumulando en 'totales'"""
+    filtro = {"schema_version": SCHEMA_VERSION, CAMPO_SELLADO: {"$exists": formato == "campos"}}
+    pendientes = await coleccion.count_documents({"schema_version": {"$ne": SCHEMA_VERSION}})
+    if pendientes:
+        print(f"⚠️  {pendientes} documentos con esquema antiguo se omiten (ejecuta migrar_actividades.py)")
+
+    ultimo_id = None
+    while True:
+        consulta = dict(filtro)
+        if ultimo_id:
+            consulta["_id"] = {"$gt": ultimo_id}
+        documentos = await coleccion.find(consulta).sort("_id", 1).limit(lote).to_list(length=lote)
+        if not documentos:
+            break
+
+        operaciones = []
+        for documento in documentos:
+            try:
+                operacion, antes, despues = convertir(documento, formato)
+            except Exception as e:
+                totales["errores"] += 1
+                print(f"❌ {documento['_id']}: {type(e).__name__}: {e}")
+                continue
+            operaciones.append(operacion)
+            totales["bytes_antes"] += antes
+            totales["bytes_despues"] += despues
+
+        if operaciones and not simular:
+            resultado = await coleccion.bulk_write(operaciones, ordered=False)
+            totales["convertidos"] += resultado.modified_count
+        else:
+            totales["convertidos"] += len(operaciones)
+        ultimo_id = documentos[-1]["_id"]
+        print(f"📦 Lote hasta {ultimo_id}: {len(operaciones)}/{len(documentos)} - total convertidos: {totales['convertidos']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte 'actividades' entre formatos de cifrado")
+    parser.add_argument("--a", dest="formato", choices=["sellado", "campos"], required=True, help="Formato destino")
+    parser.add_argument("--lote", type=int, default=500, help="Documentos por lote")
+    parser.add_argument("--simular", action="store_true", help="No escribe cambios en la base de datos")
+    args = parser.parse_args()
+    asyncio.run(convertir_coleccion(args.formato, args.lote, args.simular))
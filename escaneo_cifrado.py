@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Escáner de cobertura de cifrado de 'actividades' y 'actividades_archivo'.
+
+Recorre las colecciones en rangos de _id en paralelo (varios procesos, cada uno
+con su propio cliente de MongoDB) y clasifica cada campo sensible como token
+Fernet, sellado, texto plano o indescifrable con el keyring actual
+(FERNET_KEY + FERNET_KEYS_ANTERIORES). La memoria está acotada: los cursores
+van por lotes y solo se conservan hasta --max-ids IDs problemáticos.
+
+Lo usan este CLI y el endpoint POST /admin/cifrado/escaneo (en segundo plano).
+
+Uso:
+    python escaneo_cifrado.py [--particiones 32] [--procesos 4] [--max-ids 1000] [--salida informe.json]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from rutas.actividades import ActividadBase, CAMPO_SELLADO
+from repositorios import COLECCIONES_ACTIVIDADES
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+
+PROYECCION = {"Nombre": 1, "Categoria": 1, "Descripcion": 1, "mailto": 1, CAMPO_SELLADO: 1, "usuario_id": 1}
+CLASES_PROBLEMA = ("texto_plano", "indescifrable")
+
+
+def resultado_vacio() -> dict:
+    return {"documentos": 0, "campos": {}, "documentos_con_problemas": 0, "ids_con_problemas": [], "colecciones": {}}
+
+
+def combinar(total: dict, parcial: dict, max_ids: int) -> dict:
+    total["documentos"] += parcial["documentos"]
+    total["documentos_con_problemas"] += parcial["documentos_con_problemas"]
+    for nombre, cuentas in parcial["colecciones"].items():
+        destino = total["colecciones"].setdefault(nombre, {"documentos": 0, "documentos_con_problemas": 0})
+        for clave, cantidad in cuentas.items():
+            destino[clave] += cantidad
+    for campo, clases in parcial["campos"].items():
+        destino = total["campos"].setdefault(campo, {})
+        for clase, cantidad in clases.items():
+            destino[clase] = destino.get(clase, 0) + cantidad
+    hueco = max_ids - len(total["ids_con_problemas"])
+    total["ids_con_problemas"].extend(parcial["ids_con_problemas"][:max(hueco, 0)])
+    return total
+
+
+async def escanear_rango(database, nombre: str, inicio, fin, max_ids: int, lote: int = 1000) -> dict:
+    """Escanea los documentos de la colección 'nombre' con inicio <= _id < fin (None = sin límite)"""
+    filtro = {}
+    if inicio is not None:
+        filtro.setdefault("_id", {})["$gte"] = inicio
+    if fin is not None:
+        filtro.setdefault("_id", {})["$lt"] = fin
+    resultado = resultado_vacio()
+    cuentas = resultado["colecciones"][nombre] = {"documentos": 0, "documentos_con_problemas": 0}
+    async for documento in database[nombre].find(filtro, PROYECCION, batch_size=lote):
+        resultado["documentos"] += 1
+        cuentas["documentos"] += 1
+        problema = False
+        for campo, clase in ActividadBase.classify_encryption(documento):
+            clases = resultado["campos"].setdefault(campo, {})
+            clases[clase] = clases.get(clase, 0) + 1
+            problema = problema or clase in CLASES_PROBLEMA
+        if problema:
+            resultado["documentos_con_problemas"] += 1
+            cuentas["documentos_con_problemas"] += 1
+            if len(resultado["ids_con_problemas"]) < max_ids:
+                resultado["ids_con_problemas"].append(str(documento["_id"]))
+    return resultado
+
+
+async def _escanear_particion(rangos, max_ids: int) -> dict:
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        database = client[DATABASE_NAME]
+        total = resultado_vacio()
+        for nombre, inicio, fin in rangos:
+            combinar(total, await escanear_rango(database, nombre, inicio, fin, max_ids), max_ids)
+        return total
+    finally:
+        client.close()
+
+
+def escanear_particion(rangos, max_ids: int) -> dict:
+    """Punto de entrada de cada proceso del pool"""
+    return asyncio.run(_escanear_particion(rangos, max_ids))
+
+
+async def calcular_rangos(database, nombre: str, particiones: int):
+    """Divide el espacio de _id de la colección en rangos (nombre, inicio, fin) por la marca de tiempo del ObjectId"""
+    primero = await database[nombre].find_one({}, {"_id": 1}, sort=[("_id", 1)])
+    ultimo = await database[nombre].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if not primero or not isinstance(primero["_id"], ObjectId) or not isinstance(ultimo["_id"], ObjectId):
+        return [(nombre, None, None)]
+    desde = primero["_id"].generation_time.timestamp()
+    hasta = ultimo["_id"].generation_time.timestamp() + 1
+    paso = (hasta - desde) / max(particiones, 1)
+    cortes = [ObjectId.from_datetime(datetime.fromtimestamp(desde + paso * i, tz=timezone.utc))
+              for i in range(1, max(particiones, 1))]
+    # Los extremos quedan abiertos para incluir lo insertado durante el escaneo
+    limites = [None] + cortes + [None]
+    return [(nombre, inicio, fin) for inicio, fin in zip(limites, limites[1:])]
+
+
+async def escanear(database, particiones: int = 32, procesos: int = 4, max_ids: int = 1000,
+                   al_avanzar: Optional[Callable[[dict], Awaitable]] = None) -> dict:
+    """Escanea las colecciones de actividades repartiendo los rangos entre varios procesos.
+    al_avanzar recibe el progreso cada vez que termina un proceso."""
+    inicio = time.perf_counter()
+    rangos = []
+    for nombre in COLECCIONES_ACTIVIDADES:
+        rangos += await calcular_rangos(database, nombre, particiones)
+    procesos = max(1, min(procesos, len(rangos)))
+    grupos = [rangos[i::procesos] for i in range(procesos)]
+
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futuros = [loop.run_in_executor(pool, escanear_particion, grupo, max_ids) for grupo in grupos]
+        total = resultado_vacio()
+        for terminados, futuro in enumerate(asyncio.as_completed(futuros), start=1):
+            combinar(total, await futuro, max_ids)
+            if al_avanzar:
+                await al_avanzar({"grupos": len(grupos), "grupos_terminados": terminados, "documentos": total["documentos"]})
+    finally:
+        # Si se cancela (p. ej. al parar la API) no se bloquea el event loop esperando a los procesos
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    duracion = time.perf_counter() - inicio
+    total["rangos"] = len(rangos)
+    total["procesos"] = procesos
+    total["duracion_s"] = round(duracion, 3)
+    total["documentos_por_hora"] = int(total["documentos"] / duracion * 3600) if duracion else 0
+    return total
+
+
+async def main(args):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    print(f"🔍 Escaneando {', '.join(COLECCIONES_ACTIVIDADES)} de '{DATABASE_NAME}' ({args.particiones} rangos por colección, {args.procesos} procesos)...")
+    try:
+        informe = await escanear(client[DATABASE_NAME], args.particiones, args.procesos, args.max_ids)
+    finally:
+        client.close()
+
+    print(f"✅ {informe['documentos']} documentos en {informe['duracion_s']}s ({informe['documentos_por_hora']} docs/hora)")
+    for nombre, cuentas in informe["colecciones"].items():
+        print(f"   {nombre:<20} {cuentas['documentos']} documentos, {cuentas['documentos_con_problemas']} con problemas")
+    for campo, clases in sorted(informe["campos"].items()):
+        detalle = ", ".join(f"{clase}: {cantidad}" for clase, cantidad in sorted(clases.items()))
+        print(f"   {campo:<12} {detalle}")
+    print(f"⚠️  Documentos con campos sin cifrar o indescifrables: {informe['documentos_con_problemas']}")
+    for actividad_id in informe["ids_con_problemas"][:20]:
+        print(f"   - {actividad_id}")
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(informe, f, indent=2)
+        print(f"💾 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escanea la cobertura de cifrado de 'actividades' y 'actividades_archivo'")
+    parser.add_argument("--particiones", type=int, default=32, help="Rangos de _id por colección")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+    parser.add_argument("--max-ids", type=int, default=1000, help="Máximo de IDs problemáticos a reportar")
+    parser.add_argument("--salida", help="Guarda el informe completo en JSON")
+    asyncio.run(main(parser.parse_args()))
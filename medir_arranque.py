@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Mide el arranque en frío de un worker y lo compara con el presupuesto.
+
+Lanza 'uvicorn mongoapi:app' (un worker, sin caché de actividades para que la
+segunda petición no sea un acierto), espera a que acepte conexiones y hace dos
+veces cada petición de un recorrido típico (health, login, crear, listar,
+obtener, eliminar). Después muestra el informe de GET /metricas/arranque
+(importación, fases del arranque y penalización de la primera petición de cada
+ruta) y termina con código 1 si algún valor supera su presupuesto
+(ARRANQUE_PRESUPUESTO_IMPORT_MS, ..._INICIO_MS, ..._PRIMERA_PETICION_MS).
+
+Con ALMACENAMIENTO=memoria crea sus propios usuarios; con MongoDB hay que
+indicar un usuario existente (las actividades de prueba se eliminan al final).
+
+Uso:
+    ALMACENAMIENTO=memoria python medir_arranque.py
+    python medir_arranque.py --email usuario@ejemplo.com --password secreto --salida arranque.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import requests
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+
+def iniciar_servidor(args) -> subprocess.Popen:
+    entorno = {**os.environ, "CACHE_BACKEND": "ninguno"}
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "mongoapi:app",
+        "--host", "127.0.0.1", "--port", str(args.puerto), "--log-level", "warning",
+    ], env=entorno)
+    # Se espera al puerto y no a /health, para que la primera petición HTTP sea la medida
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", args.puerto), timeout=0.5).close()
+            print(f"🚀 Servidor aceptando conexiones en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+            return proceso
+        except OSError:
+            if proceso.poll() is not None:
+                raise SystemExit("❌ El servidor terminó durante el arranque")
+            time.sleep(0.05)
+    proceso.terminate()
+    raise SystemExit("❌ El servidor no aceptó conexiones en 30 s")
+
+
+def dos_veces(nombre: str, peticion):
+    respuestas = []
+    for _ in range(2):
+        inicio = time.perf_counter()
+        respuesta = peticion()
+        respuestas.append(respuesta)
+        print(f"   {nombre:<36} {respuesta.status_code} {(time.perf_counter() - inicio) * 1000:>8.1f} ms")
+    return respuestas
+
+
+def recorrido(args, url: str):
+    sesion = requests.Session()
+    if args.email:
+        credenciales = [{"email": args.email, "password": args.password}] * 2
+    else:
+        credenciales = [{"email": f"arranque{i}-{os.getpid()}@ejemplo.com", "password": "arranque"} for i in range(2)]
+        usuarios = iter(credenciales)
+        dos_veces("POST /usuarios/", lambda: sesion.post(f"{url}/usuarios/", json={"nombre": "arranque", **next(usuarios)}))
+    dos_veces("GET /health", lambda: sesion.get(f"{url}/health"))
+    logins = iter(credenciales)
+    token = dos_veces("POST /sesion/login", lambda: sesion.post(f"{url}/sesion/login", json=next(logins)))[-1].json()["access_token"]
+    sesion.headers["Authorization"] = f"Bearer {token}"
+
+    actividad = {
+        "Nombre": "arranque", "Categoria": "arranque", "Descripcion": "arranque", "Prioridad": None,
+        "Fin": "2030-01-01T00:00:00", "Estatus": "En revisión", "mailto": [{"to": "arranque@ejemplo.com"}],
+    }
+    ids = [r.json()["_id"] for r in dos_veces("POST /actividades/", lambda: sesion.post(f"{url}/actividades/", json=actividad))]
+    dos_veces("GET /actividades/", lambda: sesion.get(f"{url}/actividades/"))
+    dos_veces("GET /actividades/{id}", lambda: sesion.get(f"{url}/actividades/{ids[0]}"))
+    pendientes = iter(ids)
+    dos_veces("DELETE /actividades/{id}", lambda: sesion.delete(f"{url}/actividades/{next(pendientes)}"))
+    return sesion.get(f"{url}/metricas/arranque").json()
+
+
+def main(args):
+    url = f"http://127.0.0.1:{args.puerto}"
+    proceso = iniciar_servidor(args)
+    try:
+        informe = recorrido(args, url)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    print(f"⏱️  Importación de mongoapi: {informe['import_ms']} ms")
+    print(f"⏱️  Arranque (lifespan): {informe['inicio_ms']} ms {informe['fases_ms']}")
+    for ruta, penalizacion in sorted(informe["penalizacion_primera_ms"].items(), key=lambda item: -item[1]):
+        print(f"   {ruta:<48} primera +{penalizacion:>7.1f} ms")
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"💾 Informe guardado en {args.salida}")
+    if informe["excedidos"]:
+        for excedido in informe["excedidos"]:
+            print(f"❌ Presupuesto excedido: {excedido}")
+        sys.exit(1)
+    print(f"✅ Dentro del presupuesto {informe['presupuesto_ms']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío de la API frente al presupuesto")
+    parser.add_argument("--puerto", type=int, default=8811, help="Puerto del servidor de prueba")
+    parser.add_argument("--email", help="Usuario existente (obligatorio con MongoDB)")
+    parser.add_argument("--password", help="Contraseña del usuario")
+    parser.add_argument("--salida", help="Guarda el informe en JSON")
+    main(parser.parse_args())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Migración de documentos de 'actividades' y 'actividades_archivo' al esquema
+actual (SCHEMA_VERSION).
+
+Reescribe los documentos antiguos en su forma canónica:
+- Fin y Fecha como fechas BSON nativas (no {"$date": ...} ni strings)
+- Nombre, Categoria, Descripcion y emails de mailto encriptados con Fernet
+- mailto solo con las claves to, cc y bcc
+y les asigna 'schema_version' para que la lectura no tenga que normalizarlos.
+
+La migración es por lotes y reanudable: el último _id procesado se guarda en
+la colección 'migraciones' (un punto de control por colección), así que puede
+interrumpirse y volver a lanzarse. Cada documento se escribe solo si no cambió
+desde que se leyó; si cambió se relee y reintenta, y los que siguen fallando se
+guardan como pendientes en el punto de control para la siguiente ejecución.
+
+Uso:
+    python migrar_actividades.py [--lote 500] [--simular] [--reiniciar]
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from cryptography.fernet import InvalidToken
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from rutas.actividades import ActividadBase, CryptoUtils, SCHEMA_VERSION, CAMPO_SELLADO
+from repositorios import COLECCIONES_ACTIVIDADES
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+
+CAMPOS_SENSIBLES = ("Nombre", "Categoria", "Descripcion")
+# Veces que se vuelve a leer y migrar un documento que cambió entre la lectura y la escritura
+REINTENTOS = 3
+
+
+class CampoIndescifrable(Exception):
+    """Un campo tiene forma de token Fernet pero no se puede desencriptar con la clave actual"""
+
+
+def cifrar_si_plano(valor):
+    """Devuelve el valor encriptado, sin volver a encriptar los tokens válidos"""
+    if not valor or not isinstance(valor, str):
+        return valor
+    try:
+        CryptoUtils.decrypt_data_strict(valor)
+        return valor
+    except InvalidToken:
+        if CryptoUtils.es_token_fernet(valor):
+            raise CampoIndescifrable(valor[:16])
+        return CryptoUtils.encrypt_data(valor)
+
+
+def canonicalizar(documento):
+    """Calcula los campos canónicos de un documento antiguo"""
+    doc = ActividadBase.normalize(documento)
+    cambios = {"Fin": doc["Fin"]}
+    if "Fecha" in doc:
+        cambios["Fecha"] = doc["Fecha"]
+    if CAMPO_SELLADO not in doc:
+        # Los documentos sellados ya guardan los campos sensibles encriptados
+        cambios.update({campo: cifrar_si_plano(doc.get(campo)) for campo in CAMPOS_SENSIBLES if campo in doc})
+        cambios["mailto"] = [
+            {clave: cifrar_si_plano(valor) for clave, valor in item.items()}
+            for item in doc["mailto"]
+        ]
+    cambios["schema_version"] = SCHEMA_VERSION
+    return cambios
+
+
+def filtro_optimista(documento):
+    """Filtro que solo coincide si el documento no cambió desde que se leyó.
+
+    El documento entero se compara con $expr/$literal: los valores antiguos como
+    {"$date": ...} se leerían como operadores si fueran directamente al filtro.
+    """
+    return {"_id": documento["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": documento}]}}
+
+
+def id_migracion(nombre: str) -> str:
+    """Punto de control de la migración de una colección en 'migraciones'"""
+    return f"{nombre}_v{SCHEMA_VERSION}"
+
+
+async def migrar(lote: int, simular: bool, reiniciar: bool):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    database = client[DATABASE_NAME]
+    print(f"🔌 Conectado a {MONGODB_URL} - Database: {DATABASE_NAME}")
+
+    try:
+        for nombre in COLECCIONES_ACTIVIDADES:
+            print(f"📂 Colección '{nombre}'")
+            await migrar_coleccion(database, nombre, lote, simular, reiniciar)
+    finally:
+        client.close()
+
+
+def preparar(documentos, totales) -> dict:
+    """UpdateOne con filtro optimista de cada documento que se puede canonicalizar, por _id"""
+    operaciones = {}
+    for documento in documentos:
+        try:
+            cambios = canonicalizar(documento)
+        except CampoIndescifrable:
+            totales["indescifrables"] += 1
+            print(f"⚠️  {documento['_id']}: campo indescifrable con la clave actual, se omite")
+            continue
+        except Exception as e:
+            totales["errores"] += 1
+            print(f"❌ {documento['_id']}: {type(e).__name__}: {e}")
+            continue
+        operaciones[documento["_id"]] = UpdateOne(filtro_optimista(documento), {"$set": cambios})
+    return operaciones
+
+
+async def aplicar(coleccion, operaciones: dict, simular: bool, totales) -> list:
+    """Escribe el lote y devuelve los _id que cambiaron desde la lectura (sin migrar)"""
+    if not operaciones:
+        return []
+    if simular:
+        totales["migrados"] += len(operaciones)
+        return []
+    resultado = await coleccion.bulk_write(list(operaciones.values()), ordered=False)
+    totales["migrados"] += resultado.modified_count
+    if resultado.matched_count == len(operaciones):
+        return []
+    restantes = coleccion.find(
+        {"_id": {"$in": list(operaciones)}, "schema_version": {"$ne": SCHEMA_VERSION}}, {"_id": 1}
+    )
+    return [documento["_id"] async for documento in restantes]
+
+
+async def migrar_documentos(coleccion, documentos, simular: bool, totales) -> list:
+    """Migra los documentos; los que cambian entre lectura y escritura se releen hasta REINTENTOS veces.
+
+    Devuelve los _id que siguen sin migrar tras los reintentos.
+    """
+    fallidos = await aplicar(coleccion, preparar(documentos, totales), simular, totales)
+    for _ in range(REINTENTOS):
+        if not fallidos:
+            break
+        documentos = await coleccion.find(
+            {"_id": {"$in": fallidos}, "schema_version": {"$ne": SCHEMA_VERSION}}
+        ).sort("_id", 1).to_list(length=None)
+        fallidos = await aplicar(coleccion, preparar(documentos, totales), simular, totales)
+    return fallidos
+
+
+async def migrar_coleccion(database, nombre: str, lote: int, simular: bool, reiniciar: bool):
+    coleccion = database[nombre]
+    punto_control = id_migracion(nombre)
+    if reiniciar:
+        await database.migraciones.delete_one({"_id": punto_control})
+        print("🔄 Punto de control reiniciado")
+
+    estado = await database.migraciones.find_one({"_id": punto_control}) or {}
+    ultimo_id = estado.get("ultimo_id")
+    # Documentos que cambiaron durante una pasada anterior: el punto de control ya los dejó atrás
+    pendientes = estado.get("pendientes", [])
+    totales = {
+        "migrados": estado.get("migrados", 0),
+        "indescifrables": estado.get("indescifrables", 0),
+        "errores": estado.get("errores", 0),
+    }
+
+    async def guardar():
+        if not simular:
+            await database.migraciones.update_one(
+                {"_id": punto_control},
+                {"$set": {"ultimo_id": ultimo_id, "pendientes": pendientes, "actualizado": datetime.now(), **totales}},
+                upsert=True,
+            )
+
+    if pendientes:
+        print(f"🔁 Reintentando {len(pendientes)} documentos pendientes de una pasada anterior")
+        documentos = await coleccion.find(
+            {"_id": {"$in": pendientes}, "schema_version": {"$ne": SCHEMA_VERSION}}
+        ).sort("_id", 1).to_list(length=None)
+        pendientes = await migrar_documentos(coleccion, documentos, simular, totales)
+        await guardar()
+    if ultimo_id:
+        print(f"⏩ Reanudando después de _id {ultimo_id}")
+
+    while True:
+        filtro = {"schema_version": {"$ne": SCHEMA_VERSION}}
+        if ultimo_id:
+            filtro["_id"] = {"$gt": ultimo_id}
+        documentos = await coleccion.find(filtro).sort("_id", 1).limit(lote).to_list(length=lote)
+        if not documentos:
+            break
+
+        migrados = totales["migrados"]
+        fallidos = await migrar_documentos(coleccion, documentos, simular, totales)
+        for documento_id in fallidos:
+            print(f"⚠️  {documento_id}: cambió durante la migración {REINTENTOS + 1} veces, queda pendiente")
+        pendientes.extend(fallidos)
+
+        ultimo_id = documentos[-1]["_id"]
+        await guardar()
+        print(f"📦 Lote hasta {ultimo_id}: {totales['migrados'] - migrados}/{len(documentos)} documentos - total migrados: {totales['migrados']}")
+
+    modo = " (simulación, sin escribir)" if simular else ""
+    print(f"✅ Migración de '{nombre}' a schema_version={SCHEMA_VERSION} terminada{modo}")
+    print(f"📋 Migrados: {totales['migrados']} | Indescifrables: {totales['indescifrables']} | Errores: {totales['errores']} | Pendientes: {len(pendientes)}")
+    if pendientes:
+        print("🔁 Los pendientes se reintentan en la siguiente ejecución")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra 'actividades' y 'actividades_archivo' al esquema actual")
+    parser.add_argument("--lote", type=int, default=500, help="Documentos por lote")
+    parser.add_argument("--simular", action="store_true", help="No escribe cambios en la base de datos")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora el punto de control guardado")
+    args = parser.parse_args()
+    asyncio.run(migrar(args.lote, args.simular, args.reiniciar))
@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+import time
+_inicio_import = time.perf_counter()
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
@@ -7,8 +10,18 @@ from dotenv import load_dotenv
 
 # Importar routers
 from rutas.sesion import router as sesion_router
-from rutas.usuario import router as usuario_router
+from rutas.usuario import router as usuario_router, cerrar_pool_hash
 from rutas.actividades import router as actividades_router
+from rutas.admin import router as admin_router, cancelar_escaneos, get_admin_user
+from cache_actividades import cache
+import coalescencia
+from arranque import InformeArranque, PrimerasPeticiones, MONGO_MIN_POOL_SIZE, precalentar, preconectar
+from perfilado import instalar_perfilado
+from repositorios import crear_repositorios_memoria, crear_repositorios_mongo
+from repositorios.mongo import CONSISTENCIA_CAUSAL, VENTANA_CAUSAL_SEGUNDOS
+from rutas.actividades import SECRET_KEY
+from causalidad import CABECERA, TokenCausal
+from archivado import iniciar_archivado
 
 # Cargar variables de entorno
 load_dotenv("config.env")
@@ -16,61 +29,112 @@ load_dotenv("config.env")
 # Configuración de MongoDB
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
-
-# Cliente de MongoDB
-client = None
-database = None
+# Almacenamiento: mongo o memoria (sin MongoDB, los datos se pierden al reiniciar)
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "mongo")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    global client, database
-    try:
-        print(f"🔌 Intentando conectar a MongoDB...")
-        print(f"📍 URL: {MONGODB_URL}")
-        print(f"📍 Database: {DATABASE_NAME}")
+    # Startup: el cliente, la base de datos y los repositorios se comparten en app.state
+    informe = app.state.arranque
+    client = database = repositorios = None
+    if ALMACENAMIENTO == "memoria":
+        repositorios = crear_repositorios_memoria()
+        print("🧪 Almacenamiento en memoria (sin MongoDB)")
+    else:
+        try:
+            print(f"🔌 Intentando conectar a MongoDB...")
+            print(f"📍 URL: {MONGODB_URL}")
+            print(f"📍 Database: {DATABASE_NAME}")
         
-        client = AsyncIOMotorClient(MONGODB_URL)
+            client = AsyncIOMotorClient(MONGODB_URL, minPoolSize=MONGO_MIN_POOL_SIZE)
         
-        # Probar la conexión
-        await client.admin.command('ping')
-        print("✅ Ping a MongoDB exitoso")
+            # Probar la conexión y abrir el pool mínimo antes de aceptar peticiones
+            with informe.fase("conexion"):
+                await client.admin.command('ping')
+            print("✅ Ping a MongoDB exitoso")
+            with informe.fase("pool"):
+                await preconectar(client)
         
-        database = client[DATABASE_NAME]
-        print(f"✅ Conectado a MongoDB - Database: {DATABASE_NAME}")
+            database = client[DATABASE_NAME]
+            print(f"✅ Conectado a MongoDB - Database: {DATABASE_NAME} (pool mínimo: {MONGO_MIN_POOL_SIZE})")
         
-        # Listar colecciones para verificar acceso
-        collections = await database.list_collection_names()
-        print(f"📋 Colecciones disponibles: {collections}")
+            repositorios = crear_repositorios_mongo(database)
+            with informe.fase("indices"):
+                try:
+                    await repositorios.usuarios.asegurar_indices()
+                except Exception as e:
+                    print(f"⚠️  No se pudo crear el índice único de email (¿emails duplicados?); /usuarios/lote queda deshabilitado: {e}")
+                try:
+                    await repositorios.actividades.asegurar_indices()
+                except Exception as e:
+                    print(f"⚠️  No se pudieron crear los índices de actividades: {e}")
         
-    except Exception as e:
-        print(f"❌ Error conectando a MongoDB: {e}")
-        print(f"❌ Tipo de error: {type(e).__name__}")
-        database = None
-        client = None
+        except Exception as e:
+            print(f"❌ Error conectando a MongoDB: {e}")
+            print(f"❌ Tipo de error: {type(e).__name__}")
+            if client:
+                client.close()
+            database = None
+            client = None
+            repositorios = None
+    app.state.client = client
+    app.state.database = database
+    app.state.repositorios = repositorios
+
+    # Cifrado, modelos, serialización y JWT listos antes de la primera petición
+    with informe.fase("precalentado"):
+        try:
+            precalentar()
+        except Exception as e:
+            print(f"⚠️  Error precalentando (se construirá en la primera petición): {e}")
+    print(f"⏱️  Importación {informe.import_ms} ms, arranque {informe.inicio_ms} ms {informe.fases}")
+    for excedido in informe.excedidos():
+        print(f"⚠️  Presupuesto de arranque excedido: {excedido}")
+    
+    aviso = cache.aviso_por_proceso()
+    if aviso:
+        print(f"⚠️  {aviso}")
+    archivado = iniciar_archivado(repositorios)
     
     yield
     
     # Shutdown
+    if archivado:
+        archivado.cancel()
+    # Antes de cerrar el cliente: los escaneos cancelados aún guardan su estado final
+    await cancelar_escaneos()
+    cerrar_pool_hash()
     if client:
         client.close()
         print("🔌 Desconectado de MongoDB")
 
 app = FastAPI(title="API MongoDB", version="1.0.0", lifespan=lifespan)
+app.state.client = None
+app.state.database = None
+app.state.repositorios = None
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # O usa ["*"] para permitir todos los orígenes (solo para desarrollo)
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CABECERA],
 )
 
+# Read-your-writes entre workers: el token causal de las escrituras va y vuelve con el cliente
+if CONSISTENCIA_CAUSAL:
+    app.add_middleware(TokenCausal, secreto=SECRET_KEY, ventana=VENTANA_CAUSAL_SEGUNDOS)
+
+# Perfilado bajo demanda (sin coste si PERFILADO_HABILITADO no es true)
+instalar_perfilado(app)
+
 # FastAPI solo maneja la API - Los archivos estáticos los sirve Django
 
 # Incluir routers
 app.include_router(sesion_router)
 app.include_router(usuario_router)
 app.include_router(actividades_router)
+app.include_router(admin_router)
 
 @app.get("/")
 async def root():
@@ -88,8 +152,21 @@ async def get_info():
 @app.get("/health")
 async def health_check():
     """Endpoint para verificar el estado de la API y MongoDB"""
+    # Las comprobaciones concurrentes comparten un solo ping
+    return await coalescencia.salud.ejecutar("health", comprobar_salud)
+
+async def comprobar_salud():
     try:
+        if ALMACENAMIENTO == "memoria":
+            return {
+                "status": "ok",
+                "api": "ok",
+                "database": "memoria",
+                "message": "Almacenamiento en memoria (sin MongoDB)"
+            }
+        
         # Verificar conexión a MongoDB
+        database = app.state.database
         if database is None:
             return {
                 "status": "error",
@@ -120,6 +197,26 @@ async def health_check():
         }
 
 
+@app.get("/metricas/cache")
+async def metricas_cache(admin = Depends(get_admin_user)):
+    """Ratio de aciertos y uso de memoria de la caché de actividades"""
+    return await cache.estadisticas()
+
+
+@app.get("/metricas/arranque")
+async def metricas_arranque():
+    """Tiempos de importación, arranque y primeras peticiones de este worker frente al presupuesto"""
+    return app.state.arranque.resumen()
+
+
+@app.get("/metricas/coalescencia")
+async def metricas_coalescencia():
+    """Peticiones de lectura resueltas con una ejecución ya en curso"""
+    return coalescencia.estadisticas()
+
+# Medición de las primeras peticiones de cada ruta (la más externa, para medirlas completas)
+app.state.arranque = InformeArranque(import_ms=round((time.perf_counter() - _inicio_import) * 1000, 1))
+app.add_middleware(PrimerasPeticiones, informe=app.state.arranque)
 
 if __name__ == "__main__":
     import uvicorn
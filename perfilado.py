@@ -0,0 +1,225 @@
+"""
+Perfilado bajo demanda de peticiones individuales.
+
+Cuando PERFILADO_HABILITADO=true se instala un middleware ASGI que perfila una
+petición si trae la cabecera X-Debug-Perfil con el valor de PERFILADO_TOKEN,
+o si la elige el muestreo aleatorio (PERFILADO_MUESTREO, p. ej. 0.001).
+Para cada petición perfilada se escriben en PERFILADO_DIR:
+- <id>.folded:     pilas muestreadas en formato "folded" (flamegraph.pl, speedscope)
+- <id>.trace.json: línea de tiempo de comandos MongoDB y llamadas de cifrado
+                   en formato Chrome Trace Event (chrome://tracing, Perfetto)
+
+El id va en la cabecera de respuesta X-Perfil-Id. Con el perfilado
+deshabilitado no se instala nada, así que el coste es cero; habilitado, las
+peticiones no perfiladas solo pagan la comprobación de la cabecera.
+
+Se perfila una petición a la vez. El muestreo es del hilo del event loop, por
+lo que el perfil incluye también a las peticiones concurrentes en ese worker.
+"""
+
+import asyncio
+import contextvars
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+load_dotenv("config.env")
+
+PERFILADO_HABILITADO = os.getenv("PERFILADO_HABILITADO", "false").lower() == "true"
+PERFILADO_TOKEN = os.getenv("PERFILADO_TOKEN", "")
+PERFILADO_MUESTREO = float(os.getenv("PERFILADO_MUESTREO", 0))
+PERFILADO_INTERVALO_MS = float(os.getenv("PERFILADO_INTERVALO_MS", 1))
+PERFILADO_DIR = os.getenv("PERFILADO_DIR", "perfiles")
+
+CABECERA_DEBUG = b"x-debug-perfil"
+
+# Perfil de la petición en curso (para las llamadas de cifrado, en el hilo del event loop)
+perfil_actual = contextvars.ContextVar("perfil_actual", default=None)
+# Perfil en curso en el proceso (para los eventos de pymongo, que llegan desde otros hilos)
+_perfil_en_curso = None
+
+
+class Perfil:
+    """Muestras de pila y eventos de la línea de tiempo de una petición"""
+
+    def __init__(self, metodo: str, ruta: str):
+        self.id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{random.randrange(16 ** 6):06x}"
+        self.metodo = metodo
+        self.ruta = ruta
+        self.inicio = time.perf_counter()
+        self.muestras = Counter()
+        self.eventos = []
+        self.lock = threading.Lock()
+        self.comandos = {}
+
+    def microsegundos(self, instante: float) -> int:
+        return int((instante - self.inicio) * 1_000_000)
+
+    def evento(self, nombre: str, categoria: str, inicio: float, fin: float, args=None):
+        with self.lock:
+            self.eventos.append({
+                "name": nombre, "cat": categoria, "ph": "X", "pid": os.getpid(),
+                "tid": threading.get_ident(), "ts": self.microsegundos(inicio),
+                "dur": max(int((fin - inicio) * 1_000_000), 1), "args": args or {},
+            })
+
+    def escribir(self, directorio: str, estado: int):
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, self.id)
+        with open(f"{base}.folded", "w") as f:
+            for pila, cantidad in self.muestras.most_common():
+                f.write(f"{pila} {cantidad}\n")
+        fin = time.perf_counter()
+        eventos = [{
+            "name": f"{self.metodo} {self.ruta}", "cat": "peticion", "ph": "X", "pid": os.getpid(),
+            "tid": 0, "ts": 0, "dur": self.microsegundos(fin), "args": {"status": estado},
+        }] + self.eventos
+        with open(f"{base}.trace.json", "w") as f:
+            json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f)
+
+
+class Muestreador(threading.Thread):
+    """Toma muestras periódicas de la pila de un hilo (perfil estadístico)"""
+
+    def __init__(self, perfil: Perfil, hilo_objetivo: int, intervalo: float):
+        super().__init__(daemon=True)
+        self.perfil = perfil
+        self.hilo_objetivo = hilo_objetivo
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_objetivo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if pila:
+                self.perfil.muestras[";".join(reversed(pila))] += 1
+
+
+class ComandosMongo(monitoring.CommandListener):
+    """Registra los comandos MongoDB ejecutados mientras hay un perfil en curso"""
+
+    def started(self, event):
+        perfil = _perfil_en_curso
+        if perfil is not None:
+            perfil.comandos[event.request_id] = time.perf_counter()
+
+    def _terminar(self, event, ok: bool):
+        perfil = _perfil_en_curso
+        if perfil is None:
+            return
+        inicio = perfil.comandos.pop(event.request_id, None)
+        fin = time.perf_counter()
+        if inicio is None:
+            inicio = fin - event.duration_micros / 1_000_000
+        perfil.evento(f"mongo {event.command_name}", "mongodb", inicio, fin,
+                      {"database": event.database_name, "ok": ok, "duration_micros": event.duration_micros})
+
+    def succeeded(self, event):
+        self._terminar(event, True)
+
+    def failed(self, event):
+        self._terminar(event, False)
+
+
+def instrumentar(clase, nombre: str, categoria: str):
+    """Envuelve un método estático para registrar su duración en el perfil actual"""
+    original = getattr(clase, nombre)
+
+    @functools.wraps(original)
+    def envoltura(*args, **kwargs):
+        perfil = perfil_actual.get()
+        if perfil is None:
+            return original(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            perfil.evento(f"{clase.__name__}.{nombre}", categoria, inicio, time.perf_counter())
+
+    setattr(clase, nombre, staticmethod(envoltura))
+
+
+class PerfiladoMiddleware:
+    """Middleware ASGI que perfila las peticiones autorizadas o muestreadas"""
+
+    def __init__(self, app, directorio: str, token: str, muestreo: float, intervalo_ms: float):
+        self.app = app
+        self.directorio = directorio
+        self.token = token.encode()
+        self.muestreo = muestreo
+        self.intervalo = intervalo_ms / 1000
+        self.ocupado = False
+
+    def debe_perfilar(self, scope) -> bool:
+        if self.token:
+            for nombre, valor in scope["headers"]:
+                if nombre == CABECERA_DEBUG:
+                    return hmac.compare_digest(valor, self.token)
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.ocupado or not self.debe_perfilar(scope):
+            await self.app(scope, receive, send)
+            return
+
+        global _perfil_en_curso
+        self.ocupado = True
+        perfil = Perfil(scope["method"], scope["path"])
+        estado = {"status": 500}
+
+        async def send_con_id(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"x-perfil-id", perfil.id.encode())]
+            await send(mensaje)
+
+        muestreador = Muestreador(perfil, threading.get_ident(), self.intervalo)
+        token = perfil_actual.set(perfil)
+        _perfil_en_curso = perfil
+        muestreador.start()
+        try:
+            await self.app(scope, receive, send_con_id)
+        finally:
+            muestreador.detener.set()
+            _perfil_en_curso = None
+            perfil_actual.reset(token)
+            self.ocupado = False
+            try:
+                await asyncio.to_thread(perfil.escribir, self.directorio, estado["status"])
+                print(f"🔥 Perfil {perfil.id} guardado en {self.directorio} ({perfil.metodo} {perfil.ruta})")
+            except Exception as e:
+                print(f"⚠️  No se pudo guardar el perfil {perfil.id}: {e}")
+
+
+def instalar_perfilado(app):
+    """Instala el middleware y la instrumentación si PERFILADO_HABILITADO=true.
+    Debe llamarse antes de crear el cliente de MongoDB."""
+    if not PERFILADO_HABILITADO:
+        return
+    from rutas.actividades import CryptoUtils
+
+    for nombre in ("encrypt_data", "decrypt_data", "decrypt_data_strict", "seal_fields", "unseal_fields"):
+        instrumentar(CryptoUtils, nombre, "cifrado")
+    monitoring.register(ComandosMongo())
+    app.add_middleware(
+        PerfiladoMiddleware,
+        directorio=PERFILADO_DIR,
+        token=PERFILADO_TOKEN,
+        muestreo=PERFILADO_MUESTREO,
+        intervalo_ms=PERFILADO_INTERVALO_MS,
+    )
+    print(f"🔥 Perfilado habilitado (muestreo={PERFILADO_MUESTREO}, dir={PERFILADO_DIR})")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script para probar el enrutado de lecturas contra un replica set local.
+
+Muestra la topología, escribe actividades de prueba con los repositorios de
+la API y comprueba que cada una se lee inmediatamente por la ruta de
+listados (read-your-writes), aunque esa ruta vaya a los secundarios.
+
+Replica set local de 3 miembros para la prueba:
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 &
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 &
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2 &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+
+Uso:
+    MONGODB_URL="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \\
+    LECTURA_LISTADOS=secondaryPreferred CONSISTENCIA_CAUSAL=true python probar_replica.py
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from repositorios.mongo import ActividadesMongo, CONSISTENCIA_CAUSAL, read_preference_para
+
+ITERACIONES = int(os.getenv("ITERACIONES", 50))
+
+
+async def probar_replica():
+    MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+    print(f"📍 URL: {MONGODB_URL}")
+    print(f"📍 Database: {DATABASE_NAME}")
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        hello = await client.admin.command("hello")
+        if "setName" not in hello:
+            print("⚠️  El servidor no es un replica set: todas las lecturas irán al primario")
+        else:
+            print(f"✅ Replica set '{hello['setName']}' - primario: {hello.get('primary')}")
+            print(f"📋 Miembros: {hello.get('hosts')}")
+        print(f"🔀 Lectura de listados: {read_preference_para('listados').document}")
+        print(f"🔗 Consistencia causal: {CONSISTENCIA_CAUSAL}")
+
+        repositorio = ActividadesMongo(client[DATABASE_NAME])
+        usuario_id = f"prueba-replica-{ObjectId()}"
+        fallos = 0
+        for i in range(ITERACIONES):
+            actividad_id = await repositorio.crear({
+                "Nombre": f"replica {i}", "Categoria": "prueba", "Descripcion": "prueba",
+                "Fin": datetime.now(), "Estatus": "En revisión", "mailto": [],
+                "usuario_id": usuario_id, "Fecha": datetime.now(),
+            })
+            visibles = {documento["_id"] for documento in await repositorio.listar(usuario_id)}
+            if actividad_id not in visibles:
+                fallos += 1
+
+        await client[DATABASE_NAME].actividades.delete_many({"usuario_id": usuario_id})
+        print("🧹 Actividades de prueba eliminadas")
+        if fallos:
+            print(f"❌ {fallos}/{ITERACIONES} escrituras no eran visibles en la lectura siguiente")
+        else:
+            print(f"✅ {ITERACIONES}/{ITERACIONES} escrituras visibles inmediatamente (read-your-writes)")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print(f"❌ Tipo de error: {type(e).__name__}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(probar_replica())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Alta masiva de usuarios desde un CSV.
+
+Envía el CSV (columnas nombre,email,password[,activo]) a POST /usuarios/lote/csv
+y muestra el progreso que devuelve la API por lotes. Las contraseñas se
+hashean en paralelo en el servidor y los emails duplicados se reportan por fila.
+Requiere un usuario incluido en ADMIN_EMAILS.
+
+Uso:
+    python provisionar_usuarios.py usuarios.csv --email admin@ejemplo.com --password ****
+    python provisionar_usuarios.py usuarios.csv --token <jwt> [--url http://localhost:8800]
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+import requests
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+
+def obtener_token(url: str, email: str, password: str) -> str:
+    respuesta = requests.post(f"{url}/sesion/login", json={"email": email, "password": password})
+    if respuesta.status_code != 200:
+        raise SystemExit(f"❌ Login fallido ({respuesta.status_code}): {respuesta.text}")
+    return respuesta.json()["access_token"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alta masiva de usuarios desde CSV")
+    parser.add_argument("csv", help="Archivo CSV con columnas nombre,email,password[,activo]")
+    parser.add_argument("--url", default=f"http://localhost:{os.getenv('PORT', 8800)}")
+    parser.add_argument("--token", help="Token JWT de un administrador")
+    parser.add_argument("--email", help="Email de un administrador (si no se pasa --token)")
+    parser.add_argument("--password", help="Password del administrador")
+    parser.add_argument("--errores", help="Guarda las filas con error en este archivo JSON")
+    args = parser.parse_args()
+
+    token = args.token
+    if not token:
+        if not args.email:
+            raise SystemExit("❌ Indica --token o --email")
+        token = obtener_token(args.url, args.email, args.password or getpass.getpass("Password: "))
+
+    print(f"📤 Enviando {args.csv} a {args.url}/usuarios/lote/csv ...")
+    errores = []
+    resumen = {}
+    with open(args.csv, "rb") as archivo:
+        respuesta = requests.post(
+            f"{args.url}/usuarios/lote/csv",
+            data=archivo,
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+            stream=True,
+        )
+        if respuesta.status_code != 200:
+            raise SystemExit(f"❌ Error {respuesta.status_code}: {respuesta.text}")
+        for linea in respuesta.iter_lines():
+            if not linea:
+                continue
+            resumen = json.loads(linea)
+            errores += resumen.get("errores_lote", [])
+            print(f"📦 Procesadas: {resumen['procesadas']} | Creados: {resumen['creados']} | Errores: {resumen['errores']}")
+
+    for error in errores[:20]:
+        print(f"   ⚠️  Fila {error['fila']} ({error.get('email')}): {error['error']}")
+    if args.errores and errores:
+        with open(args.errores, "w") as f:
+            json.dump(errores, f, indent=2, ensure_ascii=False)
+        print(f"💾 {len(errores)} filas con error guardadas en {args.errores}")
+
+    if not resumen.get("terminado"):
+        print(f"❌ El proceso no terminó: {resumen.get('error', 'respuesta incompleta')}")
+        sys.exit(1)
+    print("✅ Alta masiva terminada")
+
+
+if __name__ == "__main__":
+    main()
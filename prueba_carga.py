@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de la API con datos sintéticos.
+
+1. 'sembrar' llena un MongoDB local con usuarios (hash bcrypt real) y
+   actividades encriptadas con CryptoUtils, igual que las crea la API.
+2. 'ejecutar' lanza usuarios virtuales concurrentes contra mongoapi:app
+   (login + listar/obtener/crear/actualizar/alternar/reordenar/eliminar) y
+   reporta throughput y p50/p95/p99 por endpoint.
+
+Con varios niveles de concurrencia (--concurrencias 1,8,32,64) se obtiene la
+curva de latencia y su codo; con --salida/--comparar se comparan builds.
+Los usuarios virtuales (un hilo cada uno) se reparten entre --procesos
+procesos, para que el GIL del cliente no sea el cuello de botella; las
+latencias de todos se juntan antes de calcular los percentiles.
+
+Uso:
+    python prueba_carga.py sembrar --usuarios 10000 --actividades 5000
+    python prueba_carga.py ejecutar --concurrencias 1,8,32 --duracion 30 --salida base.json
+    python prueba_carga.py ejecutar --concurrencias 1,8,32 --duracion 30 --comparar base.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import bcrypt
+import requests
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv("config.env")
+
+from rutas.actividades import ActividadBase, SCHEMA_VERSION
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "listas")
+
+DOMINIO = "carga.local"
+PALABRAS = ["informe", "revisar", "cliente", "reunión", "presupuesto", "entrega", "proyecto",
+            "soporte", "factura", "contrato", "diseño", "pruebas", "despliegue", "auditoría"]
+CATEGORIAS = ["Trabajo", "Personal", "Finanzas", "Salud", "Estudio", "Hogar"]
+ESTATUS = ["En revisión", "En revisión", "En revisión", "Cerrado"]
+
+# Peso relativo de cada escenario en la mezcla de un usuario virtual
+ESCENARIOS = [
+    ("listar", 50),
+    ("obtener", 15),
+    ("crear", 10),
+    ("actualizar", 10),
+    ("alternar", 5),
+    ("reordenar", 5),
+    ("eliminar", 5),
+]
+# Segundos que un proceso espera a que el resto del nivel haya arrancado
+ESPERA_BARRERA = 120
+
+
+# --- Generación de datos sintéticos ---
+
+def email_usuario(prefijo: str, indice: int) -> str:
+    return f"{prefijo}{indice}@{DOMINIO}"
+
+
+def hashear(password: str, rondas: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rondas)).decode('utf-8')
+
+
+def actividad_sintetica(rng: random.Random) -> dict:
+    """Actividad en claro con la misma forma que ActividadCreate"""
+    ahora = datetime.now()
+    return {
+        "Nombre": " ".join(rng.choices(PALABRAS, k=3)).capitalize(),
+        "Categoria": rng.choice(CATEGORIAS),
+        "Descripcion": " ".join(rng.choices(PALABRAS, k=rng.randint(5, 30))),
+        "Prioridad": rng.choice([1, 2, 3, None]),
+        "Fin": ahora + timedelta(days=rng.randint(-30, 90)),
+        "Estatus": rng.choice(ESTATUS),
+        "mailto": [
+            {"to": f"{rng.choice(PALABRAS)}{rng.randint(1, 999)}@ejemplo.com"}
+            for _ in range(rng.randint(0, 2))
+        ],
+    }
+
+
+def sembrar_actividades(usuario_ids, actividades: int, lote: int, semilla: int) -> int:
+    """Inserta las actividades de un grupo de usuarios (se ejecuta en un proceso del pool)"""
+    client = MongoClient(MONGODB_URL)
+    coleccion = client[DATABASE_NAME].actividades
+    insertadas = 0
+    try:
+        for usuario_id in usuario_ids:
+            rng = random.Random(f"{semilla}-{usuario_id}")
+            documentos = []
+            for _ in range(actividades):
+                documento = actividad_sintetica(rng)
+                documento["Fecha"] = datetime.now() - timedelta(days=rng.randint(0, 365))
+                documento["usuario_id"] = usuario_id
+                documento = ActividadBase.encrypt_sensitive_data(documento)
+                documento["schema_version"] = SCHEMA_VERSION
+                documentos.append(documento)
+                if len(documentos) >= lote:
+                    coleccion.insert_many(documentos, ordered=False)
+                    insertadas += len(documentos)
+                    documentos = []
+            if documentos:
+                coleccion.insert_many(documentos, ordered=False)
+                insertadas += len(documentos)
+    finally:
+        client.close()
+    return insertadas
+
+
+def sembrar(args):
+    client = MongoClient(MONGODB_URL)
+    database = client[DATABASE_NAME]
+    print(f"🔌 Conectado a {MONGODB_URL} - Database: {DATABASE_NAME}")
+
+    patron = {"email": {"$regex": f"^{args.prefijo}[0-9]+@{DOMINIO}$"}}
+    if args.limpiar:
+        ids = [str(u["_id"]) for u in database.usuarios.find(patron, {"_id": 1})]
+        database.actividades.delete_many({"usuario_id": {"$in": ids}})
+        database.usuarios.delete_many(patron)
+        print(f"🧹 Eliminados {len(ids)} usuarios sintéticos anteriores y sus actividades")
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        print(f"🔐 Generando {args.usuarios} hashes bcrypt (rondas={args.rondas}, procesos={args.procesos})...")
+        hashes = list(pool.map(hashear, [args.password] * args.usuarios, [args.rondas] * args.usuarios,
+                               chunksize=max(1, args.usuarios // (args.procesos * 4))))
+        ahora = datetime.now()
+        usuarios = [
+            {
+                "nombre": f"Usuario carga {i}",
+                "email": email_usuario(args.prefijo, i),
+                "activo": True,
+                "password": hashes[i],
+                "fecha_creacion": ahora,
+                "fecha_actualizacion": ahora,
+            }
+            for i in range(args.usuarios)
+        ]
+        usuario_ids = [str(_id) for _id in database.usuarios.insert_many(usuarios).inserted_ids]
+        print(f"👤 {len(usuario_ids)} usuarios insertados ({time.perf_counter() - inicio:.1f}s)")
+
+        grupos = [usuario_ids[i::args.procesos] for i in range(args.procesos)]
+        futuros = [pool.submit(sembrar_actividades, grupo, args.actividades, args.lote, args.semilla)
+                   for grupo in grupos if grupo]
+        total = sum(f.result() for f in futuros)
+    client.close()
+
+    duracion = time.perf_counter() - inicio
+    print(f"✅ {total} actividades insertadas en {duracion:.1f}s ({total / max(duracion, 1e-9):.0f} docs/s)")
+    print(f"🔑 Password de todos los usuarios sintéticos: {args.password}")
+
+
+# --- Ejecución de la carga ---
+
+class Registro:
+    """Acumula latencias por endpoint desde los hilos de un proceso"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+        self.ultima = 0.0  # Fin (epoch) de la última petición medida
+
+    def medir(self, endpoint: str, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            respuesta = funcion(*args, **kwargs)
+            ok = respuesta.status_code < 400
+        except requests.RequestException:
+            respuesta, ok = None, False
+        duracion = time.perf_counter() - inicio
+        with self.lock:
+            self.latencias.setdefault(endpoint, []).append(duracion)
+            self.ultima = max(self.ultima, time.time())
+            if not ok:
+                self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+        return respuesta if ok else None
+
+
+def percentil(valores_ordenados, p: float) -> float:
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def usuario_virtual(url: str, email: str, password: str, registro: Registro, fin: float, semilla: int):
+    rng = random.Random(semilla)
+    sesion = requests.Session()
+    respuesta = registro.medir("POST /sesion/login", sesion.post, f"{url}/sesion/login",
+                               json={"email": email, "password": password})
+    if respuesta is None:
+        return
+    sesion.headers["Authorization"] = f"Bearer {respuesta.json()['access_token']}"
+
+    conocidas, propias = [], []
+    escenarios, pesos = zip(*ESCENARIOS)
+    while time.time() < fin:
+        escenario = rng.choices(escenarios, weights=pesos)[0]
+        if escenario in ("actualizar", "eliminar") and not propias:
+            escenario = "crear"  # Sin actividades propias todavía: cada vuelta hace una petición
+        if escenario == "listar" or not conocidas:
+            respuesta = registro.medir("GET /actividades/", sesion.get, f"{url}/actividades/")
+            if respuesta is not None:
+                conocidas = [a["_id"] for a in respuesta.json()[:200]]
+        elif escenario == "obtener":
+            registro.medir("GET /actividades/{id}", sesion.get, f"{url}/actividades/{rng.choice(conocidas)}")
+        elif escenario == "crear":
+            cuerpo = actividad_sintetica(rng)
+            cuerpo["Fin"] = cuerpo["Fin"].isoformat()
+            respuesta = registro.medir("POST /actividades/", sesion.post, f"{url}/actividades/", json=cuerpo)
+            if respuesta is not None:
+                propias.append(respuesta.json()["_id"])
+        elif escenario == "actualizar":
+            cuerpo = actividad_sintetica(rng)
+            cuerpo["Fin"] = cuerpo["Fin"].isoformat()
+            registro.medir("PUT /actividades/{id}", sesion.put, f"{url}/actividades/{rng.choice(propias)}", json=cuerpo)
+        elif escenario == "alternar":
+            registro.medir("PATCH /actividades/{id}/alternar_estado", sesion.patch,
+                           f"{url}/actividades/{rng.choice(conocidas)}/alternar_estado")
+        elif escenario == "reordenar":
+            registro.medir("POST /actividades/reordenar_prioridad", sesion.post, f"{url}/actividades/reordenar_prioridad")
+        elif escenario == "eliminar":
+            registro.medir("DELETE /actividades/{id}", sesion.delete, f"{url}/actividades/{propias.pop()}")
+
+    # Eliminar lo creado para que las rondas sean comparables
+    for actividad_id in propias:
+        sesion.delete(f"{url}/actividades/{actividad_id}")
+
+
+def generar_carga(url: str, usuarios, password: str, duracion: float, barrera):
+    """Punto de entrada de cada proceso: un hilo por usuario virtual (email, semilla) durante 'duracion'
+
+    La ventana empieza cuando todos los procesos del nivel han llegado a la
+    barrera, así el arranque de los workers no se come parte de la medida.
+    Devuelve latencias, errores y los segundos desde ese inicio hasta la
+    última petición medida.
+    """
+    registro = Registro()
+    barrera.wait(timeout=ESPERA_BARRERA)
+    inicio = time.time()
+    fin = inicio + duracion
+    hilos = [
+        threading.Thread(target=usuario_virtual, args=(url, email, password, registro, fin, semilla), daemon=True)
+        for email, semilla in usuarios
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return registro.latencias, registro.errores, max(0.0, registro.ultima - inicio)
+
+
+def ejecutar_nivel(args, concurrencia: int, pool: ProcessPoolExecutor, gestor) -> dict:
+    usuarios = [
+        (email_usuario(args.prefijo, random.Random(args.semilla + i).randrange(args.usuarios)), args.semilla + i)
+        for i in range(concurrencia)
+    ]
+    # Reparto de los usuarios virtuales entre los procesos; todos empiezan a medir a la vez tras la barrera
+    grupos = [usuarios[i::args.procesos] for i in range(min(args.procesos, concurrencia))]
+    barrera = gestor.Barrier(len(grupos))
+    futuros = [pool.submit(generar_carga, args.url, grupo, args.password, args.duracion, barrera) for grupo in grupos]
+    latencias_por_endpoint, errores, duracion = {}, {}, 0.0
+    for futuro in futuros:
+        latencias, errores_proceso, duracion_proceso = futuro.result()
+        duracion = max(duracion, duracion_proceso)
+        for endpoint, valores in latencias.items():
+            latencias_por_endpoint.setdefault(endpoint, []).extend(valores)
+        for endpoint, cantidad in errores_proceso.items():
+            errores[endpoint] = errores.get(endpoint, 0) + cantidad
+    duracion = duracion or args.duracion
+
+    endpoints = {}
+    for endpoint, latencias in sorted(latencias_por_endpoint.items()):
+        latencias.sort()
+        endpoints[endpoint] = {
+            "peticiones": len(latencias),
+            "errores": errores.get(endpoint, 0),
+            "rps": len(latencias) / duracion,
+            "p50_ms": percentil(latencias, 50) * 1000,
+            "p95_ms": percentil(latencias, 95) * 1000,
+            "p99_ms": percentil(latencias, 99) * 1000,
+        }
+    total = sum(e["peticiones"] for e in endpoints.values())
+    todas = sorted(l for latencias in latencias_por_endpoint.values() for l in latencias)
+    return {
+        "concurrencia": concurrencia,
+        "procesos": len(grupos),
+        "duracion_s": duracion,
+        "rps": total / duracion,
+        "p95_ms": percentil(todas, 95) * 1000,
+        "errores": sum(errores.values()),
+        "endpoints": endpoints,
+    }
+
+
+def imprimir_nivel(nivel: dict):
+    print(f"\n📊 Concurrencia {nivel['concurrencia']} ({nivel.get('procesos', 1)} procesos): {nivel['rps']:.1f} req/s, "
+          f"p95 global {nivel['p95_ms']:.1f} ms, errores {nivel['errores']}")
+    print(f"{'endpoint':<42}{'n':>8}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, e in nivel["endpoints"].items():
+        print(f"{endpoint:<42}{e['peticiones']:>8}{e['errores']:>6}{e['rps']:>9.1f}"
+              f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}")
+
+
+def codo(niveles) -> dict:
+    """Primer nivel a partir del cual más concurrencia casi no aumenta el throughput (<10%)"""
+    for anterior, actual in zip(niveles, niveles[1:]):
+        if actual["rps"] < anterior["rps"] * 1.10:
+            return anterior
+    return niveles[-1] if niveles else None
+
+
+def comparar(base: dict, actual: dict):
+    print("\n🔍 Comparación con la build base (p95 y req/s por endpoint)")
+    niveles_base = {n["concurrencia"]: n for n in base["niveles"]}
+    for nivel in actual["niveles"]:
+        anterior = niveles_base.get(nivel["concurrencia"])
+        if not anterior:
+            continue
+        print(f"-- Concurrencia {nivel['concurrencia']}: {anterior['rps']:.1f} -> {nivel['rps']:.1f} req/s")
+        for endpoint, e in nivel["endpoints"].items():
+            b = anterior["endpoints"].get(endpoint)
+            if not b or not b["p95_ms"]:
+                continue
+            delta = (e["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100
+            print(f"   {endpoint:<42} p95 {b['p95_ms']:>8.1f} -> {e['p95_ms']:>8.1f} ms ({delta:+.0f}%)")
+
+
+def iniciar_servidor(args):
+    proceso = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "mongoapi:app",
+        "--host", "127.0.0.1", "--port", str(args.puerto),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ], env={**os.environ, "WEB_CONCURRENCY": str(args.workers)})  # Para que la API sepa cuántos workers hay
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            if requests.get(f"{args.url}/health", timeout=1).json().get("status") == "ok":
+                print(f"🚀 Servidor iniciado en {args.url} (workers={args.workers})")
+                return proceso
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    proceso.terminate()
+    raise SystemExit("❌ El servidor no respondió en /health")
+
+
+def ejecutar(args):
+    if args.iniciar_servidor:
+        args.url = f"http://127.0.0.1:{args.puerto}"
+    proceso = iniciar_servidor(args) if args.iniciar_servidor else None
+    try:
+        niveles = []
+        # El pool se crea una vez para todos los niveles; el gestor aloja la barrera de arranque de cada nivel
+        with ProcessPoolExecutor(max_workers=args.procesos) as pool, multiprocessing.Manager() as gestor:
+            for concurrencia in [int(c) for c in args.concurrencias.split(",")]:
+                nivel = ejecutar_nivel(args, concurrencia, pool, gestor)
+                imprimir_nivel(nivel)
+                niveles.append(nivel)
+    finally:
+        if proceso:
+            proceso.terminate()
+            proceso.wait()
+
+    rodilla = codo(niveles)
+    if rodilla:
+        print(f"\n📈 Codo de la curva: concurrencia {rodilla['concurrencia']} "
+              f"({rodilla['rps']:.1f} req/s, p95 {rodilla['p95_ms']:.1f} ms)")
+
+    resultado = {"fecha": datetime.now().isoformat(), "url": args.url, "duracion_s": args.duracion, "niveles": niveles}
+    if args.comparar:
+        with open(args.comparar) as f:
+            comparar(json.load(f), resultado)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"💾 Resultados guardados en {args.salida}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de actividades")
+    parser.add_argument("--prefijo", default="carga", help="Prefijo de los emails sintéticos")
+    parser.add_argument("--password", default="Carga123!", help="Password de los usuarios sintéticos")
+    parser.add_argument("--semilla", type=int, default=42)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_sembrar = sub.add_parser("sembrar", help="Genera usuarios y actividades en MongoDB")
+    p_sembrar.add_argument("--usuarios", type=int, default=100)
+    p_sembrar.add_argument("--actividades", type=int, default=50, help="Actividades por usuario")
+    p_sembrar.add_argument("--rondas", type=int, default=12, help="Coste de bcrypt")
+    p_sembrar.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    p_sembrar.add_argument("--lote", type=int, default=1000, help="Documentos por insert_many")
+    p_sembrar.add_argument("--limpiar", action="store_true", help="Elimina antes los datos sintéticos previos")
+
+    p_ejecutar = sub.add_parser("ejecutar", help="Lanza la carga contra la API")
+    p_ejecutar.add_argument("--url", default="http://localhost:8800")
+    p_ejecutar.add_argument("--usuarios", type=int, default=100, help="Usuarios sembrados entre los que elegir")
+    p_ejecutar.add_argument("--concurrencias", default="1,4,16,64", help="Niveles de usuarios virtuales")
+    p_ejecutar.add_argument("--duracion", type=float, default=30, help="Segundos por nivel")
+    p_ejecutar.add_argument("--salida", help="Guarda los resultados en JSON")
+    p_ejecutar.add_argument("--comparar", help="JSON de una ejecución anterior para comparar")
+    p_ejecutar.add_argument("--iniciar-servidor", action="store_true", help="Lanza uvicorn mongoapi:app")
+    p_ejecutar.add_argument("--puerto", type=int, default=8801)
+    p_ejecutar.add_argument("--workers", type=int, default=1)
+    p_ejecutar.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                            help="Procesos que generan la carga (se reparten los usuarios virtuales)")
+
+    args = parser.parse_args()
+    if args.comando == "sembrar":
+        sembrar(args)
+    else:
+        ejecutar(args)
@@ -0,0 +1,159 @@
+"""
+Orden de las actividades abiertas con claves de rango fraccionarias.
+
+Cada actividad ordenada guarda en 'Rango' un string en base 62 cuyo orden
+lexicográfico es el orden de la lista. Mover una actividad entre dos vecinas
+solo escribe su propia clave (un punto intermedio entre las de las vecinas),
+así que no hay que reescribir la Prioridad de las demás.
+
+Las claves se alargan cuando se inserta muchas veces en el mismo hueco; si una
+supera RANGO_LONGITUD_MAXIMA se reparten de nuevo todas las del usuario a
+intervalos regulares (rebalanceo, en segundo plano tras la respuesta).
+
+Para los clientes existentes 'Prioridad' se deriva de la posición (1..n) entre
+las actividades abiertas del usuario, igual en el listado, el detalle y las
+respuestas de escritura. Cuando el usuario ya usa rangos, escribir una
+Prioridad (al crear o actualizar) coloca la actividad en esa posición.
+"""
+
+import os
+import string
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+from cache_actividades import cache
+from repositorios import ESTATUS_CERRADOS
+
+load_dotenv("config.env")
+
+RANGO_LONGITUD_MAXIMA = int(os.getenv("RANGO_LONGITUD_MAXIMA", 8))
+
+# Dígitos en orden ASCII, para que el orden de los strings sea el numérico
+DIGITOS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+BASE = len(DIGITOS)
+
+
+def rango_entre(antes: Optional[str], despues: Optional[str]) -> str:
+    """Clave estrictamente entre 'antes' y 'despues' (None = sin límite).
+    Las claves se tratan como fracciones 0.d1d2... y nunca acaban en '0'."""
+    antes = antes or ""
+    prefijo = ""
+    i = 0
+    while True:
+        a = DIGITOS.index(antes[i]) if i < len(antes) else 0
+        b = DIGITOS.index(despues[i]) if despues is not None and i < len(despues) else BASE
+        if a == b:
+            prefijo += DIGITOS[a]
+        elif (a + b) // 2 > a:
+            return prefijo + DIGITOS[(a + b) // 2]
+        else:
+            # Dígitos consecutivos: se fija el de abajo y el límite superior deja de importar
+            prefijo += DIGITOS[a]
+            despues = None
+        i += 1
+
+
+def rangos_equiespaciados(cantidad: int) -> List[str]:
+    """'cantidad' claves ordenadas y repartidas a intervalos regulares"""
+    longitud = 2
+    while BASE ** longitud <= cantidad * 4:
+        longitud += 1
+    paso = BASE ** longitud // (cantidad + 1)
+    claves = []
+    for k in range(1, cantidad + 1):
+        valor = k * paso
+        digitos = []
+        for _ in range(longitud):
+            valor, resto = divmod(valor, BASE)
+            digitos.append(DIGITOS[resto])
+        claves.append("".join(reversed(digitos)).rstrip("0"))
+    return claves
+
+
+def derivar_prioridades(documentos: List[dict]):
+    """Si el usuario usa rangos, asigna Prioridad = posición entre sus actividades abiertas
+    (primero las que tienen Rango, en su orden; después las demás por Prioridad)"""
+    abiertas = [documento for documento in documentos if documento.get("Estatus") not in ESTATUS_CERRADOS]
+    if not any(documento.get("Rango") for documento in abiertas):
+        return
+    for posicion, documento in enumerate(ordenar(abiertas), start=1):
+        documento["Prioridad"] = posicion
+
+
+def ordenar(abiertas: List[dict]) -> List[dict]:
+    """Orden de la lista: por Rango y, detrás, las que no tienen Rango por Prioridad (nulas al final)"""
+    con_rango = sorted((d for d in abiertas if d.get("Rango")), key=lambda d: (d["Rango"], d["_id"]))
+    sin_rango = sorted(
+        (d for d in abiertas if not d.get("Rango")),
+        key=lambda d: (d.get("Prioridad") is None, d.get("Prioridad") or 0, d["_id"]),
+    )
+    return con_rango + sin_rango
+
+
+async def posicion(repos, usuario_id: str, documento: dict) -> Optional[int]:
+    """Prioridad derivada de una actividad, la misma que le da derivar_prioridades en la lista;
+    None si está cerrada o el usuario no usa rangos"""
+    if documento.get("Estatus") in ESTATUS_CERRADOS:
+        return None
+    if documento.get("Rango"):
+        return await repos.actividades.contar_antes(usuario_id, documento["Rango"], documento["_id"]) + 1
+    if not await repos.actividades.usa_rangos(usuario_id):
+        return None
+    # Abierta sin Rango de un usuario con rangos (p. ej. reabierta): va detrás de las ordenadas
+    ordenadas = await repos.actividades.listar_ordenadas(usuario_id)
+    return next((i for i, d in enumerate(ordenadas, start=1) if d["_id"] == documento["_id"]), None)
+
+
+async def rango_para_posicion(repos, usuario_id: str, prioridad: Optional[int], actividad_id: Optional[str] = None) -> str:
+    """Clave que deja la actividad en la posición 'prioridad' (1..n) de la lista; None = al final.
+    Solo se leen los recuentos y las claves de las dos vecinas, y solo se escribe la actividad colocada."""
+    for intento in range(2):
+        con_rango, sin_rango = await repos.actividades.contar_ordenadas(usuario_id, actividad_id)
+        total = con_rango + sin_rango
+        indice = total if prioridad is None else min(max(prioridad, 1), total + 1) - 1
+        # Las vecinas tienen que tener Rango: la posición cae entre las ordenadas (o al final si todas lo tienen)
+        if indice < con_rango or not sin_rango:
+            vecinas = await rangos_vecinos(repos, usuario_id, indice, con_rango, actividad_id)
+            if vecinas is not None:
+                anterior, siguiente = vecinas
+                if anterior is None or siguiente is None or anterior < siguiente:
+                    return rango_entre(anterior, siguiente)
+        if intento:
+            break
+        # Vecinas sin Rango, con claves repetidas o una lista que cambió mientras se leía
+        await rebalancear(repos, usuario_id)
+    raise ValueError("No se pudo calcular el rango de la actividad")
+
+
+async def rangos_vecinos(repos, usuario_id: str, indice: int, con_rango: int,
+                         excluir_id: Optional[str] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """Claves de las posiciones indice-1 e indice entre las abiertas con Rango (None fuera de la lista),
+    leídas desde el extremo más cercano; None si la lista cambió entre el recuento y la lectura"""
+    desde, hasta = max(indice - 1, 0), min(indice, con_rango - 1)
+    if hasta < desde:
+        return None, None
+    cantidad = hasta - desde + 1
+    if desde <= con_rango - 1 - hasta:
+        claves = await repos.actividades.rangos_ordenados(usuario_id, desde, cantidad, excluir_id)
+    else:
+        claves = await repos.actividades.rangos_ordenados(usuario_id, con_rango - 1 - hasta, cantidad, excluir_id, descendente=True)
+        claves.reverse()
+    if len(claves) < cantidad:
+        return None
+    por_posicion = dict(zip(range(desde, hasta + 1), claves))
+    return por_posicion.get(indice - 1), por_posicion.get(indice)
+
+
+async def rebalancear(repos, usuario_id: str) -> int:
+    """Reparte de nuevo las claves de todas las actividades abiertas del usuario conservando
+    su orden; las que aún no tenían Rango quedan al final. Devuelve cuántas se escribieron."""
+    ordenadas = await repos.actividades.listar_ordenadas(usuario_id)
+    rangos = {
+        documento["_id"]: rango
+        for documento, rango in zip(ordenadas, rangos_equiespaciados(len(ordenadas)))
+        if documento.get("Rango") != rango
+    }
+    await repos.actividades.asignar_rangos(usuario_id, rangos)
+    if rangos:
+        await cache.invalidar(usuario_id)
+    return len(rangos)
@@ -0,0 +1,21 @@
+from fastapi import HTTPException, Request
+
+from repositorios.base import (
+    ActividadesRepositorio,
+    Repositorios,
+    UsuariosRepositorio,
+    ESTATUS_CERRADOS,
+    COLECCIONES_ACTIVIDADES,
+)
+from repositorios.memoria import crear_repositorios_memoria
+from repositorios.mongo import crear_repositorios_mongo
+
+async def get_repositorios(request: Request):
+    # Los crea el lifespan de mongoapi y se comparten en app.state
+    repositorios = request.app.state.repositorios
+    if repositorios is None:
+        raise HTTPException(
+            status_code=500, 
+            detail="Error de conexión a la base de datos. Verifica que MongoDB esté conectado."
+        )
+    return repositorios
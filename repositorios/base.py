@@ -0,0 +1,145 @@
+"""
+Interfaces de acceso a datos usadas por los routers.
+
+Los documentos se intercambian como dicts con la misma forma que en MongoDB,
+salvo '_id', que siempre es un string.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Estatus que se consideran cerrados (no participan en la priorización)
+ESTATUS_CERRADOS = ["Finalizado", "Cerrado"]
+
+# Colecciones con documentos de actividades: la activa y el archivo de cerradas
+COLECCIONES_ACTIVIDADES = ("actividades", "actividades_archivo")
+
+
+class UsuariosRepositorio(ABC):
+    @abstractmethod
+    async def buscar_por_email(self, email: str) -> Optional[dict]:
+        """Usuario completo (con password) o None"""
+
+    @abstractmethod
+    async def obtener(self, usuario_id: str) -> Optional[dict]:
+        """Usuario sin password o None"""
+
+    @abstractmethod
+    async def listar(self) -> List[dict]:
+        """Todos los usuarios, sin password"""
+
+    @abstractmethod
+    async def crear(self, documento: dict) -> str:
+        """Inserta el usuario y devuelve su id"""
+
+    @abstractmethod
+    async def crear_lote(self, documentos: List[dict]) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        """Inserta varios usuarios sin detenerse en los errores.
+        Devuelve los ids por posición (None si falló) y el error de cada posición fallida
+        ('email_duplicado' si el email ya existía)."""
+
+    @abstractmethod
+    async def asegurar_indices(self):
+        """Crea los índices necesarios (email único)"""
+
+    @abstractmethod
+    async def email_unico(self) -> bool:
+        """True si el índice único de email existe (el alta masiva depende de él)"""
+
+    @abstractmethod
+    async def actualizar(self, usuario_id: str, cambios: dict) -> bool:
+        """Aplica los cambios; False si el usuario no existe"""
+
+    @abstractmethod
+    async def eliminar(self, usuario_id: str) -> bool:
+        """False si el usuario no existe"""
+
+
+class ActividadesRepositorio(ABC):
+    @abstractmethod
+    async def listar(self, usuario_id: str, incluir_archivadas: bool = False) -> List[dict]:
+        """Todas las actividades del usuario ordenadas por (Rango, _id), las que no tienen Rango al final
+        por _id (con incluir_archivadas, detrás van también las del archivo)"""
+
+    @abstractmethod
+    async def obtener(self, actividad_id: str, usuario_id: str, incluir_archivadas: bool = False) -> Optional[dict]:
+        """Actividad del usuario o None (con incluir_archivadas, la busca también en el archivo)"""
+
+    @abstractmethod
+    async def crear(self, documento: dict) -> str:
+        """Inserta la actividad y devuelve su id"""
+
+    @abstractmethod
+    async def actualizar(self, actividad_id: str, usuario_id: str, cambios: dict, eliminar: List[str] = ()) -> bool:
+        """Asigna 'cambios' y quita los campos de 'eliminar'; False si no existe"""
+
+    @abstractmethod
+    async def cambiar_estatus(self, actividad_id: str, usuario_id: str, estatus: str) -> bool:
+        """Cambia el Estatus y marca (o quita) fecha_cierre; False si no existe"""
+
+    @abstractmethod
+    async def eliminar(self, actividad_id: str, usuario_id: str) -> bool:
+        """Elimina la actividad, esté en la colección activa o en el archivo; False si no existe"""
+
+    @abstractmethod
+    async def listar_abiertas(self, usuario_id: str) -> List[dict]:
+        """Actividades del usuario cuyo Estatus no está en ESTATUS_CERRADOS"""
+
+    @abstractmethod
+    async def actualizar_prioridades(self, usuario_id: str, prioridades: Dict[str, int]):
+        """Asigna Prioridad a varias actividades del usuario (id -> prioridad)"""
+
+    @abstractmethod
+    async def listar_ordenadas(self, usuario_id: str) -> List[dict]:
+        """Abiertas ordenadas por Rango; detrás, las que no tienen Rango, por Prioridad (nulas al final)"""
+
+    @abstractmethod
+    async def adyacente(self, usuario_id: str, rango: str, anterior: bool, excluir_id: str) -> Optional[dict]:
+        """Abierta con Rango inmediatamente anterior (o posterior) a 'rango', sin contar 'excluir_id'"""
+
+    @abstractmethod
+    async def contar_antes(self, usuario_id: str, rango: str, actividad_id: str) -> int:
+        """Número de abiertas con Rango que van antes de (rango, actividad_id) en la lista"""
+
+    @abstractmethod
+    async def contar_ordenadas(self, usuario_id: str, excluir_id: Optional[str] = None) -> Tuple[int, int]:
+        """(con Rango, sin Rango) entre las abiertas del usuario, sin contar 'excluir_id'"""
+
+    @abstractmethod
+    async def rangos_ordenados(self, usuario_id: str, saltar: int, limite: int, excluir_id: Optional[str] = None,
+                               descendente: bool = False) -> List[str]:
+        """Solo las claves: Rango de las abiertas con Rango en el orden de la lista (o el inverso),
+        a partir de la posición 'saltar' y como mucho 'limite', sin contar 'excluir_id'"""
+
+    @abstractmethod
+    async def usa_rangos(self, usuario_id: str) -> bool:
+        """Indica si alguna actividad abierta del usuario tiene Rango"""
+
+    @abstractmethod
+    async def asignar_rangos(self, usuario_id: str, rangos: Dict[str, str]):
+        """Asigna Rango a varias actividades del usuario (id -> rango)"""
+
+    @abstractmethod
+    async def restaurar(self, actividad_id: str, usuario_id: str) -> Optional[dict]:
+        """Devuelve una actividad archivada a la colección activa sin cambiar su Estatus; None si no está
+        archivada. Si está cerrada, su fecha_cierre pasa a ser ahora para que no se archive de nuevo enseguida."""
+
+    @abstractmethod
+    async def archivar_lote(self, antes_de: datetime, limite: int) -> List[str]:
+        """Mueve al archivo hasta 'limite' actividades cerradas antes de 'antes_de'
+        (fecha_cierre, o Fecha si no la tienen); devuelve el usuario_id de cada una.
+        Las que cambian mientras se copian se quedan en la colección activa."""
+
+    @abstractmethod
+    async def asegurar_indices(self):
+        """Crea los índices de la colección activa y del archivo"""
+
+
+class Repositorios:
+    """Conjunto de repositorios que reciben los routers"""
+
+    def __init__(self, usuarios: UsuariosRepositorio, actividades: ActividadesRepositorio, nombre: str):
+        self.usuarios = usuarios
+        self.actividades = actividades
+        self.nombre = nombre
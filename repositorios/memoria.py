@@ -0,0 +1,261 @@
+"""
+Repositorios en memoria, indexados por usuario.
+
+Permiten ejecutar la API completa sin MongoDB (ALMACENAMIENTO=memoria), útil
+para desarrollo rápido y para medir solo rutas, cifrado y serialización.
+Los datos se pierden al reiniciar el proceso.
+"""
+
+import copy
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+
+from repositorios.base import ActividadesRepositorio, Repositorios, UsuariosRepositorio, ESTATUS_CERRADOS
+
+
+class UsuariosMemoria(UsuariosRepositorio):
+    def __init__(self):
+        self.usuarios: Dict[str, dict] = {}
+        self.por_email: Dict[str, str] = {}
+
+    async def buscar_por_email(self, email: str) -> Optional[dict]:
+        usuario_id = self.por_email.get(email)
+        return copy.deepcopy(self.usuarios[usuario_id]) if usuario_id else None
+
+    async def obtener(self, usuario_id: str) -> Optional[dict]:
+        usuario = self.usuarios.get(usuario_id)
+        if usuario is None:
+            return None
+        return {k: copy.deepcopy(v) for k, v in usuario.items() if k != "password"}
+
+    async def listar(self) -> List[dict]:
+        return [await self.obtener(usuario_id) for usuario_id in self.usuarios]
+
+    async def crear(self, documento: dict) -> str:
+        usuario_id = str(ObjectId())
+        self.usuarios[usuario_id] = {**copy.deepcopy(documento), "_id": usuario_id}
+        self.por_email[documento["email"]] = usuario_id
+        return usuario_id
+
+    async def crear_lote(self, documentos: List[dict]) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        ids, errores = [], {}
+        for i, documento in enumerate(documentos):
+            if documento["email"] in self.por_email:
+                ids.append(None)
+                errores[i] = "email_duplicado"
+            else:
+                ids.append(await self.crear(documento))
+        return ids, errores
+
+    async def asegurar_indices(self):
+        # El índice por email (self.por_email) ya es único
+        pass
+
+    async def email_unico(self) -> bool:
+        return True
+
+    async def actualizar(self, usuario_id: str, cambios: dict) -> bool:
+        usuario = self.usuarios.get(usuario_id)
+        if usuario is None:
+            return False
+        if "email" in cambios and cambios["email"] != usuario["email"]:
+            self.por_email.pop(usuario["email"], None)
+            self.por_email[cambios["email"]] = usuario_id
+        usuario.update(copy.deepcopy(cambios))
+        return True
+
+    async def eliminar(self, usuario_id: str) -> bool:
+        usuario = self.usuarios.pop(usuario_id, None)
+        if usuario is None:
+            return False
+        self.por_email.pop(usuario["email"], None)
+        return True
+
+
+class ActividadesMemoria(ActividadesRepositorio):
+    def __init__(self):
+        # usuario_id -> {actividad_id -> documento}
+        self.por_usuario: Dict[str, Dict[str, dict]] = {}
+        # usuario_id -> [(Prioridad, actividad_id)] ordenado, solo actividades abiertas con prioridad
+        self.prioridades: Dict[str, List[Tuple[int, str]]] = {}
+        # usuario_id -> {actividad_id -> documento} de las actividades archivadas
+        self.archivo: Dict[str, Dict[str, dict]] = {}
+
+    @staticmethod
+    def _clave_prioridad(documento: dict) -> Optional[Tuple[int, str]]:
+        prioridad = documento.get("Prioridad")
+        if prioridad is None or documento.get("Estatus") in ESTATUS_CERRADOS:
+            return None
+        return (prioridad, documento["_id"])
+
+    def _indexar(self, usuario_id: str, documento: dict):
+        clave = self._clave_prioridad(documento)
+        if clave is not None:
+            insort(self.prioridades.setdefault(usuario_id, []), clave)
+
+    def _desindexar(self, usuario_id: str, documento: dict):
+        clave = self._clave_prioridad(documento)
+        indice_prioridades = self.prioridades.get(usuario_id)
+        if clave is None or not indice_prioridades:
+            return
+        posicion = bisect_left(indice_prioridades, clave)
+        if posicion < len(indice_prioridades) and indice_prioridades[posicion] == clave:
+            del indice_prioridades[posicion]
+
+    async def listar(self, usuario_id: str, incluir_archivadas: bool = False) -> List[dict]:
+        # Mismo orden que MongoDB: por (Rango, _id) y, al final, las que no tienen Rango por _id
+        documentos = sorted(
+            self.por_usuario.get(usuario_id, {}).values(),
+            key=lambda d: (not d.get("Rango"), d.get("Rango") or "", d["_id"]),
+        )
+        if incluir_archivadas:
+            documentos += list(self.archivo.get(usuario_id, {}).values())
+        return copy.deepcopy(documentos)
+
+    async def obtener(self, actividad_id: str, usuario_id: str, incluir_archivadas: bool = False) -> Optional[dict]:
+        documento = self.por_usuario.get(usuario_id, {}).get(actividad_id)
+        if documento is None and incluir_archivadas:
+            documento = self.archivo.get(usuario_id, {}).get(actividad_id)
+        return copy.deepcopy(documento) if documento is not None else None
+
+    async def crear(self, documento: dict) -> str:
+        actividad_id = str(ObjectId())
+        nuevo = {**copy.deepcopy(documento), "_id": actividad_id}
+        self.por_usuario.setdefault(nuevo["usuario_id"], {})[actividad_id] = nuevo
+        self._indexar(nuevo["usuario_id"], nuevo)
+        return actividad_id
+
+    async def actualizar(self, actividad_id: str, usuario_id: str, cambios: dict, eliminar: List[str] = ()) -> bool:
+        documento = self.por_usuario.get(usuario_id, {}).get(actividad_id)
+        if documento is None:
+            return False
+        self._desindexar(usuario_id, documento)
+        documento.update(copy.deepcopy(cambios))
+        for campo in eliminar:
+            documento.pop(campo, None)
+        self._indexar(usuario_id, documento)
+        return True
+
+    async def cambiar_estatus(self, actividad_id: str, usuario_id: str, estatus: str) -> bool:
+        if estatus in ESTATUS_CERRADOS:
+            return await self.actualizar(actividad_id, usuario_id, {"Estatus": estatus, "fecha_cierre": datetime.now()})
+        return await self.actualizar(actividad_id, usuario_id, {"Estatus": estatus}, eliminar=["fecha_cierre"])
+
+    async def eliminar(self, actividad_id: str, usuario_id: str) -> bool:
+        documento = self.por_usuario.get(usuario_id, {}).pop(actividad_id, None)
+        if documento is None:
+            return self.archivo.get(usuario_id, {}).pop(actividad_id, None) is not None
+        self._desindexar(usuario_id, documento)
+        return True
+
+    async def listar_abiertas(self, usuario_id: str) -> List[dict]:
+        """Abiertas con prioridad en orden ascendente, seguidas de las abiertas sin prioridad"""
+        documentos = self.por_usuario.get(usuario_id, {})
+        con_prioridad = [documentos[actividad_id] for _, actividad_id in self.prioridades.get(usuario_id, [])]
+        sin_prioridad = [
+            documento for documento in documentos.values()
+            if documento.get("Prioridad") is None and documento.get("Estatus") not in ESTATUS_CERRADOS
+        ]
+        return copy.deepcopy(con_prioridad + sin_prioridad)
+
+    async def actualizar_prioridades(self, usuario_id: str, prioridades: Dict[str, int]):
+        for actividad_id, prioridad in prioridades.items():
+            await self.actualizar(actividad_id, usuario_id, {"Prioridad": prioridad})
+
+    def _abiertas_con_rango(self, usuario_id: str) -> List[dict]:
+        return sorted(
+            (
+                documento for documento in self.por_usuario.get(usuario_id, {}).values()
+                if documento.get("Rango") and documento.get("Estatus") not in ESTATUS_CERRADOS
+            ),
+            key=lambda documento: (documento["Rango"], documento["_id"]),
+        )
+
+    async def listar_ordenadas(self, usuario_id: str) -> List[dict]:
+        sin_rango = sorted(
+            (
+                documento for documento in self.por_usuario.get(usuario_id, {}).values()
+                if not documento.get("Rango") and documento.get("Estatus") not in ESTATUS_CERRADOS
+            ),
+            key=lambda documento: (documento.get("Prioridad") is None, documento.get("Prioridad") or 0, documento["_id"]),
+        )
+        return copy.deepcopy(self._abiertas_con_rango(usuario_id) + sin_rango)
+
+    async def adyacente(self, usuario_id: str, rango: str, anterior: bool, excluir_id: str) -> Optional[dict]:
+        candidatas = [
+            documento for documento in self._abiertas_con_rango(usuario_id)
+            if documento["_id"] != excluir_id and (documento["Rango"] < rango if anterior else documento["Rango"] > rango)
+        ]
+        if not candidatas:
+            return None
+        return copy.deepcopy(candidatas[-1] if anterior else candidatas[0])
+
+    async def contar_antes(self, usuario_id: str, rango: str, actividad_id: str) -> int:
+        return sum(
+            1 for documento in self._abiertas_con_rango(usuario_id)
+            if (documento["Rango"], documento["_id"]) < (rango, actividad_id)
+        )
+
+    async def contar_ordenadas(self, usuario_id: str, excluir_id: Optional[str] = None) -> Tuple[int, int]:
+        abiertas = [
+            documento for actividad_id, documento in self.por_usuario.get(usuario_id, {}).items()
+            if actividad_id != excluir_id and documento.get("Estatus") not in ESTATUS_CERRADOS
+        ]
+        con_rango = sum(1 for documento in abiertas if documento.get("Rango"))
+        return con_rango, len(abiertas) - con_rango
+
+    async def rangos_ordenados(self, usuario_id: str, saltar: int, limite: int, excluir_id: Optional[str] = None,
+                               descendente: bool = False) -> List[str]:
+        rangos = [d["Rango"] for d in self._abiertas_con_rango(usuario_id) if d["_id"] != excluir_id]
+        if descendente:
+            rangos.reverse()
+        return rangos[saltar:saltar + limite]
+
+    async def usa_rangos(self, usuario_id: str) -> bool:
+        return bool(self._abiertas_con_rango(usuario_id))
+
+    async def asignar_rangos(self, usuario_id: str, rangos: Dict[str, str]):
+        for actividad_id, rango in rangos.items():
+            await self.actualizar(actividad_id, usuario_id, {"Rango": rango})
+
+    async def restaurar(self, actividad_id: str, usuario_id: str) -> Optional[dict]:
+        documento = self.archivo.get(usuario_id, {}).pop(actividad_id, None)
+        if documento is None:
+            return None
+        documento.pop("archivado_en", None)
+        if documento.get("Estatus") in ESTATUS_CERRADOS:
+            documento["fecha_cierre"] = datetime.now()
+        self.por_usuario.setdefault(usuario_id, {})[actividad_id] = documento
+        self._indexar(usuario_id, documento)
+        return copy.deepcopy(documento)
+
+    @staticmethod
+    def _archivable(documento: dict, antes_de: datetime) -> bool:
+        # Como en MongoDB, las fechas que no son datetime (documentos antiguos) no cuentan
+        fecha = documento.get("fecha_cierre", documento.get("Fecha"))
+        return documento.get("Estatus") in ESTATUS_CERRADOS and isinstance(fecha, datetime) and fecha < antes_de
+
+    async def archivar_lote(self, antes_de: datetime, limite: int) -> List[str]:
+        movidas = []
+        ahora = datetime.now()
+        for usuario_id, documentos in self.por_usuario.items():
+            candidatas = [
+                actividad_id for actividad_id, documento in documentos.items()
+                if self._archivable(documento, antes_de)
+            ]
+            for actividad_id in candidatas[:limite - len(movidas)]:
+                documento = documentos.pop(actividad_id)
+                self.archivo.setdefault(usuario_id, {})[actividad_id] = {**documento, "archivado_en": ahora}
+                movidas.append(usuario_id)
+            if len(movidas) >= limite:
+                break
+        return movidas
+
+    async def asegurar_indices(self):
+        pass
+
+
+def crear_repositorios_memoria() -> Repositorios:
+    return Repositorios(UsuariosMemoria(), ActividadesMemoria(), "memoria")
@@ -0,0 +1,405 @@
+"""
+Repositorios sobre MongoDB (Motor).
+
+En un replica set cada ruta de lectura puede usar su propia read preference
+(LECTURA_LISTADOS, LECTURA_DETALLE, LECTURA_MUTACION: primary, primaryPreferred,
+secondary, secondaryPreferred o nearest, con MAX_STALENESS_SEGUNDOS) y cada
+operación de escritura su write concern (WRITE_CONCERN_CREAR, ..._ACTUALIZAR,
+..._ELIMINAR, ..._ALTERNAR, ..._PRIORIDADES, ..._ARCHIVAR, ..._USUARIOS: número
+o "majority").
+
+Con CONSISTENCIA_CAUSAL=true, tras una escritura el usuario lee dentro de una
+sesión causal avanzada hasta el tiempo de su última escritura, de modo que ve
+sus propios cambios aunque la lectura vaya a un secundario. Los tokens causales
+se guardan por proceso durante VENTANA_CAUSAL_SEGUNDOS y, para que valgan con
+varios workers, viajan también al cliente y vuelven con sus lecturas (ver
+causalidad.py).
+
+Las actividades cerradas antiguas se mueven a 'actividades_archivo' (ver
+archivado.py), así la colección activa y sus índices solo crecen con lo abierto.
+"""
+
+import os
+import time
+from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+import causalidad
+from repositorios.base import ActividadesRepositorio, Repositorios, UsuariosRepositorio, ESTATUS_CERRADOS
+
+
+MAX_STALENESS_SEGUNDOS = int(os.getenv("MAX_STALENESS_SEGUNDOS", 90))
+CONSISTENCIA_CAUSAL = os.getenv("CONSISTENCIA_CAUSAL", "false").lower() == "true"
+VENTANA_CAUSAL_SEGUNDOS = float(os.getenv("VENTANA_CAUSAL_SEGUNDOS", 300))
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Write concern por defecto de cada operación (se puede cambiar con WRITE_CONCERN_<OPERACION>)
+WRITE_CONCERNS_POR_DEFECTO = {
+    "crear": "majority",
+    "actualizar": "majority",
+    "eliminar": "majority",
+    "alternar": "1",
+    "prioridades": "1",
+    "archivar": "majority",
+    "usuarios": "majority",
+}
+
+
+def read_preference_para(ruta: str):
+    modo = os.getenv(f"LECTURA_{ruta.upper()}", "primary")
+    if modo not in READ_PREFERENCES:
+        raise Exception(f"Read preference no soportada en LECTURA_{ruta.upper()}: {modo}")
+    if modo == "primary":
+        return Primary()
+    return READ_PREFERENCES[modo](max_staleness=MAX_STALENESS_SEGUNDOS)
+
+
+def write_concern_para(operacion: str) -> WriteConcern:
+    valor = os.getenv(f"WRITE_CONCERN_{operacion.upper()}", WRITE_CONCERNS_POR_DEFECTO.get(operacion, "1"))
+    return WriteConcern(w=int(valor) if valor.isdigit() else valor)
+
+
+class TokensCausales:
+    """Último (clusterTime, operationTime) de las escrituras de cada usuario en este proceso"""
+
+    def __init__(self, ventana: float, maximo: int = 100_000):
+        self.ventana = ventana
+        self.maximo = maximo
+        self.tokens = {}
+
+    def registrar(self, usuario_id: str, sesion):
+        if sesion.cluster_time is None or sesion.operation_time is None:
+            return
+        if len(self.tokens) >= self.maximo:
+            self.purgar()
+        self.tokens[usuario_id] = (time.monotonic() + self.ventana, sesion.cluster_time, sesion.operation_time)
+
+    def obtener(self, usuario_id: str):
+        token = self.tokens.get(usuario_id)
+        if token is None:
+            return None
+        if token[0] < time.monotonic():
+            del self.tokens[usuario_id]
+            return None
+        return token[1], token[2]
+
+    def purgar(self):
+        ahora = time.monotonic()
+        for usuario_id in [u for u, token in self.tokens.items() if token[0] < ahora]:
+            del self.tokens[usuario_id]
+        # Si siguen sin caber, se descartan los más antiguos
+        while len(self.tokens) >= self.maximo:
+            del self.tokens[next(iter(self.tokens))]
+
+
+def _con_id_str(documento: Optional[dict]) -> Optional[dict]:
+    if documento is not None:
+        documento["_id"] = str(documento["_id"])
+    return documento
+
+
+class UsuariosMongo(UsuariosRepositorio):
+    def __init__(self, database):
+        self.coleccion = database.usuarios
+        self.listados = database.usuarios.with_options(read_preference=read_preference_para("listados"))
+        self.escritura = database.usuarios.with_options(write_concern=write_concern_para("usuarios"))
+        self._email_unico = False
+
+    async def buscar_por_email(self, email: str) -> Optional[dict]:
+        return _con_id_str(await self.coleccion.find_one({"email": email}))
+
+    async def obtener(self, usuario_id: str) -> Optional[dict]:
+        return _con_id_str(await self.coleccion.find_one({"_id": ObjectId(usuario_id)}, {"password": 0}))
+
+    async def listar(self) -> List[dict]:
+        return [_con_id_str(documento) async for documento in self.listados.find({}, {"password": 0})]
+
+    async def crear(self, documento: dict) -> str:
+        resultado = await self.escritura.insert_one(dict(documento))
+        return str(resultado.inserted_id)
+
+    async def crear_lote(self, documentos: List[dict]) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        # Los _id se asignan antes para conocer el id de cada fila aunque falle el lote
+        documentos = [{**documento, "_id": ObjectId()} for documento in documentos]
+        errores = {}
+        try:
+            await self.escritura.insert_many(documentos, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errores[error["index"]] = "email_duplicado" if error["code"] == 11000 else error.get("errmsg", "error")
+        ids = [None if i in errores else str(documento["_id"]) for i, documento in enumerate(documentos)]
+        return ids, errores
+
+    async def asegurar_indices(self):
+        await self.coleccion.create_index("email", unique=True)
+        self._email_unico = True
+
+    async def email_unico(self) -> bool:
+        # Si no se pudo crear al arrancar se comprueba en cada petición, por si se creó después a mano
+        if not self._email_unico:
+            indices = await self.coleccion.index_information()
+            self._email_unico = any(
+                indice.get("unique") and indice["key"] == [("email", 1)] for indice in indices.values()
+            )
+        return self._email_unico
+
+    async def actualizar(self, usuario_id: str, cambios: dict) -> bool:
+        resultado = await self.escritura.update_one({"_id": ObjectId(usuario_id)}, {"$set": cambios})
+        return resultado.matched_count > 0
+
+    async def eliminar(self, usuario_id: str) -> bool:
+        resultado = await self.escritura.delete_one({"_id": ObjectId(usuario_id)})
+        return resultado.deleted_count > 0
+
+
+class ActividadesMongo(ActividadesRepositorio):
+    def __init__(self, database, tokens: Optional[TokensCausales] = None):
+        self.client = database.client
+        self.coleccion = database.actividades
+        self.archivo = database.actividades_archivo
+        self.tokens = tokens or TokensCausales(VENTANA_CAUSAL_SEGUNDOS)
+        # Con consistencia causal las lecturas usan read concern majority
+        read_concern = ReadConcern("majority") if CONSISTENCIA_CAUSAL else None
+        self.lectura = {
+            ruta: self.coleccion.with_options(read_preference=read_preference_para(ruta), read_concern=read_concern)
+            for ruta in ("listados", "detalle", "mutacion")
+        }
+        self.lectura_archivo = {
+            ruta: self.archivo.with_options(read_preference=read_preference_para(ruta), read_concern=read_concern)
+            for ruta in ("listados", "detalle")
+        }
+        self.escritura = {
+            operacion: self.coleccion.with_options(write_concern=write_concern_para(operacion))
+            for operacion in ("crear", "actualizar", "eliminar", "alternar", "prioridades", "archivar")
+        }
+        self.escritura_archivo = self.archivo.with_options(write_concern=write_concern_para("archivar"))
+
+    @asynccontextmanager
+    async def _sesion(self, usuario_id: str, escritura: bool = False):
+        """Sesión causal del usuario; None si no hace falta (sin escrituras recientes)"""
+        if not CONSISTENCIA_CAUSAL:
+            yield None
+            return
+        # El de este proceso y el que devolvió el cliente (escrituras atendidas por otro worker)
+        tokens = [t for t in (self.tokens.obtener(usuario_id), causalidad.recibido(usuario_id)) if t is not None]
+        if not escritura and not tokens:
+            yield None
+            return
+        async with await self.client.start_session(causal_consistency=True) as sesion:
+            # La sesión se queda con el mayor de los tiempos
+            for cluster_time, operation_time in tokens:
+                sesion.advance_cluster_time(cluster_time)
+                sesion.advance_operation_time(operation_time)
+            yield sesion
+            if escritura:
+                self.tokens.registrar(usuario_id, sesion)
+                if sesion.cluster_time is not None and sesion.operation_time is not None:
+                    causalidad.emitir(usuario_id, sesion.cluster_time, sesion.operation_time)
+
+    async def listar(self, usuario_id: str, incluir_archivadas: bool = False) -> List[dict]:
+        async with self._sesion(usuario_id) as sesion:
+            # El índice (usuario_id, Rango, _id) da el orden; las que no tienen Rango salen primero y van al final
+            cursor = self.lectura["listados"].find({"usuario_id": usuario_id}, session=sesion).sort([("Rango", 1), ("_id", 1)])
+            documentos = [_con_id_str(documento) async for documento in cursor]
+            sin_rango = next((i for i, documento in enumerate(documentos) if documento.get("Rango")), len(documentos))
+            documentos = documentos[sin_rango:] + documentos[:sin_rango]
+            if incluir_archivadas:
+                cursor = self.lectura_archivo["listados"].find({"usuario_id": usuario_id}, session=sesion)
+                documentos += [_con_id_str(documento) async for documento in cursor]
+            return documentos
+
+    async def obtener(self, actividad_id: str, usuario_id: str, incluir_archivadas: bool = False) -> Optional[dict]:
+        filtro = {"_id": ObjectId(actividad_id), "usuario_id": usuario_id}
+        async with self._sesion(usuario_id) as sesion:
+            documento = await self.lectura["detalle"].find_one(filtro, session=sesion)
+            if documento is None and incluir_archivadas:
+                documento = await self.lectura_archivo["detalle"].find_one(filtro, session=sesion)
+            return _con_id_str(documento)
+
+    async def crear(self, documento: dict) -> str:
+        async with self._sesion(documento.get("usuario_id"), escritura=True) as sesion:
+            resultado = await self.escritura["crear"].insert_one(dict(documento), session=sesion)
+        return str(resultado.inserted_id)
+
+    async def actualizar(self, actividad_id: str, usuario_id: str, cambios: dict, eliminar: List[str] = ()) -> bool:
+        operacion = {"$set": cambios}
+        if eliminar:
+            operacion["$unset"] = {campo: "" for campo in eliminar}
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            resultado = await self.escritura["actualizar"].update_one(
+                {"_id": ObjectId(actividad_id), "usuario_id": usuario_id}, operacion, session=sesion
+            )
+        return resultado.matched_count > 0
+
+    async def cambiar_estatus(self, actividad_id: str, usuario_id: str, estatus: str) -> bool:
+        if estatus in ESTATUS_CERRADOS:
+            operacion = {"$set": {"Estatus": estatus, "fecha_cierre": datetime.now()}}
+        else:
+            operacion = {"$set": {"Estatus": estatus}, "$unset": {"fecha_cierre": ""}}
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            resultado = await self.escritura["alternar"].update_one(
+                {"_id": ObjectId(actividad_id), "usuario_id": usuario_id}, operacion, session=sesion
+            )
+        return resultado.matched_count > 0
+
+    async def eliminar(self, actividad_id: str, usuario_id: str) -> bool:
+        filtro = {"_id": ObjectId(actividad_id), "usuario_id": usuario_id}
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            resultado = await self.escritura["eliminar"].delete_one(filtro, session=sesion)
+            if resultado.deleted_count == 0:
+                resultado = await self.escritura_archivo.delete_one(filtro, session=sesion)
+        return resultado.deleted_count > 0
+
+    async def listar_abiertas(self, usuario_id: str) -> List[dict]:
+        filtro = {"usuario_id": usuario_id, "Estatus": {"$nin": ESTATUS_CERRADOS}}
+        async with self._sesion(usuario_id) as sesion:
+            return [_con_id_str(documento) async for documento in self.lectura["mutacion"].find(filtro, session=sesion)]
+
+    async def actualizar_prioridades(self, usuario_id: str, prioridades: Dict[str, int]):
+        if not prioridades:
+            return
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            await self.escritura["prioridades"].bulk_write([
+                UpdateOne({"_id": ObjectId(actividad_id), "usuario_id": usuario_id}, {"$set": {"Prioridad": prioridad}})
+                for actividad_id, prioridad in prioridades.items()
+            ], ordered=False, session=sesion)
+
+    async def listar_ordenadas(self, usuario_id: str) -> List[dict]:
+        filtro = {"usuario_id": usuario_id, "Estatus": {"$nin": ESTATUS_CERRADOS}}
+        async with self._sesion(usuario_id) as sesion:
+            # El índice (usuario_id, Rango, _id) da el orden; las que no tienen Rango salen primero
+            cursor = self.lectura["mutacion"].find(filtro, session=sesion).sort([("Rango", 1), ("_id", 1)])
+            documentos = [_con_id_str(documento) async for documento in cursor]
+        con_rango = [documento for documento in documentos if documento.get("Rango")]
+        sin_rango = sorted(
+            (documento for documento in documentos if not documento.get("Rango")),
+            key=lambda documento: (documento.get("Prioridad") is None, documento.get("Prioridad") or 0),
+        )
+        return con_rango + sin_rango
+
+    async def adyacente(self, usuario_id: str, rango: str, anterior: bool, excluir_id: str) -> Optional[dict]:
+        filtro = {
+            "usuario_id": usuario_id,
+            "Estatus": {"$nin": ESTATUS_CERRADOS},
+            "Rango": {"$lt" if anterior else "$gt": rango},
+            "_id": {"$ne": ObjectId(excluir_id)},
+        }
+        orden = -1 if anterior else 1
+        async with self._sesion(usuario_id) as sesion:
+            return _con_id_str(await self.lectura["mutacion"].find_one(
+                filtro, sort=[("Rango", orden), ("_id", orden)], session=sesion
+            ))
+
+    async def contar_antes(self, usuario_id: str, rango: str, actividad_id: str) -> int:
+        filtro = {
+            "usuario_id": usuario_id,
+            "Estatus": {"$nin": ESTATUS_CERRADOS},
+            "$or": [{"Rango": {"$lt": rango}}, {"Rango": rango, "_id": {"$lt": ObjectId(actividad_id)}}],
+        }
+        async with self._sesion(usuario_id) as sesion:
+            return await self.lectura["detalle"].count_documents(filtro, session=sesion)
+
+    @staticmethod
+    def _filtro_abiertas(usuario_id: str, excluir_id: Optional[str]) -> dict:
+        filtro = {"usuario_id": usuario_id, "Estatus": {"$nin": ESTATUS_CERRADOS}}
+        if excluir_id:
+            filtro["_id"] = {"$ne": ObjectId(excluir_id)}
+        return filtro
+
+    async def contar_ordenadas(self, usuario_id: str, excluir_id: Optional[str] = None) -> Tuple[int, int]:
+        filtro = self._filtro_abiertas(usuario_id, excluir_id)
+        async with self._sesion(usuario_id) as sesion:
+            abiertas = await self.lectura["mutacion"].count_documents(filtro, session=sesion)
+            con_rango = await self.lectura["mutacion"].count_documents({**filtro, "Rango": {"$gt": ""}}, session=sesion)
+        return con_rango, abiertas - con_rango
+
+    async def rangos_ordenados(self, usuario_id: str, saltar: int, limite: int, excluir_id: Optional[str] = None,
+                               descendente: bool = False) -> List[str]:
+        filtro = {**self._filtro_abiertas(usuario_id, excluir_id), "Rango": {"$gt": ""}}
+        orden = -1 if descendente else 1
+        async with self._sesion(usuario_id) as sesion:
+            # Recorre el índice (usuario_id, Rango, _id) y solo devuelve la clave
+            cursor = self.lectura["mutacion"].find(filtro, {"Rango": 1}, session=sesion).sort(
+                [("Rango", orden), ("_id", orden)]
+            ).skip(saltar).limit(limite)
+            return [documento["Rango"] async for documento in cursor]
+
+    async def usa_rangos(self, usuario_id: str) -> bool:
+        filtro = {"usuario_id": usuario_id, "Rango": {"$exists": True}, "Estatus": {"$nin": ESTATUS_CERRADOS}}
+        async with self._sesion(usuario_id) as sesion:
+            return await self.lectura["detalle"].find_one(filtro, {"_id": 1}, session=sesion) is not None
+
+    async def asignar_rangos(self, usuario_id: str, rangos: Dict[str, str]):
+        if not rangos:
+            return
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            await self.escritura["prioridades"].bulk_write([
+                UpdateOne({"_id": ObjectId(actividad_id), "usuario_id": usuario_id}, {"$set": {"Rango": rango}})
+                for actividad_id, rango in rangos.items()
+            ], ordered=False, session=sesion)
+
+    async def restaurar(self, actividad_id: str, usuario_id: str) -> Optional[dict]:
+        filtro = {"_id": ObjectId(actividad_id), "usuario_id": usuario_id}
+        async with self._sesion(usuario_id, escritura=True) as sesion:
+            documento = await self.archivo.find_one(filtro, session=sesion)
+            if documento is None:
+                return None
+            documento.pop("archivado_en", None)
+            if documento.get("Estatus") in ESTATUS_CERRADOS:
+                documento["fecha_cierre"] = datetime.now()
+            # Reemplazo con upsert: si una restauración anterior quedó a medias no se duplica
+            await self.escritura["archivar"].replace_one({"_id": documento["_id"]}, documento, upsert=True, session=sesion)
+            await self.escritura_archivo.delete_one(filtro, session=sesion)
+        return _con_id_str(documento)
+
+    async def archivar_lote(self, antes_de: datetime, limite: int) -> List[str]:
+        filtro = {"Estatus": {"$in": ESTATUS_CERRADOS}, "$or": [
+            {"fecha_cierre": {"$lt": antes_de}},
+            {"fecha_cierre": {"$exists": False}, "Fecha": {"$lt": antes_de}},
+        ]}
+        documentos = await self.coleccion.find(filtro).limit(limite).to_list(limite)
+        if not documentos:
+            return []
+        ids = [documento["_id"] for documento in documentos]
+        ahora = datetime.now()
+        # Primero se copia (idempotente) y después se borra de la colección activa
+        await self.escritura_archivo.bulk_write([
+            ReplaceOne({"_id": documento["_id"]}, {**documento, "archivado_en": ahora}, upsert=True)
+            for documento in documentos
+        ], ordered=False)
+        # Solo se borra si el documento sigue idéntico a la copia: un PUT o un cambio de estado concurrente no se pierde
+        await self.escritura["archivar"].bulk_write([
+            DeleteOne({"_id": documento["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": documento}]}})
+            for documento in documentos
+        ], ordered=False)
+        # Las modificadas entre la lectura y el borrado siguen activas: se quita su copia del archivo
+        modificadas = {documento["_id"] async for documento in self.coleccion.find({"_id": {"$in": ids}}, {"_id": 1})}
+        if modificadas:
+            await self.escritura_archivo.delete_many({"_id": {"$in": list(modificadas)}})
+        return [documento["usuario_id"] for documento in documentos if documento["_id"] not in modificadas]
+
+    async def asegurar_indices(self):
+        await self.coleccion.create_index([("usuario_id", 1), ("Estatus", 1)])
+        # Listado ordenado, vecinos y posición de las actividades con Rango
+        await self.coleccion.create_index([("usuario_id", 1), ("Rango", 1), ("_id", 1)])
+        # Para que el archivado encuentre las cerradas sin recorrer la colección
+        await self.coleccion.create_index([("Estatus", 1), ("fecha_cierre", 1), ("Fecha", 1)])
+        await self.archivo.create_index("usuario_id")
+
+
+def crear_repositorios_mongo(database) -> Repositorios:
+    return Repositorios(UsuariosMongo(database), ActividadesMongo(database), "mongo")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Header
+from fastapi.responses import Response
 from pydantic import BaseModel, Field
 from typing import List, Dict, Union, Optional
 from dotenv import load_dotenv
@@ -6,13 +7,36 @@ from datetime import datetime
 from bson import ObjectId
 import bcrypt
 import base64
+import functools
+import json
 import jwt
 import os
-from cryptography.fernet import Fernet, InvalidToken
+from bson import Binary
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cache_actividades import cache, serializar
+import coalescencia
+from repositorios import get_repositorios, ESTATUS_CERRADOS
+from rangos import RANGO_LONGITUD_MAXIMA, derivar_prioridades, posicion, rango_entre, rango_para_posicion, rebalancear
 
 load_dotenv("config.env")
 router = APIRouter(prefix="/actividades", tags=["actividades"])
 
+# Versión del esquema de los documentos de 'actividades'.
+# Los documentos con esta versión ya tienen fechas BSON nativas, campos
+# sensibles encriptados y mailto limpio (ver migrar_actividades.py).
+SCHEMA_VERSION = 1
+
+# Formato de almacenamiento de los campos sensibles:
+# - "campos": un token Fernet por campo y por email (formato original)
+# - "sellado": todos los campos sensibles en un único BinData AES-GCM
+FORMATO_CIFRADO = os.getenv("FORMATO_CIFRADO", "campos")
+CAMPO_SELLADO = "sellado"
+VERSION_SELLADO = 1
+
 # --- Utilidades de Encriptación ---
 class CryptoUtils:
     @staticmethod
@@ -20,7 +44,18 @@ class CryptoUtils:
         key = os.getenv("FERNET_KEY", "clave_generada")
         if not key:
             raise Exception("FERNET_KEY no configurada en variables de entorno")
-        return Fernet(key.encode() if isinstance(key, str) else key)
+        return CryptoUtils._construir_fernet(key, os.getenv("FERNET_KEYS_ANTERIORES", ""))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _construir_fernet(key: str, anteriores: str):
+        """Se construye una vez por keyring (la clave se decodifica y valida al crear el Fernet)"""
+        fernet = Fernet(key.encode() if isinstance(key, str) else key)
+        # Claves anteriores del keyring: solo se usan para desencriptar
+        anteriores = [k.strip() for k in anteriores.split(",") if k.strip()]
+        if anteriores:
+            return MultiFernet([fernet] + [Fernet(k.encode()) for k in anteriores])
+        return fernet
 
     @staticmethod
     def encrypt_data(data: str) -> str:
@@ -41,6 +76,83 @@ class CryptoUtils:
         except (InvalidToken, Exception):
             return data  # Si no se puede desencriptar, retorna el valor original
 
+    @staticmethod
+    def decrypt_data_strict(data: str) -> str:
+        """Desencripta datos sin fallback: lanza InvalidToken si el valor no es un token válido"""
+        if not data:
+            return data
+        f = CryptoUtils.get_fernet()
+        return f.decrypt(data.encode('utf-8')).decode('utf-8')
+
+    @staticmethod
+    def es_token_fernet(data) -> bool:
+        """Indica si el valor tiene la forma de un token Fernet (versión 0x80 en base64)"""
+        if not isinstance(data, str) or len(data) < 100:
+            return False
+        try:
+            return base64.urlsafe_b64decode(data.encode('utf-8'))[0] == 0x80
+        except Exception:
+            return False
+
+    @staticmethod
+    def classify_value(data) -> str:
+        """Clasifica un valor guardado: 'fernet', 'indescifrable' o 'texto_plano'"""
+        try:
+            CryptoUtils.decrypt_data_strict(data)
+            return "fernet"
+        except Exception:
+            return "indescifrable" if CryptoUtils.es_token_fernet(data) else "texto_plano"
+
+    @staticmethod
+    def get_aead():
+        """AES-GCM con una clave derivada de FERNET_KEY mediante HKDF"""
+        key = os.getenv("FERNET_KEY", "clave_generada")
+        if not key:
+            raise Exception("FERNET_KEY no configurada en variables de entorno")
+        return CryptoUtils._construir_aead(key)
+
+    @staticmethod
+    def get_aeads():
+        """AES-GCM de todo el keyring (FERNET_KEY primero y después FERNET_KEYS_ANTERIORES), para abrir blobs"""
+        key = os.getenv("FERNET_KEY", "clave_generada")
+        if not key:
+            raise Exception("FERNET_KEY no configurada en variables de entorno")
+        anteriores = [k.strip() for k in os.getenv("FERNET_KEYS_ANTERIORES", "").split(",") if k.strip()]
+        return [CryptoUtils._construir_aead(k) for k in [key] + anteriores]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _construir_aead(key: str):
+        """La derivación HKDF se hace una vez por clave"""
+        material = base64.urlsafe_b64decode(key.encode() if isinstance(key, str) else key)
+        clave = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"actividades-sellado-v1"
+        ).derive(material)
+        return AESGCM(clave)
+
+    @staticmethod
+    def seal_fields(campos: dict, aad: str) -> Binary:
+        """Sella varios campos en un blob: versión (1 byte) + nonce (12 bytes) + AES-GCM(JSON)"""
+        nonce = os.urandom(12)
+        payload = json.dumps(campos, separators=(",", ":"), ensure_ascii=False).encode('utf-8')
+        cifrado = CryptoUtils.get_aead().encrypt(nonce, payload, aad.encode('utf-8'))
+        return Binary(bytes([VERSION_SELLADO]) + nonce + cifrado)
+
+    @staticmethod
+    def unseal_fields(blob: bytes, aad: str) -> dict:
+        """Abre un blob sellado con la clave actual o, tras una rotación, con las anteriores del keyring;
+        lanza InvalidTag si fue alterado, no pertenece a 'aad' o ninguna clave lo abre"""
+        blob = bytes(blob)
+        if not blob or blob[0] != VERSION_SELLADO:
+            raise ValueError(f"Versión de sellado no soportada: {blob[:1].hex()}")
+        for aead in CryptoUtils.get_aeads():
+            try:
+                payload = aead.decrypt(blob[1:13], blob[13:], aad.encode('utf-8'))
+                return json.loads(payload.decode('utf-8'))
+            except InvalidTag:
+                continue
+        raise InvalidTag()
+
     @staticmethod
     def encrypt_field_if_sensitive(field_name: str, value: str) -> str:
         """Encripta campos sensibles específicos"""
@@ -67,17 +179,18 @@ class CryptoUtils:
         return encrypted_list
 
     @staticmethod
-    def decrypt_mailto_list(mailto_list: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    def decrypt_mailto_list(mailto_list: List[Dict[str, str]], strict: bool = False) -> List[Dict[str, str]]:
         """Desencripta emails en la lista mailto"""
         if not mailto_list:
             return mailto_list
         
+        decrypt = CryptoUtils.decrypt_data_strict if strict else CryptoUtils.decrypt_data
         decrypted_list = []
         for item in mailto_list:
             decrypted_item = {}
             for key, value in item.items():
                 if key in ('to', 'cc', 'bcc') and value:
-                    decrypted_item[key] = CryptoUtils.decrypt_data(value)
+                    decrypted_item[key] = decrypt(value)
                 else:
                     decrypted_item[key] = value
             decrypted_list.append(decrypted_item)
@@ -122,11 +235,20 @@ class ActividadBase(BaseModel):
         data["mailto"] = cls.normalize_mailto(data.get("mailto"))
         # Eliminar normalización de Estatus, solo guardar el string tal cual
         return data
+
+    @classmethod
+    def normalize_if_legacy(cls, data):
+        """Normaliza solo los documentos anteriores al esquema actual"""
+        if data.get("schema_version") == SCHEMA_VERSION:
+            return dict(data)
+        return cls.normalize(data)
     
     @classmethod
-    def encrypt_sensitive_data(cls, data):
+    def encrypt_sensitive_data(cls, data, usuario_id: Optional[str] = None, formato: Optional[str] = None):
         """Encripta datos sensibles antes de guardar en la base de datos"""
         data = dict(data)
+        if (formato or FORMATO_CIFRADO) == "sellado":
+            return cls.seal_sensitive_data(data, usuario_id)
         # Encriptar campos sensibles si existen
         for field in ["Descripcion", "Categoria", "Nombre"]:
             if field in data and data[field]:
@@ -137,16 +259,69 @@ class ActividadBase(BaseModel):
         return data
 
     @classmethod
-    def decrypt_sensitive_data(cls, data):
+    def seal_sensitive_data(cls, data, usuario_id: Optional[str] = None):
+        """Sella Nombre, Categoria, Descripcion y mailto en un único campo binario.
+        El usuario dueño va como dato asociado, así el blob no sirve en otro documento."""
+        data = dict(data)
+        campos = {field: data.pop(field) for field in ["Nombre", "Categoria", "Descripcion", "mailto"] if field in data}
+        data[CAMPO_SELLADO] = CryptoUtils.seal_fields(campos, usuario_id or data.get("usuario_id") or "")
+        return data
+
+    @classmethod
+    def storage_update(cls, data, usuario_id: str):
+        """Campos a asignar y a eliminar para dejar el documento en el formato de cifrado configurado"""
+        encriptado = cls.encrypt_sensitive_data(data, usuario_id)
+        if CAMPO_SELLADO in encriptado:
+            eliminar = [field for field in ["Nombre", "Categoria", "Descripcion", "mailto"] if field not in encriptado]
+        else:
+            eliminar = [CAMPO_SELLADO]
+        return encriptado, eliminar
+
+    @classmethod
+    def decrypt_sensitive_data(cls, data, strict: bool = False):
         """Desencripta datos sensibles para mostrar al usuario"""
         data = dict(data)
+        if CAMPO_SELLADO in data:
+            data.update(CryptoUtils.unseal_fields(data.pop(CAMPO_SELLADO), data.get("usuario_id") or ""))
+            return data
+        decrypt = CryptoUtils.decrypt_data_strict if strict else CryptoUtils.decrypt_data
         for field in ["Descripcion", "Categoria", "Nombre"]:
             if field in data and data[field]:
-                data[field] = CryptoUtils.decrypt_data(data[field])
+                data[field] = decrypt(data[field])
         if "mailto" in data and data["mailto"]:
-            data["mailto"] = CryptoUtils.decrypt_mailto_list(data["mailto"])
+            data["mailto"] = CryptoUtils.decrypt_mailto_list(data["mailto"], strict=strict)
         return data
 
+    @classmethod
+    def classify_encryption(cls, data):
+        """Lista de (campo, clase) con el estado de cifrado de cada campo sensible guardado.
+        Cada email de mailto aparece como un campo 'mailto' independiente."""
+        if CAMPO_SELLADO in data:
+            try:
+                campos = CryptoUtils.unseal_fields(data[CAMPO_SELLADO], data.get("usuario_id") or "")
+            except Exception:
+                return [(CAMPO_SELLADO, "indescifrable")]
+            clases = [(field, "sellado") for field in ["Nombre", "Categoria", "Descripcion"] if campos.get(field)]
+            return clases + [
+                ("mailto", "sellado")
+                for item in campos.get("mailto") or [] for key in ('to', 'cc', 'bcc') if item.get(key)
+            ]
+        clases = [
+            (field, CryptoUtils.classify_value(data[field]))
+            for field in ["Nombre", "Categoria", "Descripcion"] if data.get(field)
+        ]
+        for item in data.get("mailto") or []:
+            if isinstance(item, dict):
+                clases.extend(("mailto", CryptoUtils.classify_value(item[key])) for key in ('to', 'cc', 'bcc') if item.get(key))
+        return clases
+
+    @classmethod
+    def decode_from_storage(cls, data):
+        """Prepara un documento de la base de datos para la respuesta.
+        Los documentos del esquema actual se desencriptan sin normalizar ni fallback."""
+        actual = data.get("schema_version") == SCHEMA_VERSION
+        return cls.decrypt_sensitive_data(cls.normalize_if_legacy(data), strict=actual)
+
 # --- Modelo de Creación ---
 class ActividadCreate(ActividadBase):
     pass
@@ -165,20 +340,17 @@ class Actividad(ActividadBase):
             ObjectId: str
         }
 
-async def get_database():
-    from mongoapi import database
-    if database is None:
-        raise HTTPException(
-            status_code=500, 
-            detail="Error de conexión a la base de datos. Verifica que MongoDB esté conectado."
-        )
-    return database
+# --- Modelo de Movimiento ---
+# Basta con una de las dos vecinas; la otra es la que ya estaba a su lado
+class Movimiento(BaseModel):
+    anterior_id: Optional[str] = None  # Actividad que quedará justo antes
+    siguiente_id: Optional[str] = None  # Actividad que quedará justo después
 
 # Configuración JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_muy_segura")
 ALGORITHM = "HS256"
 
-async def get_current_user(authorization: str = Header(None), db = Depends(get_database)):
+async def get_current_user(authorization: str = Header(None), repos = Depends(get_repositorios)):
     """Obtiene el usuario actual desde el token JWT"""
     if not authorization:
         raise HTTPException(status_code=401, detail="Token de autorización requerido")
@@ -192,7 +364,7 @@ async def get_current_user(authorization: str = Header(None), db = Depends(get_d
             raise HTTPException(status_code=401, detail="Token inválido")
         
         # Buscar usuario en la base de datos
-        user = await db.usuarios.find_one({"email": email})
+        user = await repos.usuarios.buscar_por_email(email)
         if not user:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
         
@@ -202,38 +374,63 @@ async def get_current_user(authorization: str = Header(None), db = Depends(get_d
 
 # Obtener todas las actividades del usuario autenticado
 @router.get("/", response_model=List[Actividad])
-async def obtener_actividades(current_user = Depends(get_current_user), db = Depends(get_database)):
+async def obtener_actividades(incluir_archivadas: bool = False, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
-        actividades = []
-        cursor = db.actividades.find({"usuario_id": current_user["user_id"]})
-        async for documento in cursor:
-            documento["_id"] = str(documento["_id"])
-            # Normalizar campos
-            doc_norm = ActividadBase.normalize(documento)
-            # Desencriptar campos sensibles
-            doc_norm = ActividadBase.decrypt_sensitive_data(doc_norm)
-            actividades.append(Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", datetime.now()), "usuario_id": documento.get("usuario_id")}))
-        return actividades
+        # La clave se toma antes de leer: una escritura concurrente cambia la generación
+        recurso = "lista:archivadas" if incluir_archivadas else "lista"
+        clave = await cache.clave(current_user["user_id"], recurso)
+        contenido = await cache.obtener(clave)
+        if contenido is not None:
+            return Response(content=contenido, media_type="application/json")
+
+        async def calcular():
+            actividades = []
+            documentos = await repos.actividades.listar(current_user["user_id"], incluir_archivadas)
+            # Con rangos, Prioridad es la posición en la lista
+            derivar_prioridades(documentos)
+            for documento in documentos:
+                # Normalizar (solo documentos antiguos) y desencriptar campos sensibles
+                doc_norm = ActividadBase.decode_from_storage(documento)
+                actividades.append(Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", datetime.now()), "usuario_id": documento.get("usuario_id")}))
+            contenido = serializar(actividades)
+            await cache.guardar(clave, contenido)
+            return contenido
+
+        # Las peticiones idénticas concurrentes comparten una sola lectura (si ninguna escritura puede pasar desapercibida)
+        vuelo = cache.clave_coalescencia(clave, current_user["user_id"], recurso)
+        contenido = await coalescencia.actividades.ejecutar(vuelo, calcular)
+        return Response(content=contenido, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener las actividades: {str(e)}")
 
 # Obtener una actividad específica del usuario autenticado
 @router.get("/{actividad_id}", response_model=Actividad)
-async def obtener_actividad(actividad_id: str, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def obtener_actividad(actividad_id: str, incluir_archivadas: bool = False, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
-        documento = await db.actividades.find_one({"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]})
+        clave = await cache.clave(current_user["user_id"], f"item:{actividad_id}" + (":archivadas" if incluir_archivadas else ""))
+        contenido = await cache.obtener(clave)
+        if contenido is not None:
+            return Response(content=contenido, media_type="application/json")
+        documento = await repos.actividades.obtener(actividad_id, current_user["user_id"], incluir_archivadas)
         if not documento:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
-        documento["_id"] = str(documento["_id"])
-        doc_norm = ActividadBase.normalize(documento)
-        doc_norm = ActividadBase.decrypt_sensitive_data(doc_norm)
-        return Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", datetime.now()), "usuario_id": documento.get("usuario_id")})
+        # Con rangos, la misma posición que tiene en el listado
+        prioridad = await posicion(repos, current_user["user_id"], documento)
+        if prioridad is not None:
+            documento["Prioridad"] = prioridad
+        doc_norm = ActividadBase.decode_from_storage(documento)
+        actividad = Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", datetime.now()), "usuario_id": documento.get("usuario_id")})
+        contenido = serializar(actividad)
+        await cache.guardar(clave, contenido)
+        return Response(content=contenido, media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener la actividad: {str(e)}")
 
 # Crear una nueva actividad
 @router.post("/", response_model=Actividad)
-async def crear_actividad(actividad: ActividadCreate, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def crear_actividad(actividad: ActividadCreate, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
         documento = actividad.dict()
         documento["Fecha"] = datetime.now()
@@ -241,14 +438,22 @@ async def crear_actividad(actividad: ActividadCreate, current_user = Depends(get
         documento = ActividadBase.normalize(documento)
         # Encriptar datos sensibles antes de guardar
         documento = ActividadBase.encrypt_sensitive_data(documento)
-        resultado = await db.actividades.insert_one(documento)
+        documento["schema_version"] = SCHEMA_VERSION
+        # Si el usuario ya usa rangos, Prioridad es la posición donde se inserta (al final si es nula)
+        con_rango = documento.get("Estatus") not in ESTATUS_CERRADOS and await repos.actividades.usa_rangos(current_user["user_id"])
+        if con_rango:
+            documento["Rango"] = await rango_para_posicion(repos, current_user["user_id"], actividad.Prioridad)
+        actividad_id = await repos.actividades.crear(documento)
+        await cache.invalidar(current_user["user_id"])
         
         # Para la respuesta, usar los datos originales (sin encriptar)
         documento_respuesta = actividad.dict()
         documento_respuesta["Fecha"] = datetime.now()
         documento_respuesta["usuario_id"] = current_user["user_id"]
         documento_respuesta = ActividadBase.normalize(documento_respuesta)
-        documento_respuesta["_id"] = str(resultado.inserted_id)
+        documento_respuesta["_id"] = actividad_id
+        if con_rango:
+            documento_respuesta["Prioridad"] = await posicion(repos, current_user["user_id"], {**documento_respuesta, "Rango": documento["Rango"]})
         
         return Actividad(**{**documento_respuesta, "Fecha": documento_respuesta.get("Fecha", datetime.now())})
     except Exception as e:
@@ -256,45 +461,83 @@ async def crear_actividad(actividad: ActividadCreate, current_user = Depends(get
 
 # Actualizar una actividad existente
 @router.put("/{actividad_id}", response_model=Actividad)
-async def actualizar_actividad(actividad_id: str, actividad: ActividadCreate, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def actualizar_actividad(actividad_id: str, actividad: ActividadCreate, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
         documento = actividad.dict()
         documento = ActividadBase.normalize(documento)
         # Encriptar datos sensibles antes de actualizar
-        documento_encriptado = ActividadBase.encrypt_sensitive_data(documento)
+        cambios, eliminar = ActividadBase.storage_update(documento, current_user["user_id"])
+        abierta = documento.get("Estatus") not in ESTATUS_CERRADOS
+        if abierta:
+            eliminar.append("fecha_cierre")
+        # Con rangos, una Prioridad escrita mueve la actividad a esa posición de la lista
+        con_rango = abierta and await repos.actividades.usa_rangos(current_user["user_id"])
+        if con_rango and documento.get("Prioridad") is not None:
+            cambios["Rango"] = await rango_para_posicion(repos, current_user["user_id"], documento["Prioridad"], actividad_id)
         
-        resultado = await db.actividades.update_one(
-            {"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]},
-            {"$set": documento_encriptado}
-        )
-        if resultado.matched_count == 0:
+        actualizada = await repos.actividades.actualizar(actividad_id, current_user["user_id"], cambios, eliminar)
+        # Una actividad archivada vuelve a la colección activa y se actualiza allí
+        if not actualizada and await repos.actividades.restaurar(actividad_id, current_user["user_id"]):
+            actualizada = await repos.actividades.actualizar(actividad_id, current_user["user_id"], cambios, eliminar)
+        if not actualizada:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
+        await cache.invalidar(current_user["user_id"])
         
         # Para la respuesta, usar los datos originales (sin encriptar)
         documento_respuesta = documento.copy()
         documento_respuesta["_id"] = actividad_id
         documento_respuesta["usuario_id"] = current_user["user_id"]
+        if con_rango:
+            guardado = await repos.actividades.obtener(actividad_id, current_user["user_id"])
+            documento_respuesta["Prioridad"] = await posicion(repos, current_user["user_id"], guardado)
         
         return Actividad(**{**documento_respuesta, "_id": actividad_id, "Fecha": documento_respuesta.get("Fecha", datetime.now())})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar la actividad: {str(e)}")
 
 # Eliminar una actividad
 @router.delete("/{actividad_id}")
-async def eliminar_actividad(actividad_id: str, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def eliminar_actividad(actividad_id: str, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
-        resultado = await db.actividades.delete_one({"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]})
-        if resultado.deleted_count == 0:
+        if not await repos.actividades.eliminar(actividad_id, current_user["user_id"]):
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
+        await cache.invalidar(current_user["user_id"])
         return {"message": "Actividad eliminada exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar la actividad: {str(e)}")
 
+# Devolver una actividad archivada a la colección activa sin cambiar su estado
+@router.post("/{actividad_id}/restaurar", response_model=Actividad)
+async def restaurar_actividad(actividad_id: str, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
+    try:
+        documento = await repos.actividades.restaurar(actividad_id, current_user["user_id"])
+        if not documento:
+            if await repos.actividades.obtener(actividad_id, current_user["user_id"]):
+                raise HTTPException(status_code=409, detail="La actividad no está archivada")
+            raise HTTPException(status_code=404, detail="Actividad no encontrada")
+        await cache.invalidar(current_user["user_id"])
+        prioridad = await posicion(repos, current_user["user_id"], documento)
+        if prioridad is not None:
+            documento["Prioridad"] = prioridad
+        doc_norm = ActividadBase.decode_from_storage(documento)
+        return Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", documento.get("Fecha")), "usuario_id": documento.get("usuario_id")})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al restaurar la actividad: {str(e)}")
+
 # Alternar el estado entre 'Cerrado' y 'En revisión'
 @router.patch("/{actividad_id}/alternar_estado", response_model=Actividad)
-async def alternar_estado_actividad(actividad_id: str, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def alternar_estado_actividad(actividad_id: str, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
-        documento = await db.actividades.find_one({"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]})
+        documento = await repos.actividades.obtener(actividad_id, current_user["user_id"])
+        if not documento:
+            # Si está archivada vuelve a la colección activa antes de alternarla
+            documento = await repos.actividades.restaurar(actividad_id, current_user["user_id"])
         if not documento:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
         estatus_actual = documento.get("Estatus", "En revisión")
@@ -302,66 +545,57 @@ async def alternar_estado_actividad(actividad_id: str, current_user = Depends(ge
             nuevo_estatus = "En revisión"
         else:
             nuevo_estatus = "Cerrado"
-        await db.actividades.update_one(
-            {"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]},
-            {"$set": {"Estatus": nuevo_estatus}}
-        )
+        await repos.actividades.cambiar_estatus(actividad_id, current_user["user_id"], nuevo_estatus)
+        await cache.invalidar(current_user["user_id"])
         documento["Estatus"] = nuevo_estatus
-        documento["_id"] = str(documento["_id"])
-        doc_norm = ActividadBase.normalize(documento)
+        prioridad = await posicion(repos, current_user["user_id"], documento)
+        if prioridad is not None:
+            documento["Prioridad"] = prioridad
+        doc_norm = ActividadBase.decode_from_storage(documento)
         return Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", documento.get("Fecha")), "usuario_id": documento.get("usuario_id")})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al alternar el estado: {str(e)}")
 
 # Endpoint para verificar integridad de datos encriptados
 @router.get("/{actividad_id}/verify_encryption")
-async def verificar_encriptacion(actividad_id: str, current_user = Depends(get_current_user), db = Depends(get_database)):
+async def verificar_encriptacion(actividad_id: str, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
-        documento = await db.actividades.find_one({"_id": ObjectId(actividad_id), "usuario_id": current_user["user_id"]})
+        documento = await repos.actividades.obtener(actividad_id, current_user["user_id"], incluir_archivadas=True)
         if not documento:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
         
+        # Clasificar cada campo con el keyring actual (Fernet o sellado)
+        clases = ActividadBase.classify_encryption(documento)
+        encriptados = ("fernet", "sellado")
+        emails = [clase for campo, clase in clases if campo == "mailto"]
+        descripcion = dict(clases).get("Descripcion")
+        
         encryption_status = {
             "actividad_id": actividad_id,
-            "descripcion_encriptada": bool(documento.get("Descripcion", "").startswith("$2b$") if documento.get("Descripcion") else False),
-            "mailto_encriptado": False,
-            "total_emails_encriptados": 0
+            "descripcion_encriptada": descripcion in encriptados,
+            "mailto_encriptado": bool(emails) and all(clase in encriptados for clase in emails),
+            "total_emails_encriptados": sum(1 for clase in emails if clase in encriptados),
+            "campos": [{"campo": campo, "estado": clase} for campo, clase in clases]
         }
         
-        # Verificar encriptación de emails
-        if documento.get("mailto"):
-            emails_encriptados = 0
-            for item in documento["mailto"]:
-                for key in ['to', 'cc', 'bcc']:
-                    if key in item and item[key]:
-                        try:
-                            # Verificar si está en base64 y es un hash bcrypt
-                            decoded = base64.b64decode(item[key])
-                            if decoded.startswith(b'$2b$'):
-                                emails_encriptados += 1
-                        except:
-                            pass
-            
-            encryption_status["total_emails_encriptados"] = emails_encriptados
-            encryption_status["mailto_encriptado"] = emails_encriptados > 0
-        
         return encryption_status
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al verificar encriptación: {str(e)}")
 
 @router.post("/reordenar_prioridad")
-async def reordenar_prioridad(current_user = Depends(get_current_user), db = Depends(get_database)):
+async def reordenar_prioridad(current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
     try:
+        if await repos.actividades.usa_rangos(current_user["user_id"]):
+            # Con rangos, el orden lo dan las claves: se reparten de nuevo y Prioridad es la posición
+            await rebalancear(repos, current_user["user_id"])
+            actividades_final = await repos.actividades.listar_ordenadas(current_user["user_id"])
+            derivar_prioridades(actividades_final)
+            actividades_final = [ActividadBase.decode_from_storage(doc) for doc in actividades_final]
+            return {"message": "Prioridades reorganizadas exitosamente (según el orden de la lista)", "actividades": actividades_final}
         # Seleccionar actividades del usuario excluyendo estatus 'Finalizado' y 'Cerrado'
-        filtro = {
-            "usuario_id": current_user["user_id"],
-            "Estatus": {"$nin": ["Finalizado", "Cerrado"]}
-        }
-        actividades = []
-        cursor = db.actividades.find(filtro)
-        async for doc in cursor:
-            doc["_id"] = str(doc["_id"])
-            actividades.append(doc)
+        actividades = await repos.actividades.listar_abiertas(current_user["user_id"])
         # Separar actividades con prioridad numérica y nula
         actividades_con_prioridad = [a for a in actividades if a.get("Prioridad") is not None]
         actividades_sin_prioridad = [a for a in actividades if a.get("Prioridad") is None]
@@ -370,23 +604,75 @@ async def reordenar_prioridad(current_user = Depends(get_current_user), db = Dep
         # Reasignar prioridades consecutivas a partir de 1, manteniendo duplicados
         nueva_prioridad = 1
         prioridad_anterior = None
+        prioridades = {}
         for doc in actividades_con_prioridad:
             prioridad_actual = doc.get("Prioridad")
             # Si la prioridad actual es diferente a la anterior, incrementar el contador
             if prioridad_actual != prioridad_anterior:
                 nueva_prioridad += 1
             # Asignar la nueva prioridad (mantener la misma si es duplicado)
-            await db.actividades.update_one(
-                {"_id": ObjectId(doc["_id"]), "usuario_id": current_user["user_id"]},
-                {"$set": {"Prioridad": nueva_prioridad - 1}}
-            )
+            if prioridad_actual != nueva_prioridad - 1:
+                prioridades[doc["_id"]] = nueva_prioridad - 1
             doc["Prioridad"] = nueva_prioridad - 1
             prioridad_anterior = prioridad_actual
+        # Solo se escriben las actividades cuya prioridad cambió, en una sola operación
+        await repos.actividades.actualizar_prioridades(current_user["user_id"], prioridades)
+        await cache.invalidar(current_user["user_id"])
         # Las de prioridad nula permanecen igual
         # Unir ambas listas para la respuesta
         actividades_final = actividades_con_prioridad + actividades_sin_prioridad
         # Devolver la lista reorganizada (opcional: desencriptar campos)
-        actividades_final = [ActividadBase.decrypt_sensitive_data(ActividadBase.normalize(doc)) for doc in actividades_final]
+        actividades_final = [ActividadBase.decode_from_storage(doc) for doc in actividades_final]
         return {"message": "Prioridades reorganizadas exitosamente (nulos conservados)", "actividades": actividades_final}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al reorganizar prioridades: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error al reorganizar prioridades: {str(e)}")
+# Mover una actividad entre dos vecinas: solo se escribe el Rango de la actividad movida
+@router.post("/{actividad_id}/mover", response_model=Actividad)
+async def mover_actividad(actividad_id: str, movimiento: Movimiento, tareas: BackgroundTasks, current_user = Depends(get_current_user), repos = Depends(get_repositorios)):
+    try:
+        usuario_id = current_user["user_id"]
+        vecinos_ids = {"anterior": movimiento.anterior_id, "siguiente": movimiento.siguiente_id}
+        if not any(vecinos_ids.values()) or actividad_id in vecinos_ids.values():
+            raise HTTPException(status_code=400, detail="Indica una actividad vecina distinta de la que se mueve")
+
+        for intento in range(2):
+            documento = await repos.actividades.obtener(actividad_id, usuario_id)
+            if not documento:
+                raise HTTPException(status_code=404, detail="Actividad no encontrada")
+            vecinos = {}
+            for lado, vecino_id in vecinos_ids.items():
+                if vecino_id:
+                    vecinos[lado] = await repos.actividades.obtener(vecino_id, usuario_id)
+                    if not vecinos[lado]:
+                        raise HTTPException(status_code=404, detail="Actividad vecina no encontrada")
+            implicadas = [documento] + list(vecinos.values())
+            if any(d.get("Estatus") in ESTATUS_CERRADOS for d in implicadas):
+                raise HTTPException(status_code=400, detail="Solo se pueden ordenar actividades abiertas")
+            en_orden = len(vecinos) < 2 or vecinos["anterior"].get("Rango", "") < vecinos["siguiente"].get("Rango", "")
+            if all(d.get("Rango") for d in implicadas) and en_orden:
+                break
+            if intento:
+                raise HTTPException(status_code=409, detail="Las actividades vecinas no están en ese orden")
+            # Primer movimiento del usuario, actividades nuevas sin Rango o claves repetidas
+            await rebalancear(repos, usuario_id)
+
+        anterior, siguiente = vecinos.get("anterior"), vecinos.get("siguiente")
+        if anterior is None:
+            anterior = await repos.actividades.adyacente(usuario_id, siguiente["Rango"], anterior=True, excluir_id=actividad_id)
+        elif siguiente is None:
+            siguiente = await repos.actividades.adyacente(usuario_id, anterior["Rango"], anterior=False, excluir_id=actividad_id)
+        rango = rango_entre(anterior["Rango"] if anterior else None, siguiente["Rango"] if siguiente else None)
+
+        await repos.actividades.asignar_rangos(usuario_id, {actividad_id: rango})
+        await cache.invalidar(usuario_id)
+        if len(rango) > RANGO_LONGITUD_MAXIMA:
+            tareas.add_task(rebalancear, repos, usuario_id)
+
+        documento["Rango"] = rango
+        documento["Prioridad"] = await repos.actividades.contar_antes(usuario_id, rango, actividad_id) + 1
+        doc_norm = ActividadBase.decode_from_storage(documento)
+        return Actividad(**{**doc_norm, "_id": documento["_id"], "Fecha": doc_norm.get("Fecha", documento.get("Fecha")), "usuario_id": documento.get("usuario_id")})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al mover la actividad: {str(e)}")
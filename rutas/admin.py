@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from bson import ObjectId
+from datetime import datetime
+from typing import Dict
+from dotenv import load_dotenv
+import asyncio
+import os
+
+from rutas.actividades import get_current_user
+
+load_dotenv("config.env")
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# Emails con acceso a los endpoints de administración (separados por comas)
+ADMIN_EMAILS = {email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+async def get_database(request: Request):
+    """Base de datos MongoDB para las herramientas que trabajan sobre la colección completa"""
+    database = request.app.state.database
+    if database is None:
+        raise HTTPException(
+            status_code=500, 
+            detail="Esta operación requiere MongoDB (ALMACENAMIENTO=mongo) y una conexión activa."
+        )
+    return database
+
+async def get_admin_user(current_user = Depends(get_current_user)):
+    """Solo deja pasar a los usuarios listados en ADMIN_EMAILS"""
+    if current_user["email"] not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Se requieren permisos de administrador")
+    return current_user
+
+# Límites del escaneo lanzado desde la API: los procesos compiten con los workers de la propia API
+ESCANEO_MAX_PROCESOS = int(os.getenv("ESCANEO_MAX_PROCESOS", 4))
+ESCANEO_MAX_PARTICIONES = int(os.getenv("ESCANEO_MAX_PARTICIONES", 256))
+ESCANEO_MAX_IDS = 10_000
+
+# Escaneos en curso en este worker (como mucho uno)
+_escaneos: Dict[str, asyncio.Task] = {}
+
+async def ejecutar_escaneo(db, escaneo_id: str, particiones: int, procesos: int, max_ids: int):
+    """Escanea en segundo plano y guarda el progreso y el resultado en 'escaneos_cifrado'"""
+    from escaneo_cifrado import escanear
+
+    async def al_avanzar(progreso: dict):
+        await db.escaneos_cifrado.update_one({"_id": escaneo_id}, {"$set": {"progreso": progreso}})
+
+    try:
+        resultado = await escanear(db, particiones=particiones, procesos=procesos, max_ids=max_ids, al_avanzar=al_avanzar)
+        cambios = {"estado": "terminado", "resultado": resultado}
+    except asyncio.CancelledError:
+        cambios = {"estado": "cancelado"}
+    except Exception as e:
+        cambios = {"estado": "error", "error": str(e)}
+    finally:
+        _escaneos.pop(escaneo_id, None)
+    await db.escaneos_cifrado.update_one({"_id": escaneo_id}, {"$set": {**cambios, "fin": datetime.now()}})
+
+async def cancelar_escaneos(espera: float = 5):
+    """Cancela los escaneos en curso y espera (como mucho 'espera' s) a que guarden su estado,
+    para que esa escritura no compita con el cierre del cliente de MongoDB"""
+    tareas = list(_escaneos.values())
+    for tarea in tareas:
+        tarea.cancel()
+    if tareas:
+        await asyncio.wait(tareas, timeout=espera)
+
+# Escaneo de cobertura de cifrado de toda la colección de actividades: se lanza y se consulta aparte
+@router.post("/cifrado/escaneo", status_code=202)
+async def escanear_cifrado(
+    particiones: int = Query(32, ge=1, le=ESCANEO_MAX_PARTICIONES),
+    procesos: int = Query(2, ge=1, le=ESCANEO_MAX_PROCESOS),
+    max_ids: int = Query(1000, ge=0, le=ESCANEO_MAX_IDS),
+    admin = Depends(get_admin_user),
+    db = Depends(get_database),
+):
+    try:
+        if _escaneos:
+            escaneo_id = next(iter(_escaneos))
+            raise HTTPException(status_code=409, detail=f"Ya hay un escaneo en curso: /admin/cifrado/escaneo/{escaneo_id}")
+        escaneo_id = str(ObjectId())
+        parametros = {"particiones": particiones, "procesos": procesos, "max_ids": max_ids}
+        await db.escaneos_cifrado.insert_one({
+            "_id": escaneo_id, "estado": "en_curso", "parametros": parametros,
+            "solicitado_por": admin["email"], "inicio": datetime.now(),
+        })
+        _escaneos[escaneo_id] = asyncio.create_task(ejecutar_escaneo(db, escaneo_id, **parametros))
+        return {"id": escaneo_id, "estado": "en_curso", "estado_url": f"/admin/cifrado/escaneo/{escaneo_id}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al lanzar el escaneo del cifrado: {str(e)}")
+
+# Estado, progreso y (al terminar) resultado de un escaneo; se guarda en MongoDB, así que responde cualquier worker
+@router.get("/cifrado/escaneo/{escaneo_id}")
+async def obtener_escaneo_cifrado(escaneo_id: str, admin = Depends(get_admin_user), db = Depends(get_database)):
+    try:
+        escaneo = await db.escaneos_cifrado.find_one({"_id": escaneo_id})
+        if not escaneo:
+            raise HTTPException(status_code=404, detail="Escaneo no encontrado")
+        return {"id": escaneo.pop("_id"), **escaneo}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el escaneo del cifrado: {str(e)}")
@@ -4,9 +4,10 @@ from typing import Optional
 from datetime import datetime, timedelta
 import jwt
 import bcrypt
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
+from repositorios import get_repositorios
+
 router = APIRouter(prefix="/sesion", tags=["sesion"])
 
 # Modelos para sesión
@@ -41,20 +42,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-async def get_database():
-    from mongoapi import database
-    if database is None:
-        raise HTTPException(
-            status_code=500, 
-            detail="Error de conexión a la base de datos. Verifica que MongoDB esté conectado."
-        )
-    return database
-
 @router.post("/login", response_model=LoginResponse)
-async def login(login_data: LoginRequest, db = Depends(get_database)):
+async def login(login_data: LoginRequest, repos = Depends(get_repositorios)):
     try:
         # Buscar usuario por email
-        user = await db.usuarios.find_one({"email": login_data.email})
+        user = await repos.usuarios.buscar_por_email(login_data.email)
         if not user:
             raise HTTPException(status_code=401, detail="Credenciales incorrectas")
         
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, EmailStr, Field
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import bcrypt
-from motor.motor_asyncio import AsyncIOMotorClient
+import csv
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+
+from repositorios import get_repositorios
+from rutas.admin import get_admin_user
 
 router = APIRouter(prefix="/usuarios", tags=["usuarios"])
 
@@ -36,48 +47,87 @@ class Usuario(UsuarioBase):
             ObjectId: str
         }
 
+class ResultadoFila(BaseModel):
+    fila: int  # Posición en la petición contando desde 1 (en el CSV, sin la cabecera)
+    email: Optional[str] = None
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    creados: int
+    errores: int
+    resultados: List[ResultadoFila]
+
 def hash_password(password: str) -> str:
     salt = bcrypt.gensalt()
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
-async def get_database():
-    from mongoapi import database
-    if database is None:
-        raise HTTPException(
-            status_code=500, 
-            detail="Error de conexión a la base de datos. Verifica que MongoDB esté conectado."
-        )
-    return database
+# Pool de procesos para hashear contraseñas en paralelo sin bloquear el event loop
+PROCESOS_HASH = int(os.getenv("PROCESOS_HASH", os.cpu_count() or 1))
+LOTE_PROVISION = int(os.getenv("LOTE_PROVISION", 500))
+_pool_hash = None
+
+def get_pool_hash() -> ProcessPoolExecutor:
+    global _pool_hash
+    if _pool_hash is None:
+        # spawn: los workers no heredan el event loop ni las conexiones de Motor del proceso padre
+        _pool_hash = ProcessPoolExecutor(max_workers=PROCESOS_HASH, mp_context=multiprocessing.get_context("spawn"))
+    return _pool_hash
+
+def cerrar_pool_hash():
+    global _pool_hash
+    if _pool_hash is not None:
+        _pool_hash.shutdown(wait=False, cancel_futures=True)
+        _pool_hash = None
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    loop = asyncio.get_running_loop()
+    pool = get_pool_hash()
+    return await asyncio.gather(*[loop.run_in_executor(pool, hash_password, password) for password in passwords])
+
+async def requiere_email_unico(repos = Depends(get_repositorios)):
+    """El alta masiva no comprueba emails antes de insertar: sin el índice único entrarían duplicados"""
+    if not await repos.usuarios.email_unico():
+        raise HTTPException(status_code=503, detail="Alta masiva deshabilitada: falta el índice único de email (¿emails duplicados?)")
+
+async def provisionar_lote(repos, usuarios: List[UsuarioCreate], filas: List[int]) -> List[ResultadoFila]:
+    """Hashea en paralelo e inserta sin pre-comprobar emails: los duplicados los detecta el índice único"""
+    hashes = await hash_passwords([usuario.password for usuario in usuarios])
+    ahora = datetime.now()
+    documentos = [
+        {**usuario.dict(), "password": hashed, "fecha_creacion": ahora, "fecha_actualizacion": ahora}
+        for usuario, hashed in zip(usuarios, hashes)
+    ]
+    ids, errores = await repos.usuarios.crear_lote(documentos)
+    return [
+        ResultadoFila(fila=fila, email=usuario.email, id=ids[i], error=errores.get(i))
+        for i, (usuario, fila) in enumerate(zip(usuarios, filas))
+    ]
 
 @router.get("/", response_model=List[Usuario])
-async def obtener_usuarios(db = Depends(get_database)):
+async def obtener_usuarios(repos = Depends(get_repositorios)):
     try:
-        usuarios = []
-        cursor = db.usuarios.find({}, {"password": 0})  # Excluir password del query
-        async for documento in cursor:
-            documento["_id"] = str(documento["_id"])
-            usuarios.append(Usuario(**documento))
-        return usuarios
+        documentos = await repos.usuarios.listar()  # Sin password
+        return [Usuario(**documento) for documento in documentos]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener usuarios: {str(e)}")
 
 @router.get("/{usuario_id}", response_model=Usuario)
-async def obtener_usuario(usuario_id: str, db = Depends(get_database)):
+async def obtener_usuario(usuario_id: str, repos = Depends(get_repositorios)):
     try:
-        documento = await db.usuarios.find_one({"_id": ObjectId(usuario_id)}, {"password": 0})  # Excluir password
+        documento = await repos.usuarios.obtener(usuario_id)  # Sin password
         if not documento:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        documento["_id"] = str(documento["_id"])
         return Usuario(**documento)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener usuario: {str(e)}")
 
 @router.post("/", response_model=Usuario)
-async def crear_usuario(usuario: UsuarioCreate, db = Depends(get_database)):
+async def crear_usuario(usuario: UsuarioCreate, repos = Depends(get_repositorios)):
     try:
         # Verificar si el email ya existe
-        existing_user = await db.usuarios.find_one({"email": usuario.email})
+        existing_user = await repos.usuarios.buscar_por_email(usuario.email)
         if existing_user:
             raise HTTPException(status_code=400, detail="El email ya está registrado")
         
@@ -87,8 +137,7 @@ async def crear_usuario(usuario: UsuarioCreate, db = Depends(get_database)):
         documento["fecha_creacion"] = datetime.now()
         documento["fecha_actualizacion"] = datetime.now()
         
-        resultado = await db.usuarios.insert_one(documento)
-        documento["_id"] = str(resultado.inserted_id)
+        documento["_id"] = await repos.usuarios.crear(documento)
         
         # Remover password del response
         del documento["password"]
@@ -96,8 +145,74 @@ async def crear_usuario(usuario: UsuarioCreate, db = Depends(get_database)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear usuario: {str(e)}")
 
+# Alta masiva de usuarios (solo administradores)
+@router.post("/lote", response_model=ResultadoLote, dependencies=[Depends(requiere_email_unico)])
+async def crear_usuarios_lote(usuarios: List[UsuarioCreate], admin = Depends(get_admin_user), repos = Depends(get_repositorios)):
+    try:
+        resultados = []
+        for inicio in range(0, len(usuarios), LOTE_PROVISION):
+            lote = usuarios[inicio:inicio + LOTE_PROVISION]
+            resultados += await provisionar_lote(repos, lote, filas=list(range(inicio + 1, inicio + len(lote) + 1)))
+        errores = sum(1 for resultado in resultados if resultado.error)
+        return ResultadoLote(creados=len(resultados) - errores, errores=errores, resultados=resultados)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear usuarios: {str(e)}")
+
+# Alta masiva desde CSV (columnas nombre,email,password[,activo]) con progreso en NDJSON
+@router.post("/lote/csv", dependencies=[Depends(requiere_email_unico)])
+async def crear_usuarios_csv(request: Request, admin = Depends(get_admin_user), repos = Depends(get_repositorios)):
+    # El CSV se recibe completo antes de responder (en disco si es grande) y se procesa por lotes
+    archivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for bloque in request.stream():
+        archivo.write(bloque)
+    archivo.seek(0)
+
+    async def progreso():
+        totales = {"procesadas": 0, "creados": 0, "errores": 0}
+        pendientes, invalidas = [], []
+
+        async def procesar():
+            resultados = list(invalidas)
+            if pendientes:
+                resultados += await provisionar_lote(
+                    repos, [usuario for _, usuario in pendientes], filas=[fila for fila, _ in pendientes]
+                )
+            totales["procesadas"] += len(resultados)
+            totales["errores"] += sum(1 for r in resultados if r.error)
+            totales["creados"] = totales["procesadas"] - totales["errores"]
+            pendientes.clear()
+            invalidas.clear()
+            errores = [r.dict() for r in resultados if r.error]
+            return json.dumps({**totales, "errores_lote": errores}, ensure_ascii=False) + "\n"
+
+        try:
+            lector = csv.DictReader(io.TextIOWrapper(archivo, encoding="utf-8-sig", newline=""))
+            for fila, valores in enumerate(lector, start=1):
+                valores = {clave.strip(): valor for clave, valor in valores.items() if clave}
+                # DictReader rellena con None las columnas que faltan en filas cortas
+                if any(valor is None for valor in valores.values()):
+                    invalidas.append(ResultadoFila(fila=fila, email=valores.get("email"), error="invalido: faltan columnas"))
+                    continue
+                try:
+                    if "activo" in valores:
+                        valores["activo"] = valores["activo"].strip().lower() not in ("false", "0", "no", "")
+                    pendientes.append((fila, UsuarioCreate(**valores)))
+                except ValidationError as e:
+                    invalidas.append(ResultadoFila(fila=fila, email=valores.get("email"), error=f"invalido: {e.errors()[0]['msg']}"))
+                if len(pendientes) + len(invalidas) >= LOTE_PROVISION:
+                    yield await procesar()
+            if pendientes or invalidas:
+                yield await procesar()
+            yield json.dumps({**totales, "terminado": True}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({**totales, "terminado": False, "error": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            archivo.close()
+
+    return StreamingResponse(progreso(), media_type="application/x-ndjson")
+
 @router.put("/{usuario_id}", response_model=Usuario)
-async def actualizar_usuario(usuario_id: str, usuario: UsuarioUpdate, db = Depends(get_database)):
+async def actualizar_usuario(usuario_id: str, usuario: UsuarioUpdate, repos = Depends(get_repositorios)):
     try:
         documento = usuario.dict(exclude_unset=True)
         
@@ -106,56 +221,35 @@ async def actualizar_usuario(usuario_id: str, usuario: UsuarioUpdate, db = Depen
         
         documento["fecha_actualizacion"] = datetime.now()
         
-        resultado = await db.usuarios.update_one(
-            {"_id": ObjectId(usuario_id)},
-            {"$set": documento}
-        )
-        
-        if resultado.matched_count == 0:
+        if not await repos.usuarios.actualizar(usuario_id, documento):
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        documento_actualizado = await db.usuarios.find_one({"_id": ObjectId(usuario_id)})
-        documento_actualizado["_id"] = str(documento_actualizado["_id"])
-        
-        # Remover password del response
-        if "password" in documento_actualizado:
-            del documento_actualizado["password"]
-            
+        documento_actualizado = await repos.usuarios.obtener(usuario_id)  # Sin password
         return Usuario(**documento_actualizado)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar usuario: {str(e)}")
 
 @router.delete("/{usuario_id}")
-async def eliminar_usuario(usuario_id: str, db = Depends(get_database)):
+async def eliminar_usuario(usuario_id: str, repos = Depends(get_repositorios)):
     try:
-        resultado = await db.usuarios.delete_one({"_id": ObjectId(usuario_id)})
-        if resultado.deleted_count == 0:
+        if not await repos.usuarios.eliminar(usuario_id):
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         return {"message": "Usuario eliminado exitosamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar usuario: {str(e)}")
 
 @router.patch("/{usuario_id}/toggle-status")
-async def alternar_estado_usuario(usuario_id: str, db = Depends(get_database)):
+async def alternar_estado_usuario(usuario_id: str, repos = Depends(get_repositorios)):
     try:
-        documento = await db.usuarios.find_one({"_id": ObjectId(usuario_id)})
+        documento = await repos.usuarios.obtener(usuario_id)
         if not documento:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         nuevo_estado = not documento.get("activo", True)
         
-        await db.usuarios.update_one(
-            {"_id": ObjectId(usuario_id)},
-            {"$set": {"activo": nuevo_estado, "fecha_actualizacion": datetime.now()}}
-        )
+        await repos.usuarios.actualizar(usuario_id, {"activo": nuevo_estado, "fecha_actualizacion": datetime.now()})
         
-        documento_actualizado = await db.usuarios.find_one({"_id": ObjectId(usuario_id)})
-        documento_actualizado["_id"] = str(documento_actualizado["_id"])
-        
-        # Remover password del response
-        if "password" in documento_actualizado:
-            del documento_actualizado["password"]
-            
+        documento_actualizado = await repos.usuarios.obtener(usuario_id)  # Sin password
         return Usuario(**documento_actualizado)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al alternar estado: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Alta masiva de usuarios (/usuarios/lote y /usuarios/lote/csv) con ALMACENAMIENTO=memoria"""
+
+import json
+
+import pytest
+
+import rutas.admin
+import rutas.usuario
+
+
+@pytest.fixture
+def admin(cliente, sesion, monkeypatch):
+    """Cabeceras de un administrador; el hash real (bcrypt en procesos spawn) se sustituye por uno inmediato"""
+    async def hash_passwords(passwords):
+        return [f"hash:{password}" for password in passwords]
+
+    monkeypatch.setattr(rutas.usuario, "hash_passwords", hash_passwords)
+    monkeypatch.setattr(rutas.admin, "ADMIN_EMAILS", {"admin@ejemplo.com"})
+    return sesion("admin@ejemplo.com")
+
+
+def enviar_csv(cliente, cabeceras, contenido):
+    respuesta = cliente.post("/usuarios/lote/csv", content=contenido.encode("utf-8"), headers=cabeceras)
+    assert respuesta.status_code == 200
+    return [json.loads(linea) for linea in respuesta.text.splitlines()]
+
+
+def emails(cliente):
+    return {u["email"] for u in cliente.get("/usuarios/").json()}
+
+
+def test_lote_csv_informa_filas_duplicadas_cortas_e_invalidas(cliente, admin):
+    lineas = enviar_csv(cliente, admin, "\n".join([
+        "nombre,email,password,activo",
+        "Eva,eva@ejemplo.com,clave1,true",
+        "Luis,luis@ejemplo.com,clave2,no",
+        "Eva bis,eva@ejemplo.com,clave3,1",
+        "Corta,corta@ejemplo.com",
+        "Mala,no-es-un-email,clave4,1",
+        "Admin,admin@ejemplo.com,clave5,1",  # ya existe (lo crea la sesión)
+    ]) + "\n")
+
+    final = lineas[-1]
+    assert final == {"procesadas": 6, "creados": 2, "errores": 4, "terminado": True}
+    errores = {e["fila"]: e for lote in lineas[:-1] for e in lote["errores_lote"]}
+    # Las filas cuentan desde 1 sin la cabecera
+    assert sorted(errores) == [3, 4, 5, 6]
+    assert errores[3]["error"] == "email_duplicado" and errores[3]["email"] == "eva@ejemplo.com"
+    assert errores[4]["error"] == "invalido: faltan columnas" and errores[4]["email"] == "corta@ejemplo.com"
+    assert errores[5]["error"].startswith("invalido:")
+    assert errores[6]["error"] == "email_duplicado"
+
+    usuarios = {u["email"]: u for u in cliente.get("/usuarios/").json()}
+    assert usuarios.keys() == {"admin@ejemplo.com", "eva@ejemplo.com", "luis@ejemplo.com"}
+    assert usuarios["eva@ejemplo.com"]["activo"] is True and usuarios["luis@ejemplo.com"]["activo"] is False
+
+
+def test_lote_csv_procesa_por_lotes_con_filas_correlativas(cliente, admin, monkeypatch):
+    monkeypatch.setattr(rutas.usuario, "LOTE_PROVISION", 2)
+    filas = [f"U{i},u{i}@ejemplo.com,clave" for i in range(1, 5)] + ["Repetida,u1@ejemplo.com,clave"]
+    lineas = enviar_csv(cliente, admin, "﻿nombre,email,password\n" + "\n".join(filas) + "\n")
+
+    # Un progreso por cada lote de 2 y el resumen final
+    assert [linea["procesadas"] for linea in lineas] == [2, 4, 5, 5]
+    assert lineas[2]["errores_lote"] == [{"fila": 5, "email": "u1@ejemplo.com", "id": None, "error": "email_duplicado"}]
+    assert lineas[-1]["terminado"] is True and lineas[-1]["creados"] == 4
+    assert {f"u{i}@ejemplo.com" for i in range(1, 5)} <= emails(cliente)
+
+
+def test_lote_json_numera_filas_desde_uno(cliente, admin, monkeypatch):
+    monkeypatch.setattr(rutas.usuario, "LOTE_PROVISION", 2)
+    usuarios = [{"nombre": n, "email": f"{n}@ejemplo.com", "password": "clave"} for n in ("eva", "luis", "eva")]
+    respuesta = cliente.post("/usuarios/lote", json=usuarios, headers=admin)
+    assert respuesta.status_code == 200
+    resultado = respuesta.json()
+    assert resultado["creados"] == 2 and resultado["errores"] == 1
+    assert [(r["fila"], r["error"]) for r in resultado["resultados"]] == [(1, None), (2, None), (3, "email_duplicado")]
+
+
+def test_alta_masiva_solo_para_administradores(cliente, admin, sesion):
+    luis = sesion("luis@ejemplo.com")
+    assert cliente.post("/usuarios/lote", json=[], headers=luis).status_code == 403
+    assert cliente.post("/usuarios/lote/csv", content=b"nombre,email,password\n", headers=luis).status_code == 403
+    assert cliente.post("/usuarios/lote/csv", content=b"nombre,email,password\n").status_code == 401
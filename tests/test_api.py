@@ -0,0 +1,67 @@
+"""La API completa con ALMACENAMIENTO=memoria (sin MongoDB)"""
+
+from bson import ObjectId
+
+ACTIVIDAD = {
+    "Nombre": "Informe", "Categoria": "Trabajo", "Descripcion": "Trimestral", "Prioridad": 1,
+    "Fin": "2030-01-01T00:00:00", "Estatus": "En revisión", "mailto": [{"to": "jefa@ejemplo.com"}],
+}
+
+
+def test_health_indica_almacenamiento_en_memoria(cliente):
+    assert cliente.get("/health").json()["database"] == "memoria"
+
+
+def test_actividades_requieren_sesion(cliente):
+    assert cliente.get("/actividades/").status_code == 401
+    assert cliente.get("/actividades/", headers={"Authorization": "Bearer x"}).status_code == 401
+
+
+def test_crear_listar_alternar_actualizar_y_eliminar(cliente, sesion):
+    cabeceras = sesion()
+    creada = cliente.post("/actividades/", json=ACTIVIDAD, headers=cabeceras)
+    assert creada.status_code == 200
+    actividad_id = creada.json()["_id"]
+
+    lista = cliente.get("/actividades/", headers=cabeceras).json()
+    assert [(a["_id"], a["Nombre"], a["mailto"]) for a in lista] == [(actividad_id, "Informe", [{"to": "jefa@ejemplo.com"}])]
+
+    alternada = cliente.patch(f"/actividades/{actividad_id}/alternar_estado", headers=cabeceras)
+    assert alternada.json()["Estatus"] == "Cerrado"
+    assert cliente.patch(f"/actividades/{actividad_id}/alternar_estado", headers=cabeceras).json()["Estatus"] == "En revisión"
+
+    actualizada = cliente.put(f"/actividades/{actividad_id}", json={**ACTIVIDAD, "Nombre": "Informe anual"}, headers=cabeceras)
+    assert actualizada.status_code == 200
+    detalle = cliente.get(f"/actividades/{actividad_id}", headers=cabeceras).json()
+    assert detalle["Nombre"] == "Informe anual" and detalle["Descripcion"] == "Trimestral"
+
+    assert cliente.delete(f"/actividades/{actividad_id}", headers=cabeceras).status_code == 200
+    assert cliente.get("/actividades/", headers=cabeceras).json() == []
+    assert cliente.get(f"/actividades/{actividad_id}", headers=cabeceras).status_code == 404
+
+
+def test_los_datos_sensibles_se_guardan_encriptados(cliente, sesion):
+    import mongoapi
+    cabeceras = sesion()
+    actividad_id = cliente.post("/actividades/", json=ACTIVIDAD, headers=cabeceras).json()["_id"]
+    actividades = mongoapi.app.state.repositorios.actividades
+    guardada = next(d for documentos in actividades.por_usuario.values() for d in documentos.values() if d["_id"] == actividad_id)
+    assert guardada["Nombre"] != "Informe" and guardada["mailto"][0]["to"] != "jefa@ejemplo.com"
+
+
+def test_cada_usuario_solo_ve_sus_actividades(cliente, sesion):
+    ana, luis = sesion("ana@ejemplo.com"), sesion("luis@ejemplo.com")
+    actividad_id = cliente.post("/actividades/", json=ACTIVIDAD, headers=ana).json()["_id"]
+    assert cliente.get("/actividades/", headers=luis).json() == []
+    assert cliente.get(f"/actividades/{actividad_id}", headers=luis).status_code == 404
+    assert cliente.put(f"/actividades/{actividad_id}", json=ACTIVIDAD, headers=luis).status_code == 404
+    assert cliente.delete(f"/actividades/{actividad_id}", headers=luis).status_code == 404
+    assert len(cliente.get("/actividades/", headers=ana).json()) == 1
+
+
+def test_actividad_inexistente(cliente, sesion):
+    cabeceras = sesion()
+    otra = str(ObjectId())
+    assert cliente.patch(f"/actividades/{otra}/alternar_estado", headers=cabeceras).status_code == 404
+    assert cliente.put(f"/actividades/{otra}", json=ACTIVIDAD, headers=cabeceras).status_code == 404
+    assert cliente.delete(f"/actividades/{otra}", headers=cabeceras).status_code == 404
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+ACTIVIDAD = {
+    "Nombre": "Informe", "Categoria": "Trabajo", "Descripcion": "Trimestral",
+    "Fin": "2030-01-01T00:00:00", "Estatus": "En revisión", "mailto": [],
+}
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+def hace(dias):
+    return datetime.now() - timedelta(days=dias)
+
+
+async def sembrar(repos):
+    ids = {
+        "vieja": await repos.actividades.crear({"usuario_id": "u1", "Estatus": "Finalizado", "fecha_cierre": hace(100)}),
+        "sin_fecha_cierre": await repos.actividades.crear({"usuario_id": "u2", "Estatus": "Cerrado", "Fecha": hace(200)}),
+        "reciente": await repos.actividades.crear({"usuario_id": "u1", "Estatus": "Cerrado", "fecha_cierre": hace(1)}),
+        "abierta": await repos.actividades.crear({"usuario_id": "u1", "Estatus": "En revisión", "Fecha": hace(300)}),
+    }
+    return ids
+
+
+def test_archivar_lote_mueve_solo_las_cerradas_antiguas(repos):
+    async def prueba():
+        ids = await sembrar(repos)
+        usuarios = await repos.actividades.archivar_lote(hace(90), limite=10)
+        assert sorted(usuarios) == ["u1", "u2"]
+
+        activas = {d["_id"] for d in await repos.actividades.listar("u1")}
+        assert activas == {ids["reciente"], ids["abierta"]}
+        archivada = await repos.actividades.obtener(ids["vieja"], "u1", incluir_archivadas=True)
+        assert archivada["Estatus"] == "Finalizado" and "archivado_en" in archivada
+        assert await repos.actividades.obtener(ids["vieja"], "u1") is None
+        todas = {d["_id"] for d in await repos.actividades.listar("u1", incluir_archivadas=True)}
+        assert todas == activas | {ids["vieja"]}
+        # Otra pasada no encuentra nada más
+        assert await repos.actividades.archivar_lote(hace(90), limite=10) == []
+
+    ejecutar(prueba())
+
+
+def test_archivar_lote_respeta_el_limite(repos):
+    async def prueba():
+        await sembrar(repos)
+        assert len(await repos.actividades.archivar_lote(hace(90), limite=1)) == 1
+        assert len(await repos.actividades.archivar_lote(hace(90), limite=1)) == 1
+        assert await repos.actividades.archivar_lote(hace(90), limite=1) == []
+
+    ejecutar(prueba())
+
+
+def test_restaurar_conserva_el_estatus_y_renueva_fecha_cierre(repos):
+    async def prueba():
+        ids = await sembrar(repos)
+        await repos.actividades.archivar_lote(hace(90), limite=10)
+        restaurada = await repos.actividades.restaurar(ids["vieja"], "u1")
+        assert restaurada["Estatus"] == "Finalizado"
+        assert "archivado_en" not in restaurada
+        assert restaurada["fecha_cierre"] > hace(1)
+        assert (await repos.actividades.obtener(ids["vieja"], "u1"))["Estatus"] == "Finalizado"
+        # No se vuelve a archivar en la siguiente pasada
+        assert await repos.actividades.archivar_lote(hace(90), limite=10) == []
+        assert await repos.actividades.restaurar(ids["vieja"], "u1") is None
+
+    ejecutar(prueba())
+
+
+def test_eliminar_borra_tambien_las_archivadas(repos):
+    async def prueba():
+        ids = await sembrar(repos)
+        await repos.actividades.archivar_lote(hace(90), limite=10)
+        assert await repos.actividades.eliminar(ids["vieja"], "u1")
+        assert await repos.actividades.obtener(ids["vieja"], "u1", incluir_archivadas=True) is None
+        assert not await repos.actividades.eliminar(ids["vieja"], "u1")
+
+    ejecutar(prueba())
+
+
+def test_archivar_lote_no_borra_las_que_cambian_durante_la_copia(repos, monkeypatch):
+    if repos.nombre != "mongo":
+        return  # En memoria la copia y el borrado no se pueden intercalar con otra escritura
+
+    async def prueba():
+        ids = await sembrar(repos)
+        actividades = repos.actividades
+        copiar = actividades.escritura_archivo.bulk_write
+
+        async def copiar_y_editar(operaciones, **kwargs):
+            resultado = await copiar(operaciones, **kwargs)
+            # Un PUT concurrente entre la copia y el borrado
+            await actividades.coleccion.update_one({"_id": ObjectId(ids["vieja"])}, {"$set": {"Nombre": "editada"}})
+            return resultado
+
+        monkeypatch.setattr(actividades.escritura_archivo, "bulk_write", copiar_y_editar)
+        assert await actividades.archivar_lote(hace(90), limite=10) == ["u2"]
+
+        # La editada sigue activa con su cambio y sin copia en el archivo
+        documento = await actividades.obtener(ids["vieja"], "u1")
+        assert documento["Nombre"] == "editada"
+        assert await actividades.archivo.count_documents({"_id": ObjectId(ids["vieja"])}) == 0
+        assert await actividades.archivo.count_documents({"_id": ObjectId(ids["sin_fecha_cierre"])}) == 1
+
+    ejecutar(prueba())
+
+
+def archivar_todo(cliente):
+    import mongoapi
+    return ejecutar(mongoapi.app.state.repositorios.actividades.archivar_lote(datetime.now() + timedelta(days=1), 100))
+
+
+def test_api_archivadas_se_leen_actualizan_eliminan_y_restauran(cliente, sesion):
+    cabeceras = sesion()
+    finalizada = cliente.post("/actividades/", json={**ACTIVIDAD, "Estatus": "Finalizado"}, headers=cabeceras).json()["_id"]
+    cerrada = cliente.post("/actividades/", json={**ACTIVIDAD, "Estatus": "Cerrado"}, headers=cabeceras).json()["_id"]
+    borrada = cliente.post("/actividades/", json={**ACTIVIDAD, "Estatus": "Cerrado"}, headers=cabeceras).json()["_id"]
+    assert len(archivar_todo(cliente)) == 3
+
+    assert cliente.get("/actividades/", headers=cabeceras).json() == []
+    archivadas = cliente.get("/actividades/", params={"incluir_archivadas": True}, headers=cabeceras).json()
+    assert {a["_id"] for a in archivadas} == {finalizada, cerrada, borrada}
+    assert cliente.get(f"/actividades/{finalizada}", headers=cabeceras).status_code == 404
+    assert cliente.get(f"/actividades/{finalizada}", params={"incluir_archivadas": True}, headers=cabeceras).status_code == 200
+
+    # Restaurar no cambia el estado
+    respuesta = cliente.post(f"/actividades/{finalizada}/restaurar", headers=cabeceras)
+    assert respuesta.status_code == 200
+    assert respuesta.json()["Estatus"] == "Finalizado"
+    assert cliente.post(f"/actividades/{finalizada}/restaurar", headers=cabeceras).status_code == 409
+    assert cliente.post(f"/actividades/{ObjectId()}/restaurar", headers=cabeceras).status_code == 404
+
+    # PUT sobre una archivada la devuelve a la colección activa con los cambios
+    respuesta = cliente.put(f"/actividades/{cerrada}", json={**ACTIVIDAD, "Nombre": "Reabierta"}, headers=cabeceras)
+    assert respuesta.status_code == 200
+
+    assert cliente.delete(f"/actividades/{borrada}", headers=cabeceras).status_code == 200
+    assert cliente.delete(f"/actividades/{borrada}", headers=cabeceras).status_code == 404
+
+    activas = {a["_id"]: a for a in cliente.get("/actividades/", headers=cabeceras).json()}
+    assert activas.keys() == {finalizada, cerrada}
+    assert activas[finalizada]["Estatus"] == "Finalizado"
+    assert activas[cerrada]["Nombre"] == "Reabierta" and activas[cerrada]["Estatus"] == "En revisión"
+    assert cliente.get("/actividades/", params={"incluir_archivadas": True}, headers=cabeceras).json() == list(activas.values())
@@ -0,0 +1,97 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import arranque
+from arranque import InformeArranque, PrimerasPeticiones
+
+
+@pytest.fixture
+def presupuestos(monkeypatch):
+    monkeypatch.setattr(arranque, "PRESUPUESTO_IMPORT_MS", 100)
+    monkeypatch.setattr(arranque, "PRESUPUESTO_INICIO_MS", 200)
+    monkeypatch.setattr(arranque, "PRESUPUESTO_PRIMERA_PETICION_MS", 50)
+
+
+def test_penalizacion_solo_con_dos_peticiones():
+    informe = InformeArranque(import_ms=10)
+    informe.peticiones = {"GET /a": [80.0, 20.0], "GET /b": [30.0], "GET /c": [5.0, 9.5]}
+    assert informe.penalizaciones() == {"GET /a": 60.0, "GET /c": -4.5}
+
+
+def test_dentro_del_presupuesto(presupuestos):
+    informe = InformeArranque(import_ms=100)
+    informe.fases = {"mongo": 120.0, "precalentar": 80.0}
+    informe.peticiones = {"GET /a": [70.0, 20.0]}
+    assert informe.inicio_ms == 200.0
+    assert informe.excedidos() == []
+
+
+def test_excedidos_de_cada_presupuesto(presupuestos):
+    informe = InformeArranque(import_ms=150.5)
+    informe.fases = {"mongo": 150.0, "precalentar": 60.2}
+    informe.peticiones = {"GET /a": [90.0, 20.0], "GET /b": [200.0]}
+    assert informe.excedidos() == [
+        "importación 150.5 ms > 100 ms",
+        "arranque 210.2 ms > 200 ms",
+        "primera petición GET /a +70.0 ms > 50 ms",
+    ]
+    resumen = informe.resumen()
+    assert resumen["penalizacion_primera_ms"] == {"GET /a": 70.0}
+    assert resumen["presupuesto_ms"] == {"import": 100, "inicio": 200, "primera_peticion": 50}
+    assert resumen["excedidos"] == informe.excedidos()
+
+
+def test_fase_se_registra_aunque_falle():
+    informe = InformeArranque(import_ms=0)
+    with pytest.raises(RuntimeError):
+        with informe.fase("mongo"):
+            raise RuntimeError("sin conexión")
+    assert "mongo" in informe.fases and informe.inicio_ms >= 0
+
+
+def aplicacion(informe):
+    app = FastAPI()
+
+    @app.get("/actividades/{actividad_id}")
+    async def obtener(actividad_id: str):
+        return {"id": actividad_id}
+
+    app.add_middleware(PrimerasPeticiones, informe=informe)
+    return app
+
+
+def middleware(app):
+    app.build_middleware_stack()
+    return next(m for m in iter_middleware(app.middleware_stack) if isinstance(m, PrimerasPeticiones))
+
+
+def iter_middleware(capa):
+    while capa is not None:
+        yield capa
+        capa = getattr(capa, "app", None)
+
+
+def test_primeras_peticiones_por_ruta_y_despues_sin_medir():
+    informe = InformeArranque(import_ms=0)
+    app = aplicacion(informe)
+    with TestClient(app) as cliente:
+        for actividad_id in ("a", "b", "a", "a", "c"):
+            assert cliente.get(f"/actividades/{actividad_id}").status_code == 200
+        capa = middleware(app)
+
+    assert list(informe.peticiones) == ["GET /actividades/{actividad_id}"]
+    assert len(informe.peticiones["GET /actividades/{actividad_id}"]) == 2
+    # /b completó la ruta; la segunda /a y /c son URLs aún no vistas y se miden una vez; la tercera /a ya no
+    assert capa.completas == {("GET", "/actividades/a"), ("GET", "/actividades/b"), ("GET", "/actividades/c")}
+    assert capa.medidas == 4
+
+
+def test_tope_de_peticiones_medidas(monkeypatch):
+    monkeypatch.setattr(arranque, "MAX_PETICIONES", 1)
+    informe = InformeArranque(import_ms=0)
+    app = aplicacion(informe)
+    with TestClient(app) as cliente:
+        cliente.get("/actividades/a")
+        cliente.get("/actividades/b")
+    assert len(informe.peticiones["GET /actividades/{actividad_id}"]) == 1
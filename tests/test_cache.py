@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+
+import cache_actividades
+from cache_actividades import BackendMemoria, BackendRedis, CacheActividades, backend_por_defecto
+
+
+class RedisEnMemoria:
+    """Lo que usa BackendRedis de redis.asyncio, con expiración por clave"""
+
+    def __init__(self):
+        self.datos = {}
+
+    def _vigente(self, clave):
+        valor, expira = self.datos.get(clave, (None, None))
+        if expira is not None and expira < time.monotonic():
+            del self.datos[clave]
+            return None
+        return valor
+
+    async def get(self, clave):
+        return self._vigente(clave)
+
+    async def set(self, clave, valor, ex=None):
+        self.datos[clave] = (valor, time.monotonic() + ex if ex else None)
+
+    async def incr(self, clave):
+        valor = int(self._vigente(clave) or 0) + 1
+        self.datos[clave] = (str(valor).encode(), None)
+        return valor
+
+    async def dbsize(self):
+        return len(self.datos)
+
+    async def info(self, seccion):
+        return {"used_memory": 0, "maxmemory": 0} if seccion == "memory" else {"evicted_keys": 0}
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """time.monotonic controlable para probar el TTL"""
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_actividades.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+def test_lru_desaloja_la_menos_usada_al_superar_los_bytes():
+    async def prueba():
+        backend = BackendMemoria(max_bytes=30)
+        await backend.set("act:u1:0:a", b"x" * 10, 60)
+        await backend.set("act:u1:0:b", b"x" * 10, 60)
+        await backend.set("act:u2:0:c", b"x" * 10, 60)
+        assert await backend.get("act:u1:0:a") is not None  # 'a' pasa a ser la más reciente
+        await backend.set("act:u2:0:d", b"x" * 10, 60)
+        assert await backend.get("act:u1:0:b") is None
+        assert await backend.get("act:u1:0:a") is not None
+        assert backend.bytes == 30
+        assert backend.desalojos == 1
+        # Un valor mayor que toda la caché no se guarda
+        await backend.set("act:u1:0:e", b"x" * 31, 60)
+        assert await backend.get("act:u1:0:e") is None
+
+    ejecutar(prueba())
+
+
+def test_las_entradas_caducan_con_el_ttl(reloj):
+    async def prueba():
+        cache = CacheActividades(BackendMemoria(max_bytes=1024), ttl=60)
+        clave = await cache.clave("u1", "lista")
+        await cache.guardar(clave, b"[]")
+        reloj[0] += 59
+        assert await cache.obtener(clave) == b"[]"
+        reloj[0] += 2
+        assert await cache.obtener(clave) is None
+        assert cache.backend.bytes == 0
+
+    ejecutar(prueba())
+
+
+def test_invalidar_cambia_la_generacion_solo_del_usuario():
+    async def prueba():
+        cache = CacheActividades(BackendMemoria(max_bytes=1024), ttl=60)
+        antes = await cache.clave("u1", "lista")
+        otro = await cache.clave("u2", "lista")
+        local = cache.clave_local("u1", "lista")
+        await cache.guardar(antes, b"[1]")
+        await cache.guardar(otro, b"[2]")
+
+        await cache.invalidar("u1")
+        assert await cache.clave("u1", "lista") != antes
+        assert cache.clave_local("u1", "lista") != local
+        assert await cache.obtener(antes) is None
+        assert await cache.obtener(await cache.clave("u2", "lista")) == b"[2]"
+
+    ejecutar(prueba())
+
+
+def test_sin_backend_no_cachea_pero_clave_local_cambia():
+    async def prueba():
+        cache = CacheActividades(None, ttl=60)
+        assert await cache.clave("u1", "lista") is None
+        local = cache.clave_local("u1", "lista")
+        await cache.invalidar("u1")
+        assert cache.clave_local("u1", "lista") != local
+        assert await cache.estadisticas() == {"backend": "ninguno"}
+
+    ejecutar(prueba())
+
+
+def test_redis_comparte_la_invalidacion_entre_procesos():
+    async def prueba():
+        redis = RedisEnMemoria()
+        # Dos workers con su propia CacheActividades sobre el mismo Redis
+        worker1 = CacheActividades(BackendRedis("", cliente=redis), ttl=60)
+        worker2 = CacheActividades(BackendRedis("", cliente=redis), ttl=60)
+        clave = await worker1.clave("u1", "lista")
+        await worker1.guardar(clave, b"[]")
+        assert await worker2.obtener(await worker2.clave("u1", "lista")) == b"[]"
+
+        await worker1.invalidar("u1")
+        assert await worker2.clave("u1", "lista") != clave
+        assert await worker2.obtener(await worker2.clave("u1", "lista")) is None
+        assert (await worker2.estadisticas())["backend"] == "redis"
+
+    ejecutar(prueba())
+
+
+def test_redis_expira_con_el_ttl(reloj):
+    async def prueba():
+        cache = CacheActividades(BackendRedis("", cliente=RedisEnMemoria()), ttl=60)
+        clave = await cache.clave("u1", "lista")
+        await cache.guardar(clave, b"[]")
+        reloj[0] += 61
+        assert await cache.obtener(clave) is None
+
+    ejecutar(prueba())
+
+
+def test_aviso_con_memoria_y_varios_workers():
+    memoria = CacheActividades(BackendMemoria(max_bytes=1024), ttl=60)
+    assert memoria.aviso_por_proceso(procesos=1) is None
+    assert "memoria" in memoria.aviso_por_proceso(procesos=4)
+    assert CacheActividades(None, ttl=60).aviso_por_proceso(procesos=4) is None
+    assert CacheActividades(BackendRedis("", cliente=RedisEnMemoria()), ttl=60).aviso_por_proceso(procesos=4) is None
+
+
+def test_por_defecto_memoria_con_un_worker_y_redis_si_hay_url(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert backend_por_defecto(procesos=1) == "memoria"
+    assert backend_por_defecto(procesos=4) == "ninguno"
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    assert backend_por_defecto(procesos=1) == "redis"
+    assert backend_por_defecto(procesos=4) == "redis"
+
+
+def test_metricas_de_cache_solo_para_administradores(cliente, sesion, monkeypatch):
+    import rutas.admin
+    assert cliente.get("/metricas/cache").status_code == 401
+    assert cliente.get("/metricas/cache", headers=sesion("ana@ejemplo.com")).status_code == 403
+    monkeypatch.setattr(rutas.admin, "ADMIN_EMAILS", {"admin@ejemplo.com"})
+    respuesta = cliente.get("/metricas/cache", headers=sesion("admin@ejemplo.com"))
+    assert respuesta.status_code == 200
+    assert "backend" in respuesta.json()
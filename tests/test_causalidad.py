@@ -0,0 +1,69 @@
+import time
+
+import bson
+from bson import Binary, Int64, Timestamp
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import causalidad
+
+SECRETO = b"secreto"
+CLUSTER_TIME = {"clusterTime": Timestamp(1700000000, 3), "signature": {"hash": Binary(b"\x00" * 20), "keyId": Int64(0)}}
+OPERATION_TIME = Timestamp(1700000000, 3)
+
+
+def test_codificar_y_decodificar():
+    valor = causalidad.codificar(SECRETO, "u1", CLUSTER_TIME, OPERATION_TIME, time.time() + 60)
+    token = causalidad.decodificar(SECRETO, valor)
+    assert token["u"] == "u1"
+    # Se reenvía a MongoDB tal cual: basta con que el BSON sea el mismo
+    assert bson.encode(token["c"]) == bson.encode(CLUSTER_TIME)
+    assert token["o"] == OPERATION_TIME
+
+
+def test_rechaza_tokens_alterados_caducados_o_de_otra_clave():
+    valor = causalidad.codificar(SECRETO, "u1", CLUSTER_TIME, OPERATION_TIME, time.time() + 60)
+    alterado = valor[:-2] + ("A" if valor[-2] != "A" else "B") + valor[-1]
+    assert causalidad.decodificar(SECRETO, alterado) is None
+    assert causalidad.decodificar(b"otro", valor) is None
+    assert causalidad.decodificar(SECRETO, "basura") is None
+    caducado = causalidad.codificar(SECRETO, "u1", CLUSTER_TIME, OPERATION_TIME, time.time() - 1)
+    assert causalidad.decodificar(SECRETO, caducado) is None
+
+
+def crear_app():
+    app = FastAPI()
+    app.add_middleware(causalidad.TokenCausal, secreto=SECRETO.decode(), ventana=60)
+
+    @app.post("/escribir/{usuario_id}")
+    async def escribir(usuario_id: str):
+        causalidad.emitir(usuario_id, CLUSTER_TIME, OPERATION_TIME)
+        return {}
+
+    @app.get("/leer/{usuario_id}")
+    async def leer(usuario_id: str):
+        token = causalidad.recibido(usuario_id)
+        return {"operation_time": token[1].time if token else None}
+
+    return app
+
+
+def test_el_token_de_una_escritura_vuelve_en_cabecera_y_en_cookie():
+    cliente = TestClient(crear_app())
+    respuesta = cliente.post("/escribir/u1")
+    valor = respuesta.headers[causalidad.CABECERA]
+    assert respuesta.cookies[causalidad.COOKIE] == valor
+
+    # La cookie la devuelve el propio cliente
+    assert cliente.get("/leer/u1").json() == {"operation_time": OPERATION_TIME.time}
+    # Por cabecera, desde un cliente sin cookies
+    otro = TestClient(crear_app())
+    assert otro.get("/leer/u1", headers={causalidad.CABECERA: valor}).json() == {"operation_time": OPERATION_TIME.time}
+    # Solo vale para el usuario que escribió
+    assert otro.get("/leer/u2", headers={causalidad.CABECERA: valor}).json() == {"operation_time": None}
+
+
+def test_sin_escrituras_no_se_emite_token():
+    respuesta = TestClient(crear_app()).get("/leer/u1")
+    assert causalidad.CABECERA not in respuesta.headers
+    assert respuesta.json() == {"operation_time": None}
@@ -0,0 +1,37 @@
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+
+from rutas.actividades import ActividadBase, CryptoUtils
+
+CAMPOS = {"Nombre": "n", "Categoria": "c", "Descripcion": "d", "mailto": [{"to": "x@ejemplo.com"}]}
+
+
+@pytest.fixture
+def claves(monkeypatch):
+    antigua, nueva = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    monkeypatch.setenv("FERNET_KEY", antigua)
+    monkeypatch.delenv("FERNET_KEYS_ANTERIORES", raising=False)
+    return antigua, nueva
+
+
+def test_sellado_ida_y_vuelta(claves):
+    blob = CryptoUtils.seal_fields(CAMPOS, "usuario")
+    assert CryptoUtils.unseal_fields(blob, "usuario") == CAMPOS
+    with pytest.raises(InvalidTag):
+        CryptoUtils.unseal_fields(blob, "otro_usuario")
+
+
+def test_sellado_se_abre_con_claves_anteriores_tras_rotar(claves, monkeypatch):
+    antigua, nueva = claves
+    documento = ActividadBase.encrypt_sensitive_data({**CAMPOS, "usuario_id": "usuario"}, "usuario", formato="sellado")
+    monkeypatch.setenv("FERNET_KEY", nueva)
+    with pytest.raises(InvalidTag):
+        CryptoUtils.unseal_fields(documento["sellado"], "usuario")
+    assert ActividadBase.classify_encryption(documento) == [("sellado", "indescifrable")]
+
+    monkeypatch.setenv("FERNET_KEYS_ANTERIORES", antigua)
+    assert CryptoUtils.unseal_fields(documento["sellado"], "usuario") == CAMPOS
+    assert {clase for _, clase in ActividadBase.classify_encryption(documento)} == {"sellado"}
+    # Lo que se sella después usa la clave nueva
+    assert CryptoUtils.get_aead() is CryptoUtils.get_aeads()[0]
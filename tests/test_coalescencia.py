@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from cache_actividades import BackendMemoria, BackendRedis, CacheActividades
+from coalescencia import Coalescedor
+from test_cache import RedisEnMemoria
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+def lectura_lenta(llamadas, resultado=b"[]"):
+    """Lectura que tarda hasta que se libera el evento devuelto"""
+    liberar = asyncio.Event()
+
+    async def funcion():
+        llamadas.append(1)
+        await liberar.wait()
+        return resultado
+
+    return funcion, liberar
+
+
+def test_las_llamadas_concurrentes_comparten_una_ejecucion():
+    async def prueba():
+        coalescedor = Coalescedor("prueba", habilitado=True)
+        llamadas = []
+        funcion, liberar = lectura_lenta(llamadas)
+        tareas = [asyncio.create_task(coalescedor.ejecutar("clave", funcion)) for _ in range(5)]
+        await asyncio.sleep(0)
+        liberar.set()
+        assert await asyncio.gather(*tareas) == [b"[]"] * 5
+        assert len(llamadas) == 1
+        assert coalescedor.estadisticas()["coalescidas"] == 4
+        assert coalescedor.en_curso == {}
+
+        # Terminada la lectura, la siguiente vuelve a ejecutarse
+        assert await coalescedor.ejecutar("clave", funcion) == b"[]"
+        assert len(llamadas) == 2
+
+    ejecutar(prueba())
+
+
+def test_claves_distintas_o_none_no_se_comparten():
+    async def prueba():
+        coalescedor = Coalescedor("prueba", habilitado=True)
+        llamadas = []
+        funcion, liberar = lectura_lenta(llamadas)
+        tareas = [asyncio.create_task(coalescedor.ejecutar(clave, funcion)) for clave in ("a", "b", None, None)]
+        await asyncio.sleep(0)
+        liberar.set()
+        await asyncio.gather(*tareas)
+        assert len(llamadas) == 4
+        assert coalescedor.estadisticas()["coalescidas"] == 0
+
+    ejecutar(prueba())
+
+
+def test_cancelar_la_primera_peticion_no_cancela_la_lectura_compartida():
+    async def prueba():
+        coalescedor = Coalescedor("prueba", habilitado=True)
+        llamadas = []
+        funcion, liberar = lectura_lenta(llamadas)
+        primera = asyncio.create_task(coalescedor.ejecutar("clave", funcion))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(coalescedor.ejecutar("clave", funcion))
+        await asyncio.sleep(0)
+        primera.cancel()
+        liberar.set()
+        assert await segunda == b"[]"
+        with pytest.raises(asyncio.CancelledError):
+            await primera
+
+    ejecutar(prueba())
+
+
+def test_los_errores_llegan_a_todas_las_peticiones_y_no_quedan_en_curso():
+    async def prueba():
+        coalescedor = Coalescedor("prueba", habilitado=True)
+
+        async def falla():
+            await asyncio.sleep(0)
+            raise RuntimeError("sin conexión")
+
+        resultados = await asyncio.gather(
+            *(coalescedor.ejecutar("clave", falla) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(resultado, RuntimeError) for resultado in resultados)
+        assert coalescedor.en_curso == {}
+
+    ejecutar(prueba())
+
+
+def test_una_lectura_tras_una_escritura_no_se_une_a_la_anterior():
+    async def prueba():
+        cache = CacheActividades(BackendMemoria(max_bytes=1024), ttl=60)
+        coalescedor = Coalescedor("prueba", habilitado=True)
+        llamadas = []
+        antigua, liberar_antigua = lectura_lenta(llamadas, b"[antes]")
+        nueva, liberar_nueva = lectura_lenta(llamadas, b"[despues]")
+
+        async def leer(funcion):
+            clave = await cache.clave("u1", "lista")
+            return await coalescedor.ejecutar(cache.clave_coalescencia(clave, "u1", "lista", procesos=1), funcion)
+
+        anterior = asyncio.create_task(leer(antigua))
+        await asyncio.sleep(0)
+        await cache.invalidar("u1")
+        posterior = asyncio.create_task(leer(nueva))
+        await asyncio.sleep(0)
+        liberar_antigua.set()
+        liberar_nueva.set()
+        assert await anterior == b"[antes]"
+        assert await posterior == b"[despues]"
+        assert len(llamadas) == 2
+
+    ejecutar(prueba())
+
+
+def test_con_varios_workers_solo_se_coalesce_con_generacion_compartida():
+    async def prueba():
+        for cache in (CacheActividades(None, ttl=60), CacheActividades(BackendMemoria(max_bytes=1024), ttl=60)):
+            clave = await cache.clave("u1", "lista")
+            assert cache.clave_coalescencia(clave, "u1", "lista", procesos=1) is not None
+            assert cache.clave_coalescencia(clave, "u1", "lista", procesos=4) is None
+
+        redis = RedisEnMemoria()
+        worker1 = CacheActividades(BackendRedis("", cliente=redis), ttl=60)
+        worker2 = CacheActividades(BackendRedis("", cliente=redis), ttl=60)
+        antes = worker2.clave_coalescencia(await worker2.clave("u1", "lista"), "u1", "lista", procesos=4)
+        assert antes is not None
+        # Una escritura atendida por otro worker cambia la clave de este
+        await worker1.invalidar("u1")
+        despues = worker2.clave_coalescencia(await worker2.clave("u1", "lista"), "u1", "lista", procesos=4)
+        assert despues is not None and despues != antes
+
+    ejecutar(prueba())
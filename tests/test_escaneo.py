@@ -0,0 +1,83 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import escaneo_cifrado
+from escaneo_cifrado import combinar, resultado_vacio
+from rutas import admin
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+async def lanzar(db, monkeypatch, escanear):
+    """Lanza ejecutar_escaneo como lo hace POST /admin/cifrado/escaneo, con otro escáner"""
+    monkeypatch.setattr(escaneo_cifrado, "escanear", escanear)
+    await db.escaneos_cifrado.insert_one({"_id": "e1", "estado": "en_curso"})
+    tarea = asyncio.create_task(admin.ejecutar_escaneo(db, "e1", particiones=1, procesos=1, max_ids=10))
+    admin._escaneos["e1"] = tarea
+    await asyncio.sleep(0)
+    return tarea
+
+
+def test_escaneo_guarda_progreso_y_resultado(monkeypatch):
+    async def prueba():
+        db = AsyncMongoMockClient()["prueba"]
+
+        async def escanear(db, al_avanzar, **parametros):
+            await al_avanzar({"rangos": 1, "total": 2})
+            return {"documentos": 3}
+
+        await (await lanzar(db, monkeypatch, escanear))
+        escaneo = await db.escaneos_cifrado.find_one({"_id": "e1"})
+        assert escaneo["estado"] == "terminado"
+        assert escaneo["progreso"] == {"rangos": 1, "total": 2}
+        assert escaneo["resultado"] == {"documentos": 3}
+        assert "e1" not in admin._escaneos
+
+    ejecutar(prueba())
+
+
+def test_escaneo_guarda_el_error(monkeypatch):
+    async def prueba():
+        db = AsyncMongoMockClient()["prueba"]
+
+        async def escanear(db, al_avanzar, **parametros):
+            raise RuntimeError("sin conexión")
+
+        await (await lanzar(db, monkeypatch, escanear))
+        escaneo = await db.escaneos_cifrado.find_one({"_id": "e1"})
+        assert escaneo["estado"] == "error" and escaneo["error"] == "sin conexión"
+
+    ejecutar(prueba())
+
+
+def test_cancelar_espera_a_que_se_guarde_el_estado(monkeypatch):
+    async def prueba():
+        db = AsyncMongoMockClient()["prueba"]
+
+        async def escanear(db, al_avanzar, **parametros):
+            await asyncio.Event().wait()
+
+        tarea = await lanzar(db, monkeypatch, escanear)
+        await admin.cancelar_escaneos()
+        # Al volver ya se puede cerrar el cliente: el estado final está escrito
+        assert tarea.done()
+        assert (await db.escaneos_cifrado.find_one({"_id": "e1"}))["estado"] == "cancelado"
+        assert admin._escaneos == {}
+
+    ejecutar(prueba())
+
+
+def test_combinar_suma_los_parciales_y_limita_los_ids():
+    parcial = {
+        "documentos": 2, "documentos_con_problemas": 1, "ids_con_problemas": ["a", "b"],
+        "campos": {"Nombre": {"fernet": 1, "texto_plano": 1}},
+        "colecciones": {"actividades": {"documentos": 2, "documentos_con_problemas": 1}},
+    }
+    total = combinar(combinar(resultado_vacio(), parcial, max_ids=3), parcial, max_ids=3)
+    assert total["documentos"] == 4 and total["documentos_con_problemas"] == 2
+    assert total["campos"] == {"Nombre": {"fernet": 2, "texto_plano": 2}}
+    assert total["colecciones"] == {"actividades": {"documentos": 4, "documentos_con_problemas": 2}}
+    assert total["ids_con_problemas"] == ["a", "b", "a"]
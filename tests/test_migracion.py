@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from cryptography.fernet import Fernet
+from mongomock_motor import AsyncMongoMockClient
+
+import migrar_actividades
+from migrar_actividades import REINTENTOS, id_migracion, migrar_coleccion
+from rutas.actividades import SCHEMA_VERSION, CryptoUtils
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+@pytest.fixture(autouse=True)
+def clave(monkeypatch):
+    monkeypatch.setenv("FERNET_KEY", Fernet.generate_key().decode())
+    monkeypatch.delenv("FERNET_KEYS_ANTERIORES", raising=False)
+
+
+@pytest.fixture
+def database():
+    return AsyncMongoMockClient()["prueba"]
+
+
+def antigua(numero):
+    """Documento con la forma de antes del esquema: fechas {"$date": ...}, texto plano y claves de más en mailto"""
+    return {
+        "_id": ObjectId(f"{numero:024x}"),
+        "usuario_id": "u1",
+        "Nombre": f"actividad {numero}",
+        "Fin": {"$date": "2024-03-01T10:00:00Z"},
+        "Fecha": "2024-02-01T09:00:00",
+        "mailto": [{"to": "a@ejemplo.com", "nombre": "A"}],
+        "Estatus": "En revisión",
+    }
+
+
+def concurrente(monkeypatch, database, veces):
+    """Edita el primer documento del lote entre la lectura y la escritura en las primeras 'veces' escrituras"""
+    aplicar = migrar_actividades.aplicar
+    llamadas = []
+
+    async def aplicar_con_edicion(coleccion, operaciones, simular, totales):
+        if operaciones and len(llamadas) < veces:
+            llamadas.append(1)
+            await coleccion.update_one({"_id": next(iter(operaciones))}, {"$inc": {"ediciones": 1}})
+        return await aplicar(coleccion, operaciones, simular, totales)
+
+    monkeypatch.setattr(migrar_actividades, "aplicar", aplicar_con_edicion)
+
+
+def test_migra_los_documentos_antiguos_con_date_anidado(database):
+    async def prueba():
+        await database.actividades.insert_many([antigua(i) for i in range(1, 6)])
+        await migrar_coleccion(database, "actividades", lote=2, simular=False, reiniciar=False)
+
+        async for documento in database.actividades.find({}):
+            assert documento["schema_version"] == SCHEMA_VERSION
+            assert isinstance(documento["Fin"], datetime)
+            assert isinstance(documento["Fecha"], datetime)
+            assert documento["mailto"][0].keys() == {"to"}
+            assert CryptoUtils.decrypt_data(documento["Nombre"]).startswith("actividad")
+        estado = await database.migraciones.find_one({"_id": id_migracion("actividades")})
+        assert estado["migrados"] == 5
+        assert estado["ultimo_id"] == ObjectId(f"{5:024x}")
+        assert estado["pendientes"] == []
+
+    ejecutar(prueba())
+
+
+def test_filtro_optimista_no_coincide_si_el_documento_cambio(database):
+    async def prueba():
+        documento = antigua(1)
+        await database.actividades.insert_one(documento)
+        filtro = migrar_actividades.filtro_optimista(documento)
+        assert await database.actividades.count_documents(filtro) == 1
+        await database.actividades.update_one({"_id": documento["_id"]}, {"$set": {"Nombre": "editada"}})
+        assert await database.actividades.count_documents(filtro) == 0
+
+    ejecutar(prueba())
+
+
+def test_un_documento_que_cambia_se_relee_y_se_migra(database, monkeypatch):
+    async def prueba():
+        await database.actividades.insert_many([antigua(i) for i in range(1, 4)])
+        concurrente(monkeypatch, database, veces=1)
+        await migrar_coleccion(database, "actividades", lote=10, simular=False, reiniciar=False)
+
+        primero = await database.actividades.find_one({"_id": ObjectId(f"{1:024x}")})
+        # Se migró la versión con la edición concurrente, sin perderla
+        assert primero["schema_version"] == SCHEMA_VERSION
+        assert primero["ediciones"] == 1
+        estado = await database.migraciones.find_one({"_id": id_migracion("actividades")})
+        assert estado["migrados"] == 3
+        assert estado["pendientes"] == []
+
+    ejecutar(prueba())
+
+
+def test_los_que_siguen_cambiando_quedan_pendientes_y_se_reintentan(database, monkeypatch):
+    async def prueba():
+        await database.actividades.insert_many([antigua(i) for i in range(1, 4)])
+        concurrente(monkeypatch, database, veces=REINTENTOS + 1)
+        await migrar_coleccion(database, "actividades", lote=10, simular=False, reiniciar=False)
+
+        pendiente = ObjectId(f"{1:024x}")
+        estado = await database.migraciones.find_one({"_id": id_migracion("actividades")})
+        # El punto de control avanzó, pero el documento no se pierde: queda en pendientes
+        assert estado["ultimo_id"] == ObjectId(f"{3:024x}")
+        assert estado["pendientes"] == [pendiente]
+        assert "schema_version" not in await database.actividades.find_one({"_id": pendiente})
+
+        await migrar_coleccion(database, "actividades", lote=10, simular=False, reiniciar=False)
+        documento = await database.actividades.find_one({"_id": pendiente})
+        assert documento["schema_version"] == SCHEMA_VERSION
+        assert documento["ediciones"] == REINTENTOS + 1
+        estado = await database.migraciones.find_one({"_id": id_migracion("actividades")})
+        assert estado["pendientes"] == []
+        assert estado["migrados"] == 3
+
+    ejecutar(prueba())
+
+
+def test_reanuda_desde_el_punto_de_control(database):
+    async def prueba():
+        await database.actividades.insert_many([antigua(i) for i in range(1, 5)])
+        await database.migraciones.insert_one({
+            "_id": id_migracion("actividades"), "ultimo_id": ObjectId(f"{2:024x}"), "migrados": 2,
+        })
+        await migrar_coleccion(database, "actividades", lote=10, simular=False, reiniciar=False)
+
+        migrados = {documento["_id"] async for documento in database.actividades.find({"schema_version": SCHEMA_VERSION})}
+        assert migrados == {ObjectId(f"{3:024x}"), ObjectId(f"{4:024x}")}
+        estado = await database.migraciones.find_one({"_id": id_migracion("actividades")})
+        assert estado["migrados"] == 4
+
+        # Con reiniciar se recorre de nuevo toda la colección
+        await migrar_coleccion(database, "actividades", lote=10, simular=False, reiniciar=True)
+        assert await database.actividades.count_documents({"schema_version": {"$ne": SCHEMA_VERSION}}) == 0
+
+    ejecutar(prueba())
+
+
+def test_simular_no_escribe(database):
+    async def prueba():
+        await database.actividades.insert_many([antigua(i) for i in range(1, 3)])
+        await migrar_coleccion(database, "actividades", lote=10, simular=True, reiniciar=False)
+        assert await database.actividades.count_documents({"schema_version": SCHEMA_VERSION}) == 0
+        assert await database.migraciones.find_one({"_id": id_migracion("actividades")}) is None
+
+    ejecutar(prueba())
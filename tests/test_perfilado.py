@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import perfilado
+from perfilado import ComandosMongo, Perfil, PerfiladoMiddleware, instrumentar, perfil_actual
+
+
+def aplicacion(directorio, token="secreto", muestreo=0.0):
+    app = FastAPI()
+
+    @app.get("/lenta")
+    async def lenta():
+        # Bloquea el event loop, que es el hilo que se muestrea, el tiempo suficiente para tomar muestras
+        time.sleep(0.05)
+        return {"ok": True}
+
+    app.add_middleware(PerfiladoMiddleware, directorio=str(directorio), token=token, muestreo=muestreo, intervalo_ms=1)
+    return app
+
+
+def perfiles(directorio):
+    return sorted(os.listdir(directorio)) if os.path.isdir(directorio) else []
+
+
+def test_perfila_con_la_cabecera_y_el_token(tmp_path):
+    with TestClient(aplicacion(tmp_path)) as cliente:
+        respuesta = cliente.get("/lenta", headers={"X-Debug-Perfil": "secreto"})
+    perfil_id = respuesta.headers["x-perfil-id"]
+    assert perfiles(tmp_path) == [f"{perfil_id}.folded", f"{perfil_id}.trace.json"]
+
+    with open(tmp_path / f"{perfil_id}.trace.json") as f:
+        peticion = json.load(f)["traceEvents"][0]
+    assert peticion["name"] == "GET /lenta" and peticion["args"] == {"status": 200}
+    assert peticion["dur"] >= 50_000
+
+
+def test_sin_token_valido_no_se_perfila(tmp_path):
+    with TestClient(aplicacion(tmp_path)) as cliente:
+        assert "x-perfil-id" not in cliente.get("/lenta", headers={"X-Debug-Perfil": "otro"}).headers
+        assert "x-perfil-id" not in cliente.get("/lenta").headers
+    assert perfiles(tmp_path) == []
+
+
+def test_muestreo_aleatorio(tmp_path):
+    with TestClient(aplicacion(tmp_path / "todas", token="", muestreo=1.0)) as cliente:
+        assert "x-perfil-id" in cliente.get("/lenta").headers
+    # Sin token configurado la cabecera (aunque vaya vacía) no activa el perfil
+    with TestClient(aplicacion(tmp_path / "ninguna", token="", muestreo=0.0)) as cliente:
+        assert "x-perfil-id" not in cliente.get("/lenta", headers={"X-Debug-Perfil": ""}).headers
+    assert len(perfiles(tmp_path / "todas")) == 2
+    assert perfiles(tmp_path / "ninguna") == []
+
+
+def test_una_peticion_perfilada_a_la_vez(tmp_path):
+    middleware = PerfiladoMiddleware(None, str(tmp_path), "secreto", 1.0, 1)
+    middleware.ocupado = True
+    llamadas = []
+
+    async def app(scope, receive, send):
+        llamadas.append(scope["path"])
+
+    middleware.app = app
+    asyncio.run(middleware({"type": "http", "method": "GET", "path": "/x", "headers": [(b"x-debug-perfil", b"secreto")]}, None, None))
+    assert llamadas == ["/x"] and perfiles(tmp_path) == []
+
+
+def test_muestreador_recoge_pilas_del_hilo_objetivo(tmp_path):
+    with TestClient(aplicacion(tmp_path)) as cliente:
+        perfil_id = cliente.get("/lenta", headers={"X-Debug-Perfil": "secreto"}).headers["x-perfil-id"]
+    with open(tmp_path / f"{perfil_id}.folded") as f:
+        lineas = f.read().splitlines()
+    pilas = {pila: int(cantidad) for pila, cantidad in (linea.rsplit(" ", 1) for linea in lineas)}
+    # Las muestras se toman mientras el handler bloquea el event loop
+    assert any("lenta (test_perfilado.py" in pila for pila in pilas)
+    assert all(cantidad >= 1 for cantidad in pilas.values())
+
+
+def test_instrumentar_registra_solo_con_perfil_en_curso():
+    class Cifrado:
+        @staticmethod
+        def cifrar(texto):
+            return texto[::-1]
+
+    instrumentar(Cifrado, "cifrar", "cifrado")
+    assert Cifrado.cifrar("abc") == "cba"
+
+    perfil = Perfil("GET", "/x")
+    token = perfil_actual.set(perfil)
+    try:
+        assert Cifrado.cifrar("abc") == "cba"
+    finally:
+        perfil_actual.reset(token)
+    assert [(e["name"], e["cat"]) for e in perfil.eventos] == [("Cifrado.cifrar", "cifrado")]
+
+
+def test_comandos_mongo_con_y_sin_perfil(monkeypatch):
+    oyente = ComandosMongo()
+    evento = SimpleNamespace(request_id=1, command_name="find", database_name="listas", duration_micros=1500)
+    oyente.started(evento)
+    oyente.succeeded(evento)  # Sin perfil en curso no se registra nada
+
+    perfil = Perfil("GET", "/x")
+    monkeypatch.setattr(perfilado, "_perfil_en_curso", perfil)
+    oyente.started(evento)
+    oyente.succeeded(evento)
+    oyente.failed(SimpleNamespace(request_id=2, command_name="insert", database_name="listas", duration_micros=800))
+
+    assert [(e["name"], e["args"]["ok"]) for e in perfil.eventos] == [("mongo find", True), ("mongo insert", False)]
+    assert perfil.comandos == {}
+    assert perfil.eventos[1]["args"]["duration_micros"] == 800
+
+
+@pytest.mark.parametrize("habilitado", [False, True])
+def test_instalar_solo_si_esta_habilitado(monkeypatch, habilitado):
+    monkeypatch.setattr(perfilado, "PERFILADO_HABILITADO", habilitado)
+    monkeypatch.setattr(perfilado, "instrumentar", lambda *args: None)
+    monkeypatch.setattr(perfilado.monitoring, "register", lambda oyente: None)
+    app = FastAPI()
+    perfilado.instalar_perfilado(app)
+    assert [m.cls for m in app.user_middleware] == ([PerfiladoMiddleware] if habilitado else [])
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import prueba_carga
+from prueba_carga import Registro, codo, percentil
+
+
+class Respuesta:
+    def __init__(self, cuerpo, status_code=200):
+        self.cuerpo, self.status_code = cuerpo, status_code
+
+    def json(self):
+        return self.cuerpo
+
+
+class SesionFalsa:
+    """Responde como la API sin servidor y anota cada petición"""
+
+    def __init__(self):
+        self.headers, self.peticiones, self.creadas = {}, [], 0
+
+    def post(self, url, json=None):
+        self.peticiones.append(("POST", url))
+        if url.endswith("/sesion/login"):
+            return Respuesta({"access_token": "t"})
+        self.creadas += 1
+        return Respuesta({"_id": f"a{self.creadas}"})
+
+    def get(self, url):
+        self.peticiones.append(("GET", url))
+        return Respuesta([{"_id": "x"}])
+
+    def put(self, url, json=None):
+        self.peticiones.append(("PUT", url))
+        return Respuesta({})
+
+    def delete(self, url):
+        self.peticiones.append(("DELETE", url))
+        return Respuesta({})
+
+
+def test_percentil():
+    valores = [i / 100 for i in range(1, 101)]
+    assert percentil(valores, 50) == 0.5
+    assert percentil(valores, 95) == 0.95
+    assert percentil(valores, 100) == 1.0
+    assert percentil([0.3], 99) == 0.3
+    assert percentil([], 95) == 0.0
+
+
+def test_codo_es_el_ultimo_nivel_que_aun_escala():
+    niveles = [{"concurrencia": c, "rps": rps} for c, rps in [(1, 100), (4, 350), (16, 370), (64, 360)]]
+    assert codo(niveles)["concurrencia"] == 4
+    assert codo(niveles[:2])["concurrencia"] == 4
+    assert codo([]) is None
+
+
+def test_sin_actividades_propias_se_crea_en_vez_de_girar_en_vacio(monkeypatch):
+    sesion = SesionFalsa()
+    monkeypatch.setattr(prueba_carga.requests, "Session", lambda: sesion)
+    monkeypatch.setattr(prueba_carga, "ESCENARIOS", [("actualizar", 1), ("eliminar", 1)])
+    registro = Registro()
+
+    prueba_carga.usuario_virtual("http://api", "ana@carga.local", "x", registro, time.time() + 0.05, semilla=1)
+
+    # Cada vuelta del bucle hace una petición: la primera actualización o borrado sin propias se convierte en crear
+    assert registro.latencias["POST /actividades/"]
+    assert set(registro.latencias) <= {"POST /sesion/login", "GET /actividades/", "POST /actividades/",
+                                       "PUT /actividades/{id}", "DELETE /actividades/{id}"}
+    assert registro.ultima > 0 and registro.errores == {}
+    # Todo lo creado se borra, en el bucle o al terminar
+    assert sum(metodo == "DELETE" for metodo, _ in sesion.peticiones) == sesion.creadas
+
+
+def test_ejecutar_nivel_reparte_usuarios_y_mide_desde_la_barrera(monkeypatch):
+    vistos = []
+
+    def usuario_virtual(url, email, password, registro, fin, semilla):
+        vistos.append((threading.current_thread().name, semilla))
+        registro.medir("GET /actividades/", lambda: Respuesta([]))
+        registro.medir("GET /actividades/", lambda: Respuesta([], 500))
+
+    monkeypatch.setattr(prueba_carga, "usuario_virtual", usuario_virtual)
+    args = SimpleNamespace(prefijo="carga", semilla=7, usuarios=10, procesos=2, url="http://api", password="x", duracion=30)
+    # Un gestor con la barrera de hilos basta para correr los "procesos" como hilos
+    gestor = SimpleNamespace(Barrier=threading.Barrier)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        nivel = prueba_carga.ejecutar_nivel(args, 5, pool, gestor)
+
+    assert sorted(semilla for _, semilla in vistos) == [7, 8, 9, 10, 11]
+    assert nivel["procesos"] == 2
+    endpoint = nivel["endpoints"]["GET /actividades/"]
+    assert endpoint["peticiones"] == 10 and endpoint["errores"] == 5 and nivel["errores"] == 5
+    # La duración es la ventana medida, no los 30 s pedidos ni el arranque de los procesos
+    assert nivel["duracion_s"] < 5
+    assert nivel["rps"] == 10 / nivel["duracion_s"]
@@ -0,0 +1,139 @@
+import asyncio
+import random
+
+import pytest
+
+from rangos import (
+    BASE, DIGITOS, derivar_prioridades, rango_entre, rango_para_posicion, rangos_equiespaciados, rebalancear,
+)
+
+
+def test_rango_entre_sin_limites():
+    assert rango_entre(None, None) == DIGITOS[BASE // 2]
+
+
+@pytest.mark.parametrize("antes, despues", [
+    (None, "V"), ("V", None), ("1", "2"), ("1", "11"), ("0z", "1"), ("zz", None), (None, "01"), ("A", "A1"),
+])
+def test_rango_entre_queda_en_medio(antes, despues):
+    rango = rango_entre(antes, despues)
+    assert antes is None or antes < rango
+    assert despues is None or rango < despues
+    assert not rango.endswith("0")
+
+
+def test_rango_entre_inserciones_repetidas_en_el_mismo_hueco():
+    antes, despues = "1", "2"
+    for _ in range(200):
+        rango = rango_entre(antes, despues)
+        assert antes < rango < despues
+        despues = rango
+
+
+def test_rango_entre_inserciones_aleatorias_mantienen_el_orden():
+    aleatorio = random.Random(7)
+    claves = []
+    for _ in range(500):
+        indice = aleatorio.randint(0, len(claves))
+        antes = claves[indice - 1] if indice > 0 else None
+        despues = claves[indice] if indice < len(claves) else None
+        claves.insert(indice, rango_entre(antes, despues))
+    assert claves == sorted(claves)
+    assert len(set(claves)) == len(claves)
+
+
+@pytest.mark.parametrize("cantidad", [0, 1, 2, 61, 62, 1000, 5000])
+def test_rangos_equiespaciados(cantidad):
+    claves = rangos_equiespaciados(cantidad)
+    assert len(claves) == cantidad
+    assert claves == sorted(claves)
+    assert len(set(claves)) == cantidad
+    assert all(clave and not clave.endswith("0") for clave in claves)
+
+
+def test_rangos_equiespaciados_dejan_hueco_antes_despues_y_entre_claves():
+    claves = rangos_equiespaciados(100)
+    for antes, despues in zip([None] + claves, claves + [None]):
+        rango = rango_entre(antes, despues)
+        assert (antes is None or antes < rango) and (despues is None or rango < despues)
+
+
+def test_derivar_prioridades_ordena_por_rango_y_despues_por_prioridad():
+    documentos = [
+        {"_id": "a", "Estatus": "En revisión", "Prioridad": 1},
+        {"_id": "b", "Estatus": "En revisión", "Rango": "V"},
+        {"_id": "c", "Estatus": "Cerrado", "Rango": "1", "Prioridad": 7},
+        {"_id": "d", "Estatus": "En revisión", "Rango": "V"},
+        {"_id": "e", "Estatus": "En revisión", "Rango": "2"},
+        {"_id": "f", "Estatus": "En revisión", "Prioridad": None},
+    ]
+    derivar_prioridades(documentos)
+    assert {d["_id"]: d.get("Prioridad") for d in documentos} == {"e": 1, "b": 2, "d": 3, "a": 4, "f": 5, "c": 7}
+
+
+def test_derivar_prioridades_sin_rangos_no_cambia_nada():
+    documentos = [{"_id": "a", "Estatus": "En revisión", "Prioridad": 3}]
+    derivar_prioridades(documentos)
+    assert documentos[0]["Prioridad"] == 3
+
+
+async def crear_abiertas(repos, usuario_id, cantidad, con_rango=True):
+    ids = [await repos.actividades.crear({"usuario_id": usuario_id, "Estatus": "En revisión", "Prioridad": i + 1})
+           for i in range(cantidad)]
+    if con_rango:
+        await rebalancear(repos, usuario_id)
+    return ids
+
+
+@pytest.mark.parametrize("prioridad", [1, 2, 3, 5, 6, 99, None, 0])
+def test_rango_para_posicion_deja_la_actividad_en_esa_posicion(repos, prioridad):
+    async def prueba():
+        ids = await crear_abiertas(repos, "u1", 5)
+        nueva = await repos.actividades.crear({"usuario_id": "u1", "Estatus": "En revisión"})
+        rango = await rango_para_posicion(repos, "u1", prioridad, nueva)
+        await repos.actividades.asignar_rangos("u1", {nueva: rango})
+        orden = [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")]
+        esperada = 6 if prioridad is None else min(max(prioridad, 1), 6)
+        assert orden.index(nueva) + 1 == esperada
+        assert [i for i in orden if i != nueva] == ids
+
+    asyncio.run(prueba())
+
+
+def test_rango_para_posicion_excluye_la_propia_actividad(repos):
+    async def prueba():
+        ids = await crear_abiertas(repos, "u1", 4)
+        # Mover la primera a la posición 3 (entre la que era 3.ª y 4.ª sin contarse a sí misma)
+        rango = await rango_para_posicion(repos, "u1", 3, ids[0])
+        await repos.actividades.asignar_rangos("u1", {ids[0]: rango})
+        assert [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")] == [ids[1], ids[2], ids[0], ids[3]]
+
+    asyncio.run(prueba())
+
+
+def test_rango_para_posicion_solo_lee_claves_sin_rebalanceo(repos, monkeypatch):
+    async def prueba():
+        await crear_abiertas(repos, "u1", 50)
+
+        async def sin_listar(*args, **kwargs):
+            raise AssertionError("no debe leer la lista completa")
+
+        monkeypatch.setattr(repos.actividades, "listar_ordenadas", sin_listar)
+        for prioridad in (1, 25, 50, None):
+            await rango_para_posicion(repos, "u1", prioridad)
+
+    asyncio.run(prueba())
+
+
+def test_rango_para_posicion_reparte_rangos_si_las_vecinas_no_tienen(repos):
+    async def prueba():
+        ids = await crear_abiertas(repos, "u1", 2)
+        # Reabierta sin Rango: va detrás de las ordenadas
+        sin_rango = await repos.actividades.crear({"usuario_id": "u1", "Estatus": "En revisión"})
+        nueva = await repos.actividades.crear({"usuario_id": "u1", "Estatus": "En revisión"})
+        rango = await rango_para_posicion(repos, "u1", None, nueva)
+        await repos.actividades.asignar_rangos("u1", {nueva: rango})
+        assert [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")] == ids + [sin_rango, nueva]
+        assert await repos.actividades.contar_ordenadas("u1") == (4, 0)
+
+    asyncio.run(prueba())
@@ -0,0 +1,169 @@
+"""Contrato común de los repositorios: cada prueba corre con el backend en memoria y con el de MongoDB (mongomock)"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+
+def ejecutar(corrutina):
+    return asyncio.run(corrutina)
+
+
+def usuario(email, **campos):
+    return {"nombre": email.split("@")[0], "email": email, "password": "hash", "activo": True, **campos}
+
+
+def actividad(usuario_id="u1", **campos):
+    return {"usuario_id": usuario_id, "Nombre": "n", "Estatus": "En revisión", "Fecha": datetime(2024, 1, 1), **campos}
+
+
+def test_usuarios_crear_buscar_y_listar_sin_password(repos):
+    async def prueba():
+        usuario_id = await repos.usuarios.crear(usuario("ana@ejemplo.com"))
+        assert isinstance(usuario_id, str)
+        encontrado = await repos.usuarios.buscar_por_email("ana@ejemplo.com")
+        assert encontrado["_id"] == usuario_id and encontrado["password"] == "hash"
+        assert "password" not in await repos.usuarios.obtener(usuario_id)
+        assert [u["email"] for u in await repos.usuarios.listar()] == ["ana@ejemplo.com"]
+        assert all("password" not in u for u in await repos.usuarios.listar())
+        assert await repos.usuarios.buscar_por_email("otro@ejemplo.com") is None
+        assert await repos.usuarios.obtener(str(ObjectId())) is None
+
+    ejecutar(prueba())
+
+
+def test_usuarios_actualizar_y_eliminar(repos):
+    async def prueba():
+        usuario_id = await repos.usuarios.crear(usuario("ana@ejemplo.com"))
+        assert await repos.usuarios.actualizar(usuario_id, {"activo": False})
+        assert (await repos.usuarios.obtener(usuario_id))["activo"] is False
+        assert not await repos.usuarios.actualizar(str(ObjectId()), {"activo": False})
+        assert await repos.usuarios.eliminar(usuario_id)
+        assert not await repos.usuarios.eliminar(usuario_id)
+        assert await repos.usuarios.obtener(usuario_id) is None
+
+    ejecutar(prueba())
+
+
+def test_usuarios_crear_lote_marca_los_duplicados(repos):
+    async def prueba():
+        await repos.usuarios.asegurar_indices()
+        assert await repos.usuarios.email_unico()
+        await repos.usuarios.crear(usuario("ana@ejemplo.com"))
+        ids, errores = await repos.usuarios.crear_lote([
+            usuario("luis@ejemplo.com"), usuario("ana@ejemplo.com"), usuario("eva@ejemplo.com"), usuario("luis@ejemplo.com"),
+        ])
+        assert errores == {1: "email_duplicado", 3: "email_duplicado"}
+        assert ids[1] is None and ids[3] is None
+        assert (await repos.usuarios.obtener(ids[2]))["email"] == "eva@ejemplo.com"
+        assert len(await repos.usuarios.listar()) == 3
+
+    ejecutar(prueba())
+
+
+def test_actividades_crear_obtener_y_aislar_por_usuario(repos):
+    async def prueba():
+        actividad_id = await repos.actividades.crear(actividad())
+        documento = await repos.actividades.obtener(actividad_id, "u1")
+        assert documento["_id"] == actividad_id and documento["Nombre"] == "n"
+        assert await repos.actividades.obtener(actividad_id, "u2") is None
+        assert await repos.actividades.listar("u2") == []
+        assert not await repos.actividades.actualizar(actividad_id, "u2", {"Nombre": "x"})
+        assert not await repos.actividades.eliminar(actividad_id, "u2")
+        assert (await repos.actividades.obtener(actividad_id, "u1"))["Nombre"] == "n"
+
+    ejecutar(prueba())
+
+
+def test_actividades_actualizar_asigna_y_quita_campos(repos):
+    async def prueba():
+        actividad_id = await repos.actividades.crear(actividad(Categoria="c"))
+        assert await repos.actividades.actualizar(actividad_id, "u1", {"Nombre": "nuevo"}, eliminar=["Categoria"])
+        documento = await repos.actividades.obtener(actividad_id, "u1")
+        assert documento["Nombre"] == "nuevo" and "Categoria" not in documento
+        assert not await repos.actividades.actualizar(str(ObjectId()), "u1", {"Nombre": "x"})
+
+    ejecutar(prueba())
+
+
+def test_actividades_cambiar_estatus_marca_fecha_cierre(repos):
+    async def prueba():
+        actividad_id = await repos.actividades.crear(actividad())
+        assert await repos.actividades.cambiar_estatus(actividad_id, "u1", "Cerrado")
+        cerrada = await repos.actividades.obtener(actividad_id, "u1")
+        assert cerrada["Estatus"] == "Cerrado" and isinstance(cerrada["fecha_cierre"], datetime)
+        assert await repos.actividades.cambiar_estatus(actividad_id, "u1", "En revisión")
+        assert "fecha_cierre" not in await repos.actividades.obtener(actividad_id, "u1")
+        assert not await repos.actividades.cambiar_estatus(str(ObjectId()), "u1", "Cerrado")
+
+    ejecutar(prueba())
+
+
+def test_actividades_eliminar(repos):
+    async def prueba():
+        actividad_id = await repos.actividades.crear(actividad())
+        assert await repos.actividades.eliminar(actividad_id, "u1")
+        assert not await repos.actividades.eliminar(actividad_id, "u1")
+        assert await repos.actividades.obtener(actividad_id, "u1") is None
+
+    ejecutar(prueba())
+
+
+def test_actividades_listar_por_rango_y_despues_sin_rango(repos):
+    async def prueba():
+        sin_rango = [await repos.actividades.crear(actividad()) for _ in range(2)]
+        b = await repos.actividades.crear(actividad(Rango="b"))
+        a = await repos.actividades.crear(actividad(Rango="a"))
+        otra = await repos.actividades.crear(actividad("u2"))
+        assert [d["_id"] for d in await repos.actividades.listar("u1")] == [a, b] + sin_rango
+        assert [d["_id"] for d in await repos.actividades.listar("u2")] == [otra]
+
+    ejecutar(prueba())
+
+
+def test_actividades_abiertas_y_prioridades(repos):
+    async def prueba():
+        abiertas = [await repos.actividades.crear(actividad(Prioridad=p)) for p in (2, 1)]
+        cerrada = await repos.actividades.crear(actividad(Estatus="Finalizado", Prioridad=3))
+        assert {d["_id"] for d in await repos.actividades.listar_abiertas("u1")} == set(abiertas)
+
+        await repos.actividades.actualizar_prioridades("u1", {abiertas[0]: 5, abiertas[1]: 4})
+        assert [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")] == [abiertas[1], abiertas[0]]
+        assert (await repos.actividades.obtener(cerrada, "u1"))["Prioridad"] == 3
+
+    ejecutar(prueba())
+
+
+def test_actividades_rangos_vecinos_y_posiciones(repos):
+    async def prueba():
+        ids = [await repos.actividades.crear(actividad()) for _ in range(4)]
+        cerrada = await repos.actividades.crear(actividad(Estatus="Cerrado", Rango="0V"))
+        assert not await repos.actividades.usa_rangos("u1")
+        await repos.actividades.asignar_rangos("u1", dict(zip(ids, ["1", "2", "3", "4"])))
+        assert await repos.actividades.usa_rangos("u1")
+
+        assert [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")] == ids
+        assert (await repos.actividades.adyacente("u1", "2", anterior=True, excluir_id=ids[1]))["_id"] == ids[0]
+        assert (await repos.actividades.adyacente("u1", "2", anterior=False, excluir_id=ids[2]))["_id"] == ids[3]
+        assert await repos.actividades.adyacente("u1", "1", anterior=True, excluir_id=ids[0]) is None
+        assert await repos.actividades.contar_antes("u1", "3", ids[2]) == 2
+        assert await repos.actividades.contar_ordenadas("u1") == (4, 0)
+        assert await repos.actividades.contar_ordenadas("u1", ids[0]) == (3, 0)
+        assert await repos.actividades.rangos_ordenados("u1", 1, 2) == ["2", "3"]
+        assert await repos.actividades.rangos_ordenados("u1", 0, 2, excluir_id=ids[3], descendente=True) == ["3", "2"]
+        assert cerrada not in [d["_id"] for d in await repos.actividades.listar_ordenadas("u1")]
+
+    ejecutar(prueba())
+
+
+@pytest.mark.parametrize("estatus", ["Cerrado", "Finalizado"])
+def test_las_cerradas_no_cuentan_en_el_orden(repos, estatus):
+    async def prueba():
+        abierta = await repos.actividades.crear(actividad(Rango="V"))
+        await repos.actividades.crear(actividad(Estatus=estatus, Rango="1"))
+        assert await repos.actividades.contar_antes("u1", "V", abierta) == 0
+        assert await repos.actividades.contar_ordenadas("u1") == (1, 0)
+
+    ejecutar(prueba())